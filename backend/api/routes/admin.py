@@ -1,18 +1,23 @@
-from fastapi import APIRouter, Depends, Form, BackgroundTasks, HTTPException, Query
+from fastapi import APIRouter, Depends, Form, BackgroundTasks, HTTPException, Query, Response
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import datetime
 
+from core.config import settings
 from dependencies import get_db, require_admin
-from models.all import User, OrganizationPolicy
+from core.principal import Principal
+from models.all import User, UserRole, OrganizationPolicy, InvoiceStatus
 from schemas.invoice_schema import InvoiceResponse
 from services.invoice_service import (
     get_all_invoices, approve_invoice, reject_invoice, log_invoice_event,
-    _process_invoice_background
+    _process_invoice_background, InvoiceListFilters, list_invoices_page, count_invoices, encode_invoice_cursor,
+    load_invoice_detail
 )
-from services.analytics_service import get_analytics
+from services.analytics_service import get_cached_analytics, analytics_cache, rebuild_rollups
 from services.policy_engine import get_or_create_policy
-from services.email_service import fetch_and_process_emails, send_status_email
+from services.email_service import fetch_and_process_emails
+from services.notification_service import queue_status_email
 from services.storage_service import get_file_from_storage
 
 router = APIRouter()
@@ -28,41 +33,139 @@ class PolicyUpdate(BaseModel):
 
 @router.get("/analytics")
 def admin_analytics(
+    response: Response,
+    current_admin: Principal = Depends(require_admin),
+    organization_id: Optional[str] = Query(None, description="Scope the dashboard to one organization"),
+):
+    """Returns aggregated operational metrics for the Executive Dashboard (cached, see X-Cache)."""
+    payload, outcome = get_cached_analytics(org_id=organization_id)
+    response.headers["X-Cache"] = outcome.upper()
+    return payload
+
+
+@router.get("/analytics/cache-stats")
+def admin_analytics_cache_stats(current_admin: Principal = Depends(require_admin)):
+    """Hit/miss counters of the analytics response cache in this worker."""
+    return analytics_cache.stats()
+
+
+@router.get("/processing/queue-stats")
+def admin_processing_queue_stats(current_admin: Principal = Depends(require_admin)):
+    """Depth and throughput counters of the document processing pool in this worker."""
+    from services.processing_queue import processing_queue
+    return processing_queue.stats()
+
+
+@router.get("/notifications/outbox-stats")
+def admin_notification_outbox_stats(current_admin: Principal = Depends(require_admin)):
+    """Outbox backlog by state, plus SMTP logins made by this worker's sender."""
+    from services.notification_service import notification_sender
+    return notification_sender.stats()
+
+
+@router.post("/analytics/rebuild-rollups")
+def admin_rebuild_analytics_rollups(
+    db: Session = Depends(get_db),
+    current_admin: Principal = Depends(require_admin),
+    organization_id: Optional[str] = Query(None, description="Rebuild a single organization only"),
+):
+    """Recomputes the analytics rollup tables from the invoices table (repairs any drift)."""
+    return {"rebuilt": rebuild_rollups(db, org_id=organization_id)}
+
+
+# ── Event Ledger ───────────────────────────────────────────────────────────────
+@router.get("/events")
+def admin_list_events(
+    db: Session = Depends(get_db),
+    current_admin: Principal = Depends(require_admin),
+    organization_id: Optional[str] = Query(None),
+    invoice_id: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    event_type: Optional[List[str]] = Query(None, description="Repeat to match several event types"),
+    limit: int = Query(100, ge=1, le=settings.INVOICE_PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(None),
+):
+    """Ledger events oldest-first in [since, until), keyset-paginated via `next_cursor`."""
+    from services.event_ledger import EventQuery, list_events, event_record
+    query = EventQuery(organization_id=organization_id, invoice_id=invoice_id, since=since, until=until,
+                       event_types=tuple(event_type or ()))
+    events, next_cursor = list_events(db, query, limit, cursor)
+    return {"items": [event_record(e) for e in events], "next_cursor": next_cursor}
+
+
+@router.get("/events/export")
+def admin_export_events(
+    current_admin: Principal = Depends(require_admin),
+    organization_id: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    event_type: Optional[List[str]] = Query(None),
+):
+    """Streams every matching ledger event as newline-delimited JSON (bulk export / offline audit)."""
+    from fastapi.responses import StreamingResponse
+    from services.event_ledger import EventQuery, iter_event_export
+    query = EventQuery(organization_id=organization_id, since=since, until=until, event_types=tuple(event_type or ()))
+    return StreamingResponse(
+        iter_event_export(query), media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="invoice-events.ndjson"'},
+    )
+
+
+@router.post("/events/compact")
+def admin_compact_events(
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin),
+    retention_days: Optional[int] = Query(None, ge=1, description="Defaults to EVENT_RETENTION_DAYS"),
 ):
-    """Returns aggregated operational metrics for the Executive Dashboard."""
-    return get_analytics(db)
+    """Archives whole months older than the retention window to storage and removes them from the ledger."""
+    from services.event_ledger import compact_events
+    return compact_events(db, retention_days=retention_days)
 
 
 @router.get("/invoices")
 def admin_list_invoices(
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin),
-    limit: Optional[int] = Query(50, description="Max invoices to return"),
-    skip: int = Query(0, description="Offset for pagination"),
+    current_admin: Principal = Depends(require_admin),
+    limit: int = Query(50, ge=1, le=settings.INVOICE_PAGE_SIZE_MAX, description="Max invoices to return"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    skip: int = Query(0, ge=0, description="Legacy offset pagination — ignored when a cursor is given"),
+    organization_id: Optional[str] = Query(None),
+    status: Optional[List[InvoiceStatus]] = Query(None, description="Repeat to match several statuses"),
+    vendor: Optional[str] = Query(None, description="Case-insensitive vendor name match"),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
 ):
-    """Admin-only view to retrieve all invoices across all organizations (paginated)."""
-    from models.all import Invoice
-    total = db.query(Invoice).count()
-    items = get_all_invoices(db, limit=limit, skip=skip)
-    
-    # We serialize the items to match InvoiceResponse manually or use fastapi response model list inside a wrapper.
-    # Since we are returning a dict, we just let FastAPI encode the ORM objects if they match schemas.
+    """Admin-only view to retrieve invoices across all organizations (keyset paginated, filterable)."""
+    filters = InvoiceListFilters(
+        organization_id=organization_id, statuses=tuple(status or ()), vendor=vendor,
+        created_from=created_from, created_to=created_to, min_amount=min_amount, max_amount=max_amount,
+    )
+    total, total_is_estimate = count_invoices(db, filters)
+
+    if skip and not cursor:
+        items = get_all_invoices(db, limit=limit, skip=skip, filters=filters)
+        next_cursor = encode_invoice_cursor(items[-1]) if len(items) == limit else None
+    else:
+        items, next_cursor = list_invoices_page(db, filters, limit, cursor)
+
     return {
         "items": items,
-        "total": total
+        "total": total,
+        "total_is_estimate": total_is_estimate,
+        "next_cursor": next_cursor,
     }
 
 @router.get("/invoices/{invoice_id}", response_model=InvoiceResponse)
 def admin_get_invoice(
     invoice_id: str,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin)
 ):
     """Admin-only view for a specific invoice."""
-    from models.all import Invoice
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+    invoice = load_invoice_detail(db, invoice_id)
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     return invoice
@@ -70,51 +173,26 @@ def admin_get_invoice(
 @router.post("/invoices/{invoice_id}/approve", response_model=InvoiceResponse)
 def admin_approve_invoice(
     invoice_id: str,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin)
 ):
-    """Admin-only action to approve an invoice and log the event."""
-    from services.email_service import send_status_email
-    inv = approve_invoice(db, invoice_id, current_admin.id)
-    
-    if inv.uploaded_by_user and inv.uploaded_by_user.email:
-        background_tasks.add_task(
-            send_status_email,
-            inv.uploaded_by_user.email,
-            inv.file_url.split("/")[-1] if inv.file_url else "Unknown Document",
-            "APPROVED",
-            inv.vendor_name
-        )
-    return inv
+    """Admin-only action to approve an invoice, log the event and queue the uploader's email."""
+    return approve_invoice(db, invoice_id, current_admin.id)
 
 @router.post("/invoices/{invoice_id}/reject", response_model=InvoiceResponse)
 def admin_reject_invoice(
     invoice_id: str,
-    background_tasks: BackgroundTasks,
     reason: str = Form(...),
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin)
 ):
     """Admin-only action to reject an invoice and securely record the audit reason."""
-    from services.email_service import send_status_email
-    inv = reject_invoice(db, invoice_id, current_admin.id, reason)
-    
-    if inv.uploaded_by_user and inv.uploaded_by_user.email:
-        background_tasks.add_task(
-            send_status_email,
-            inv.uploaded_by_user.email,
-            inv.file_url.split("/")[-1] if inv.file_url else "Unknown Document",
-            "REJECTED",
-            inv.vendor_name,
-            reason
-        )
-    return inv
+    return reject_invoice(db, invoice_id, current_admin.id, reason)
 
 @router.post("/invoices/reprocess-failed")
 def reprocess_failed_batch(
     background_tasks: BackgroundTasks,
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin)
 ):
     """
     Triggers a background sweep to re-process all failed or uncertain invoices.
@@ -130,8 +208,7 @@ def reprocess_failed_batch(
 @router.post("/invoices/auto-review-batch")
 def auto_review_batch(
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin)
 ):
     """Trigger an asynchronous sweep of all queued invoices using the autonomous AI."""
     from services.invoice_service import _process_auto_review_batch
@@ -141,9 +218,8 @@ def auto_review_batch(
 @router.post("/invoices/{invoice_id}/auto-review")
 def auto_review_single(
     invoice_id: str,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin)
 ):
     """Executes the AI Auditor on a single invoice and natively routes & emails the decision on success."""
     from models.all import Invoice, InvoiceStatus
@@ -170,44 +246,25 @@ def auto_review_single(
 
     new_status, reason, needs_admin_alert = perform_ai_auto_review(db, invoice, raw_text, current_admin.id)
 
-    # Route logic based on AI decision
+    # Route logic based on AI decision. Status emails go to the outbox and commit with the decision.
     if new_status == InvoiceStatus.APPROVED:
         approve_invoice(db, invoice.id, current_admin.id)
-        from services.email_service import send_status_email
-        if invoice.uploaded_by_user and invoice.uploaded_by_user.email:
-            background_tasks.add_task(
-                send_status_email,
-                invoice.uploaded_by_user.email,
-                invoice.file_url.split("/")[-1] if invoice.file_url else "Invoice",
-                "APPROVED",
-                invoice.vendor_name
-            )
         return {"result": "APPROVED", "reason": reason}
         
     elif new_status == InvoiceStatus.REJECTED:
-        reject_invoice(db, invoice.id, current_admin.id, f"AI Auto-Review Rejection: {reason}")
-        from services.email_service import send_status_email
-        if invoice.uploaded_by_user and invoice.uploaded_by_user.email:
-            background_tasks.add_task(
-                send_status_email,
-                invoice.uploaded_by_user.email,
-                invoice.file_url.split("/")[-1] if invoice.file_url else "Invoice",
-                "REJECTED",
-                invoice.vendor_name,
-                reason
-            )
         # Check if fraud alert to admins is needed (handled lightly here)
         if needs_admin_alert:
-            admin_emails = [u.email for u in db.query(User).filter(User.role == "admin").all() if u.email]
+            admin_emails = [u.email for u in db.query(User).filter(User.role == UserRole.ADMIN).all() if u.email]
             for email in admin_emails:
-                 background_tasks.add_task(
-                     send_status_email,
-                     email,
-                     invoice.file_url.split("/")[-1] if invoice.file_url else "Invoice",
-                     "FRAUD_ALERT",
-                     invoice.vendor_name,
-                     f"URGENT FRAUD INTERCEPTION: {reason}"
-                 )
+                queue_status_email(
+                    db,
+                    email,
+                    invoice.file_url.split("/")[-1] if invoice.file_url else "Invoice",
+                    "FRAUD_ALERT",
+                    invoice.vendor_name,
+                    f"URGENT FRAUD INTERCEPTION: {reason}"
+                )
+        reject_invoice(db, invoice.id, current_admin.id, f"AI Auto-Review Rejection: {reason}", email_reason=reason)
         return {"result": "REJECTED", "reason": reason}
         
     # If uncertain, we change state to admin_pass_needed so AutoPilot skips it.
@@ -219,7 +276,7 @@ def auto_review_single(
 def admin_get_invoice_file(
     invoice_id: str,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin)
 ):
     from fastapi import Response
     from models.all import Invoice
@@ -238,7 +295,7 @@ def admin_get_invoice_file(
 def get_policy(
     organization_id: str,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin)
 ):
     """Retrieve the current approval policy for a specific organization."""
     policy = get_or_create_policy(db, organization_id)
@@ -257,7 +314,7 @@ def update_policy(
     organization_id: str,
     updates: PolicyUpdate,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin)
 ):
     """Update approval policy parameters for a specific organization."""
     policy = get_or_create_policy(db, organization_id)
@@ -265,22 +322,21 @@ def update_policy(
     for field, value in updates.model_dump(exclude_none=True).items():
         setattr(policy, field, value)
         changed_fields.append(field)
-    db.commit()
-    db.refresh(policy)
     # Audit log — attach to a synthetic invoice event under the org's first invoice as a marker,
-    # or simply log directly via a plain InvoiceEvent if one exists
+    # committed in the same transaction as the policy change
     log_msg = f"Policy updated by admin {current_admin.id}. Fields changed: {', '.join(changed_fields)}"
     from models.all import Invoice
-    sample_invoice = db.query(Invoice).filter(Invoice.organization_id == organization_id).first()
+    sample_invoice = db.query(Invoice.id).filter(Invoice.organization_id == organization_id).first()
     if sample_invoice:
-        log_invoice_event(db, sample_invoice.id, current_admin.id, "POLICY_UPDATED", log_msg)
+        log_invoice_event(db, sample_invoice.id, current_admin.id, "POLICY_UPDATED", log_msg, commit=False)
+    db.commit()
     return {"message": "Policy updated.", "changed": changed_fields}
 
 # ── Email Poll Endpoint ────────────────────────────────────────────────────────
 @router.post("/email/poll")
 def manual_email_poll(
     background_tasks: BackgroundTasks,
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin)
 ):
     """Admin-only ad-hoc trigger to sweep the inbox for valid incoming invoices immediately."""
     background_tasks.add_task(fetch_and_process_emails)
@@ -289,44 +345,29 @@ def manual_email_poll(
 # ── Clients List Endpoint ─────────────────────────────────────────────────────
 @router.get("/clients")
 def admin_list_clients(
+    response: Response,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; omit to return every client"),
+    skip: int = Query(0, ge=0),
+    sort: str = Query("created_at", description="org_name | created_at | total_invoices | approved | rejected | pending"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
 ):
-    """Returns all client organizations with their invoice stats."""
-    from models.all import Organization, Invoice, InvoiceStatus
-    from sqlalchemy import func as sql_func
-
-    orgs = db.query(Organization).all()
-    result = []
-    for org in orgs:
-        users = [u for u in org.users if u.role.value == "client"]
-        if not users:
-            continue
-        invoices = org.invoices
-        total = len(invoices)
-        approved = sum(1 for i in invoices if i.status.value in ("approved", "auto_approved"))
-        rejected = sum(1 for i in invoices if i.status.value == "rejected")
-        pending = sum(1 for i in invoices if i.status.value in ("processing", "under_review"))
-        # Primary user for display
-        primary = users[0]
-        result.append({
-            "id": org.id,
-            "org_name": org.name,
-            "email": primary.email,
-            "full_name": primary.full_name,
-            "avatar_url": primary.avatar_url,
-            "total_invoices": total,
-            "approved": approved,
-            "rejected": rejected,
-            "pending": pending,
-        })
-    return result
+    """Returns client organizations with their invoice stats (optionally paginated; total in X-Total-Count)."""
+    from services.organization_service import list_client_organizations, CLIENT_SORT_KEYS
+
+    if sort not in CLIENT_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(CLIENT_SORT_KEYS)}")
+
+    clients, total = list_client_organizations(db, limit=limit, skip=skip, sort=sort, descending=order == "desc")
+    response.headers["X-Total-Count"] = str(total)
+    return clients
 
 @router.delete("/clients/{organization_id}", status_code=204)
 def delete_client_organization(
     organization_id: str,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin)
+    current_admin: Principal = Depends(require_admin)
 ):
     """Permanently deletes a client organization, cascading to all users, invoices, and policies."""
     from models.all import Organization
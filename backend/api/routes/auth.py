@@ -4,13 +4,13 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import joinedload
 
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-
 from schemas.user import UserCreate, UserResponse, Token, GoogleLoginRequest, UserProfileUpdate
 from models.all import User, Organization, UserRole
-from core.security import get_password_hash, verify_password, create_access_token
+from core.security import (
+    UNUSABLE_PASSWORD, get_password_hash_pooled, verify_password_pooled, password_needs_rehash, create_access_token
+)
 from core.config import settings
+from services.google_identity import verify_google_id_token
 from dependencies import get_db, get_current_user
 from core.limiter import limiter
 
@@ -42,7 +42,7 @@ def register(request: Request, user_in: UserCreate, db: Session = Depends(get_db
     # Create the User mapped to the Organization
     new_user = User(
         email=user_in.email,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=get_password_hash_pooled(user_in.password),
         organization_id=org.id,
         # role defaults to CLIENT in model Base
     )
@@ -60,13 +60,18 @@ def login_access_token(
 ):
     """
     OAuth2 compatible token login, gets an access token for future requests.
+    Hashes made at an older BCRYPT_ROUNDS are transparently upgraded on success.
     """
     user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not verify_password_pooled(form_data.password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
 
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = get_password_hash_pooled(form_data.password)
+        db.commit()
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
     access_token = create_access_token(
@@ -94,12 +99,8 @@ def login_google(
     Also always updates full_name and avatar_url from the Google payload on every login.
     """
     try:
-        # Verify the Google Credential
-        idinfo = id_token.verify_oauth2_token(
-            login_data.credential, 
-            google_requests.Request(), 
-            settings.GOOGLE_CLIENT_ID
-        )
+        # Verify the Google Credential against the cached JWKS (no network on the usual path)
+        idinfo = verify_google_id_token(login_data.credential, settings.GOOGLE_CLIENT_ID)
 
         email = idinfo['email']
         name = idinfo.get('name', 'Google User')
@@ -120,7 +121,7 @@ def login_google(
             
             user = User(
                 email=email,
-                hashed_password=get_password_hash("OAUTH_GOOGLE_PASSWORD_LOCKED"),
+                hashed_password=UNUSABLE_PASSWORD,  # Google-only account: no password sign-in
                 organization_id=org.id,
                 full_name=name,
                 avatar_url=avatar_url,
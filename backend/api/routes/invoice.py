@@ -1,26 +1,33 @@
-from fastapi import APIRouter, Depends, UploadFile, File, BackgroundTasks, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+import json
+import logging
 from pydantic import BaseModel
 
-from dependencies import get_db, require_client
-from models.all import User
-from schemas.invoice_schema import InvoiceResponse, InvoiceListResponse
+from dependencies import get_db, require_client, get_stream_user, get_processing_slots
+from core.principal import Principal
+from models.all import UserRole, InvoiceStatus
+from schemas.invoice_schema import InvoiceResponse, InvoiceListResponse, InvoiceEventSchema
 from services.storage_service import get_file_from_storage, generate_r2_key, generate_presigned_put_url, _is_r2_configured
+from core.config import settings
 from services.invoice_service import (
-    create_invoice_with_background_processing, get_client_invoices, get_client_invoice,
-    log_invoice_event
+    create_invoice_with_background_processing, get_client_invoice,
+    log_invoice_event, InvoiceListFilters, list_invoices_page, count_invoices, load_invoice_detail
 )
 from core.limiter import limiter
+from services.processing_queue import Reservation
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # --- Notifications ---
 @router.get("/notifications")
 def get_notifications(
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_client)
+    current_user: Principal = Depends(require_client)
 ):
     """
     Returns the 15 most-recently updated invoices for the client's org,
@@ -48,6 +55,160 @@ def get_notifications(
     ]
 
 
+# --- Event Ledger Export ---
+@router.get("/events/export")
+def export_org_events(
+    current_user: Principal = Depends(require_client),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    event_type: Optional[List[str]] = Query(None, description="Repeat to match several event types"),
+):
+    """Streams the org's ledger events in [since, until) as newline-delimited JSON."""
+    from services.event_ledger import EventQuery, iter_event_export
+    query = EventQuery(organization_id=current_user.organization_id, since=since, until=until,
+                       event_types=tuple(event_type or ()))
+    return StreamingResponse(
+        iter_event_export(query), media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="invoice-events.ndjson"'},
+    )
+
+
+# --- Organization Analytics ---
+@router.get("/analytics")
+def get_my_analytics(
+    response: Response,
+    current_user: Principal = Depends(require_client)
+):
+    """
+    Compact dashboard numbers for the client's org (pipeline counters, status breakdown,
+    7-day series) so the dashboard no longer derives them from the full invoice list.
+    """
+    from services.analytics_service import get_cached_org_analytics
+    payload, outcome = get_cached_org_analytics(current_user.organization_id)
+    response.headers["X-Cache"] = outcome.upper()
+    return payload
+
+
+# --- Spreadsheet Column Mappings ---
+class ColumnMappingRequest(BaseModel):
+    amount: str
+    vendor: Optional[str] = None
+    number: Optional[str] = None
+    date: Optional[str] = None
+
+
+@router.get("/column-mappings")
+def list_column_mappings(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_client)
+):
+    """Spreadsheet column mappings remembered for the client's org, most used first."""
+    from models.all import SpreadsheetColumnMapping
+    rows = (
+        db.query(SpreadsheetColumnMapping)
+        .filter(SpreadsheetColumnMapping.organization_id == current_user.organization_id)
+        .order_by(SpreadsheetColumnMapping.use_count.desc(), SpreadsheetColumnMapping.id)
+        .all()
+    )
+    return [
+        {"header_signature": r.header_signature, "columns": r.columns, "mapping": r.mapping,
+         "source": r.source, "use_count": r.use_count, "updated_at": r.updated_at or r.created_at}
+        for r in rows
+    ]
+
+
+@router.put("/{invoice_id}/column-mapping")
+def confirm_column_mapping(
+    invoice_id: str,
+    body: ColumnMappingRequest,
+    db: Session = Depends(get_db),
+    slots: Reservation = Depends(get_processing_slots),
+    current_user: Principal = Depends(require_client)
+):
+    """
+    Confirms which columns of a spreadsheet import hold the invoice fields. The mapping is
+    remembered for every later export with the same headers; an import that failed is re-run with it.
+    """
+    from services.column_mapping import remember_mapping
+
+    invoice = get_client_invoice(db, invoice_id, current_user.organization_id)
+    detected = (invoice.extracted_json or {}).get("column_mapping")
+    if not detected:
+        raise HTTPException(status_code=400, detail="Invoice is not a spreadsheet import with detected columns.")
+
+    mapping = body.model_dump()
+    unknown = [column for column in mapping.values() if column is not None and column not in detected["columns"]]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown column(s): {', '.join(unknown)}. Headers found: {', '.join(detected['columns'])}")
+    chosen = [column for column in mapping.values() if column is not None]
+    if len(chosen) != len(set(chosen)):
+        raise HTTPException(status_code=400, detail="Each column can be mapped to one field only.")
+
+    remember_mapping(current_user.organization_id, detected["header_signature"], detected["columns"], mapping, confirmed=True)
+
+    reimport = not detected.get("imported") and invoice.status == InvoiceStatus.UNDER_REVIEW
+    if reimport:
+        from services.spreadsheet_service import process_spreadsheet_background
+        slots.reserve()
+        try:
+            file_bytes, _ = get_file_from_storage(invoice.file_url)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Could not fetch file from storage: {e}")
+        invoice.status = InvoiceStatus.PROCESSING
+        log_invoice_event(db, invoice.id, current_user.id, "PROCESSING_QUEUED", "Re-importing spreadsheet with the confirmed column mapping.")
+        filename = invoice.file_url.split("/")[-1]
+        slots.submit(process_spreadsheet_background, invoice.id, file_bytes, filename, current_user.id)
+
+    return {"invoice_id": invoice_id, "header_signature": detected["header_signature"], "mapping": mapping, "reimport_queued": reimport}
+
+
+# --- Real-time Status Stream (Server-Sent Events) ---
+@router.post("/stream-ticket")
+def issue_stream_ticket(current_user: Principal = Depends(require_client)):
+    """
+    Short-lived, stream-only token for opening /invoices/stream from an EventSource, which
+    can't send an Authorization header. Fetch a fresh one for every (re)connect.
+    """
+    from core.security import create_stream_ticket
+    return {
+        "ticket": create_stream_ticket(current_user.id, current_user.organization_id),
+        "expires_in": settings.STREAM_TICKET_EXPIRE_SECONDS,
+    }
+
+
+@router.get("/stream")
+async def stream_invoice_events(
+    request: Request,
+    invoice_id: Optional[str] = Query(None, description="Only forward events for this invoice"),
+    current_user: Principal = Depends(get_stream_user),
+):
+    """
+    Pushes `status` (invoice status transitions) and `event` (audit trail entries) messages
+    for the caller's org — every org for admins — as they commit, replacing status polling.
+    EventSource can't send headers, so it authenticates with `?ticket=` from POST /invoices/stream-ticket.
+    """
+    from services.event_bus import get_event_bus, ALL_ORGANIZATIONS
+
+    topic = ALL_ORGANIZATIONS if current_user.role == UserRole.ADMIN else current_user.organization_id
+    heartbeat = settings.EVENT_STREAM_HEARTBEAT_SECONDS
+
+    async def event_source():
+        async with get_event_bus().subscribe(topic, invoice_id) as subscription:
+            yield "retry: 5000\n: connected\n\n"
+            while not await request.is_disconnected():
+                payload = await subscription.next(timeout=heartbeat)
+                if payload is None:
+                    yield ": keep-alive\n\n"  # Keeps proxies and tunnels from closing an idle stream
+                    continue
+                yield f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 class PresignedUploadRequest(BaseModel):
     filename: str
     content_type: str
@@ -61,7 +222,7 @@ def request_presigned_upload(
     request: Request,
     body: PresignedUploadRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_client)
+    current_user: Principal = Depends(require_client)
 ):
     """
     Step 1 of direct R2 upload flow.
@@ -70,6 +231,7 @@ def request_presigned_upload(
     then calls /invoices/{id}/trigger-processing to start OCR.
     """
     import re
+    import uuid
     from models.all import Invoice, InvoiceStatus
     safe_filename = re.sub(r'[^a-zA-Z0-9_.-]', '', body.filename) or "unnamed_invoice.pdf"
 
@@ -77,21 +239,24 @@ def request_presigned_upload(
     if not safe_filename.lower().endswith(valid_extensions):
         raise HTTPException(status_code=400, detail="Invalid file format.")
 
-    if body.file_size > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large. Maximum 10MB.")
+    if body.file_size > settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large. Maximum {settings.MAX_UPLOAD_SIZE_MB}MB — use /invoices/multipart-upload for larger documents."
+        )
 
     r2_key = generate_r2_key(current_user.organization_id, safe_filename)
 
-    # Pre-create DB record so the invoice_id exists before upload
+    # Pre-create DB record so the invoice_id exists before upload (id generated here so the
+    # UPLOADED event commits in the same transaction)
     new_invoice = Invoice(
+        id=str(uuid.uuid4()),
         file_url=r2_key,
         status=InvoiceStatus.PROCESSING,
         organization_id=current_user.organization_id,
         uploaded_by=current_user.id
     )
     db.add(new_invoice)
-    db.commit()
-    db.refresh(new_invoice)
     log_invoice_event(db, new_invoice.id, current_user.id, "UPLOADED", f"Invoice {safe_filename} presigned upload initiated.")
 
     if not _is_r2_configured():
@@ -117,9 +282,9 @@ def request_presigned_upload(
 def trigger_invoice_processing(
     request: Request,
     invoice_id: str,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_client)
+    slots: Reservation = Depends(get_processing_slots),
+    current_user: Principal = Depends(require_client)
 ):
     """
     Step 2 of direct R2 upload flow.
@@ -133,6 +298,7 @@ def trigger_invoice_processing(
     if not invoice.file_url:
         raise HTTPException(status_code=400, detail="No file URL associated with invoice.")
 
+    slots.reserve()
     try:
         file_bytes, content_type = get_file_from_storage(invoice.file_url)
     except Exception as e:
@@ -143,22 +309,425 @@ def trigger_invoice_processing(
 
     if filename.lower().endswith((".csv", ".xlsx", ".xls")):
         from services.spreadsheet_service import process_spreadsheet_background
-        background_tasks.add_task(process_spreadsheet_background, invoice.id, file_bytes, filename, current_user.id)
+        slots.submit(process_spreadsheet_background, invoice.id, file_bytes, filename, current_user.id)
     else:
-        background_tasks.add_task(_process_invoice_background, invoice.id, file_bytes, filename, current_user.id)
+        slots.submit(_process_invoice_background, invoice.id, file_bytes, filename, current_user.id)
 
     return {"invoice_id": invoice.id, "status": "processing_queued"}
 
 
+# --- Bulk Upload (one request, one transaction for N files) ---
+class BulkPresignedUploadRequest(BaseModel):
+    files: List[PresignedUploadRequest]
+
+
+class BulkTriggerRequest(BaseModel):
+    invoice_ids: List[str]
+
+
+def _check_bulk_size(count: int):
+    if count == 0:
+        raise HTTPException(status_code=400, detail="No files supplied.")
+    if count > settings.MAX_BULK_UPLOAD_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files. Maximum {settings.MAX_BULK_UPLOAD_FILES} per request.")
+
+
+@router.post("/bulk-presigned-upload")
+@limiter.limit("10/minute")
+def request_bulk_presigned_upload(
+    request: Request,
+    body: BulkPresignedUploadRequest,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_client)
+):
+    """
+    Bulk variant of /presigned-upload. Creates every invoice row and its UPLOADED event
+    in one commit and returns all presigned PUT URLs together. Invalid files are reported
+    in `rejected` instead of failing the whole batch.
+    """
+    from services.invoice_service import create_invoice_batch, sanitize_upload_filename, ALLOWED_UPLOAD_EXTENSIONS
+
+    _check_bulk_size(len(body.files))
+
+    accepted, rejected = [], []
+    for f in body.files:
+        safe_filename = sanitize_upload_filename(f.filename)
+        if not safe_filename.lower().endswith(ALLOWED_UPLOAD_EXTENSIONS):
+            rejected.append({"filename": f.filename, "reason": "Invalid file format."})
+        elif f.file_size > settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+            rejected.append({"filename": f.filename, "reason": f"File too large. Maximum {settings.MAX_UPLOAD_SIZE_MB}MB — use the multipart upload."})
+        else:
+            accepted.append((f, safe_filename, generate_r2_key(current_user.organization_id, safe_filename)))
+
+    invoices = create_invoice_batch(db, current_user.organization_id, current_user.id, [
+        {"r2_key": r2_key, "events": [("UPLOADED", f"Invoice {safe_filename} presigned upload initiated (bulk).")]}
+        for _, safe_filename, r2_key in accepted
+    ]) if accepted else []
+
+    use_fallback = not _is_r2_configured()
+    items = []
+    for (f, safe_filename, r2_key), invoice in zip(accepted, invoices):
+        items.append({
+            "filename": f.filename,
+            "invoice_id": invoice.id,
+            "r2_key": r2_key,
+            "presigned_url": None if use_fallback else generate_presigned_put_url(r2_key, f.content_type),
+            "use_fallback": use_fallback,
+        })
+    return {"items": items, "rejected": rejected}
+
+
+@router.post("/bulk-trigger-processing")
+@limiter.limit("10/minute")
+def trigger_bulk_processing(
+    request: Request,
+    body: BulkTriggerRequest,
+    db: Session = Depends(get_db),
+    slots: Reservation = Depends(get_processing_slots),
+    current_user: Principal = Depends(require_client)
+):
+    """
+    Bulk variant of /{invoice_id}/trigger-processing for files PUT via /bulk-presigned-upload.
+    One org-scoped query, one commit for every PROCESSING_QUEUED event; files are fetched inside the workers.
+    """
+    from models.all import Invoice, InvoiceEvent
+    from services.invoice_service import _process_stored_invoice_background
+
+    _check_bulk_size(len(body.invoice_ids))
+
+    invoices = (
+        db.query(Invoice)
+        .filter(Invoice.id.in_(body.invoice_ids), Invoice.organization_id == current_user.organization_id)
+        .all()
+    )
+    queued = [inv for inv in invoices if inv.file_url]
+    slots.reserve(len(queued))
+    for inv in queued:
+        db.add(InvoiceEvent(
+            invoice_id=inv.id, performed_by=current_user.id, event_type="PROCESSING_QUEUED",
+            message="Triggering OCR pipeline after direct R2 upload (bulk)."
+        ))
+    db.commit()
+
+    for inv in queued:
+        slots.submit(_process_stored_invoice_background, inv.id, current_user.id)
+
+    found = {inv.id for inv in queued}
+    return {
+        "queued": [inv.id for inv in queued],
+        "not_found": [i for i in body.invoice_ids if i not in found],
+    }
+
+
+@router.post("/bulk-upload")
+@limiter.limit("10/minute")
+async def bulk_upload_invoices(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    slots: Reservation = Depends(get_processing_slots),
+    current_user: Principal = Depends(require_client)
+):
+    """
+    Bulk variant of the multipart /upload fallback. All invoice rows and their
+    UPLOADED + PROCESSING_QUEUED events are written in a single transaction.
+    """
+    from services.invoice_service import (
+        create_invoice_batch, sanitize_upload_filename, _process_invoice_background,
+        ALLOWED_UPLOAD_EXTENSIONS, ALLOWED_UPLOAD_MIMES, SPREADSHEET_EXTENSIONS
+    )
+    from services.spreadsheet_service import process_spreadsheet_background
+
+    _check_bulk_size(len(files))
+
+    from services.intelligence_service import create_file_hash
+
+    valid, rejected = [], []
+    for file in files:
+        safe_filename = sanitize_upload_filename(file.filename)
+        if not safe_filename.lower().endswith(ALLOWED_UPLOAD_EXTENSIONS) or file.content_type not in ALLOWED_UPLOAD_MIMES:
+            rejected.append({"filename": file.filename, "reason": "Invalid file format."})
+            continue
+        if file.size and file.size > settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+            rejected.append({"filename": file.filename, "reason": f"File too large. Maximum {settings.MAX_UPLOAD_SIZE_MB}MB — use the multipart upload."})
+            continue
+        valid.append((file, safe_filename))
+
+    # The whole batch is queued or none of it, before any bytes are read into memory
+    slots.reserve(len(valid))
+    accepted = []
+    for file, safe_filename in valid:
+        file_bytes = await file.read()
+        accepted.append((file, file_bytes, safe_filename, generate_r2_key(current_user.organization_id, safe_filename)))
+
+    invoices = create_invoice_batch(db, current_user.organization_id, current_user.id, [
+        {"r2_key": r2_key, "file_hash": create_file_hash(file_bytes), "events": [
+            ("UPLOADED", f"Invoice file {safe_filename} received (bulk)."),
+            ("PROCESSING_QUEUED", "R2 upload + OCR extraction queued in background."),
+        ]}
+        for _, file_bytes, safe_filename, r2_key in accepted
+    ]) if accepted else []
+
+    items = []
+    for (file, file_bytes, safe_filename, r2_key), invoice in zip(accepted, invoices):
+        content_type = file.content_type or "application/octet-stream"
+        worker = process_spreadsheet_background if safe_filename.lower().endswith(SPREADSHEET_EXTENSIONS) else _process_invoice_background
+        slots.submit(worker, invoice.id, file_bytes, safe_filename, current_user.id, r2_key, content_type)
+        items.append({"filename": file.filename, "invoice_id": invoice.id, "status": "processing_queued"})
+
+    return {"items": items, "rejected": rejected}
+
+
+# --- Chunked / Resumable Upload (large scanned statements) ---
+class MultipartUploadRequest(BaseModel):
+    filename: str
+    content_type: str
+    file_size: int
+
+
+class CompletedPart(BaseModel):
+    part_number: int
+    etag: str
+
+
+class CompleteMultipartRequest(BaseModel):
+    # Optional — when omitted (e.g. after a browser refresh) the server lists the stored parts itself
+    parts: Optional[List[CompletedPart]] = None
+
+
+def _get_open_upload_session(db: Session, invoice_id: str, org_id: str):
+    invoice = get_client_invoice(db, invoice_id, org_id)
+    upload_session = invoice.upload_session
+    if not upload_session:
+        raise HTTPException(status_code=404, detail="No chunked upload associated with this invoice.")
+    if upload_session.completed_at:
+        raise HTTPException(status_code=409, detail="Upload already completed.")
+    return invoice, upload_session
+
+
+def _expected_part_count(upload_session) -> int:
+    return max(1, -(-upload_session.file_size // upload_session.part_size))
+
+
+def _expected_part_size(upload_session, part_number: int) -> int:
+    """Every part but the last is exactly part_size; the last carries the remainder."""
+    part_count = _expected_part_count(upload_session)
+    if part_number < part_count:
+        return upload_session.part_size
+    return upload_session.file_size - (part_count - 1) * upload_session.part_size
+
+
+def _describe_upload_session(invoice, upload_session, uploaded_parts: list[dict]) -> dict:
+    """Shared payload for init + resume: which parts exist and where the missing ones go."""
+    from services.storage_service import generate_presigned_part_url
+
+    part_count = _expected_part_count(upload_session)
+    received = {p["part_number"] for p in uploaded_parts}
+    missing = [n for n in range(1, part_count + 1) if n not in received]
+
+    if _is_r2_configured():
+        part_urls = {
+            n: generate_presigned_part_url(invoice.file_url, upload_session.upload_id, n) for n in missing
+        }
+    else:
+        # Local dev — parts are PUT through the API and streamed to disk
+        part_urls = {
+            n: f"{settings.API_V1_STR}/invoices/{invoice.id}/multipart-upload/parts/{n}" for n in missing
+        }
+
+    return {
+        "invoice_id": invoice.id,
+        "upload_id": upload_session.upload_id,
+        "r2_key": invoice.file_url,
+        "part_size": upload_session.part_size,
+        "part_count": part_count,
+        "uploaded_parts": uploaded_parts,
+        "part_urls": part_urls,
+        "use_fallback": not _is_r2_configured(),
+    }
+
+
+@router.post("/multipart-upload")
+@limiter.limit("20/minute")
+def initiate_multipart_upload(
+    request: Request,
+    body: MultipartUploadRequest,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_client)
+):
+    """
+    Step 1 of the chunked upload flow for documents above the single-shot limit.
+    Opens an S3 multipart session (or a local staging folder) and returns one upload URL per part.
+    Parts can be PUT in parallel and in any order; the session survives network drops.
+    """
+    import re
+    import uuid
+    from models.all import Invoice, InvoiceStatus, UploadSession
+    from services.storage_service import create_multipart_upload
+
+    safe_filename = re.sub(r'[^a-zA-Z0-9_.-]', '', body.filename) or "unnamed_invoice.pdf"
+
+    valid_extensions = (".pdf", ".png", ".jpg", ".jpeg", ".csv", ".xlsx", ".xls")
+    if not safe_filename.lower().endswith(valid_extensions):
+        raise HTTPException(status_code=400, detail="Invalid file format.")
+
+    if body.file_size <= 0:
+        raise HTTPException(status_code=400, detail="file_size is required for chunked uploads.")
+    if body.file_size > settings.MAX_MULTIPART_UPLOAD_SIZE_MB * 1024 * 1024:
+        raise HTTPException(status_code=400, detail=f"File too large. Maximum {settings.MAX_MULTIPART_UPLOAD_SIZE_MB}MB.")
+
+    r2_key = generate_r2_key(current_user.organization_id, safe_filename)
+    upload_id = create_multipart_upload(r2_key, body.content_type)
+
+    new_invoice = Invoice(
+        id=str(uuid.uuid4()),
+        file_url=r2_key,
+        status=InvoiceStatus.PROCESSING,
+        organization_id=current_user.organization_id,
+        uploaded_by=current_user.id
+    )
+    new_invoice.upload_session = UploadSession(
+        upload_id=upload_id,
+        content_type=body.content_type,
+        file_size=body.file_size,
+        part_size=settings.MULTIPART_PART_SIZE_MB * 1024 * 1024,
+    )
+    db.add(new_invoice)
+    log_invoice_event(db, new_invoice.id, current_user.id, "UPLOADED", f"Invoice {safe_filename} chunked upload initiated ({body.file_size} bytes).")
+    db.refresh(new_invoice)
+
+    return _describe_upload_session(new_invoice, new_invoice.upload_session, [])
+
+
+@router.get("/{invoice_id}/multipart-upload")
+def resume_multipart_upload(
+    invoice_id: str,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_client)
+):
+    """Resume point: reports the parts already stored and re-issues URLs for the missing ones."""
+    from services.storage_service import list_uploaded_parts
+
+    invoice, upload_session = _get_open_upload_session(db, invoice_id, current_user.organization_id)
+    uploaded_parts = list_uploaded_parts(invoice.file_url, upload_session.upload_id)
+    return _describe_upload_session(invoice, upload_session, uploaded_parts)
+
+
+@router.put("/{invoice_id}/multipart-upload/parts/{part_number}")
+async def upload_local_part(
+    request: Request,
+    invoice_id: str,
+    part_number: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_client)
+):
+    """
+    Local-disk equivalent of a presigned part PUT (used only when R2 is not configured).
+    The raw request body is streamed straight to disk, never buffered whole; the session lookup
+    and file writes run on worker threads so the event loop is never blocked.
+    """
+    from starlette.concurrency import run_in_threadpool
+    from services.storage_service import write_local_part
+
+    if _is_r2_configured():
+        raise HTTPException(status_code=400, detail="Upload parts directly to the presigned URLs.")
+
+    invoice, upload_session = await run_in_threadpool(_get_open_upload_session, db, invoice_id, current_user.organization_id)
+    part_count = _expected_part_count(upload_session)
+    if not 1 <= part_number <= part_count:
+        raise HTTPException(status_code=400, detail=f"part_number must be between 1 and {part_count}.")
+
+    return await write_local_part(
+        upload_session.upload_id, part_number, request.stream(), _expected_part_size(upload_session, part_number)
+    )
+
+
+@router.post("/{invoice_id}/multipart-upload/complete")
+@limiter.limit("20/minute")
+def complete_chunked_upload(
+    request: Request,
+    invoice_id: str,
+    body: Optional[CompleteMultipartRequest] = None,
+    db: Session = Depends(get_db),
+    slots: Reservation = Depends(get_processing_slots),
+    current_user: Principal = Depends(require_client)
+):
+    """
+    Step 2 of the chunked upload flow. Verifies every part arrived, assembles the object
+    in storage and queues the OCR pipeline, which reads the file back inside the worker.
+    """
+    from datetime import datetime, timezone
+    from services.storage_service import list_uploaded_parts, complete_multipart_upload
+    from services.invoice_service import _process_stored_invoice_background
+
+    invoice, upload_session = _get_open_upload_session(db, invoice_id, current_user.organization_id)
+
+    stored_parts = list_uploaded_parts(invoice.file_url, upload_session.upload_id)
+    if body and body.parts:
+        stored_by_number = {p["part_number"]: p for p in stored_parts}
+        for part in body.parts:
+            stored = stored_by_number.get(part.part_number)
+            if not stored or stored["etag"].strip('"') != part.etag.strip('"'):
+                raise HTTPException(status_code=409, detail=f"Part {part.part_number} is missing or does not match its ETag.")
+
+    part_count = _expected_part_count(upload_session)
+    received = sorted(p["part_number"] for p in stored_parts)
+    if received != list(range(1, part_count + 1)):
+        missing = sorted(set(range(1, part_count + 1)) - set(received))
+        raise HTTPException(status_code=409, detail=f"Upload incomplete. Missing parts: {missing}")
+
+    for part in stored_parts:
+        expected_size = _expected_part_size(upload_session, part["part_number"])
+        if part["size"] != expected_size:
+            raise HTTPException(status_code=409, detail=f"Part {part['part_number']} is {part['size']} bytes; expected exactly {expected_size}.")
+
+    received_bytes = sum(p["size"] for p in stored_parts)
+    if received_bytes != upload_session.file_size:
+        raise HTTPException(status_code=409, detail=f"Size mismatch: expected {upload_session.file_size} bytes, received {received_bytes}.")
+
+    slots.reserve()
+    try:
+        complete_multipart_upload(invoice.file_url, upload_session.upload_id, stored_parts)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not assemble upload: {e}")
+
+    upload_session.completed_at = datetime.now(timezone.utc)
+    log_invoice_event(db, invoice.id, current_user.id, "PROCESSING_QUEUED", f"Chunked upload assembled from {part_count} parts. OCR pipeline queued.")
+
+    slots.submit(_process_stored_invoice_background, invoice.id, current_user.id)
+    return {"invoice_id": invoice.id, "status": "processing_queued"}
+
+
+@router.delete("/{invoice_id}/multipart-upload", status_code=204)
+def abort_chunked_upload(
+    invoice_id: str,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_client)
+):
+    """Cancels an unfinished chunked upload, discarding its parts and the placeholder invoice."""
+    from services.storage_service import abort_multipart_upload
+
+    invoice, upload_session = _get_open_upload_session(db, invoice_id, current_user.organization_id)
+    try:
+        abort_multipart_upload(invoice.file_url, upload_session.upload_id)
+    except Exception as e:
+        # Still drop the invoice: R2 lifecycle rules reap orphaned parts, local staging dirs need cleaning by hand
+        logger.warning(f"Could not abort multipart upload {upload_session.upload_id} of invoice {invoice.id}: {e}")
+
+    db.delete(invoice)
+    db.commit()
+    return
+
+
 # --- Client Routes (legacy multipart — kept as fallback for local dev) ---
 @router.post("/upload", response_model=InvoiceResponse)
 @limiter.limit("20/minute")
 async def upload_invoice(
     request: Request,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_client)
+    slots: Reservation = Depends(get_processing_slots),
+    current_user: Principal = Depends(require_client)
 ):
     """
     Legacy multipart upload — used as fallback when R2 is not configured (local dev).
@@ -169,32 +738,74 @@ async def upload_invoice(
         file, 
         current_user.organization_id, 
         current_user.id,
-        background_tasks
+        slots
     )
 
 
 @router.get("/my", response_model=List[InvoiceListResponse])
 def list_my_invoices(
+    response: Response,
     db: Session = Depends(get_db), 
-    current_user: User = Depends(require_client)
+    current_user: Principal = Depends(require_client),
+    limit: int = Query(100, ge=1, le=settings.INVOICE_PAGE_SIZE_MAX, description="Page size"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    status: Optional[List[InvoiceStatus]] = Query(None, description="Repeat to match several statuses"),
+    vendor: Optional[str] = Query(None, description="Case-insensitive vendor name match"),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
 ):
-    """Retrieves all invoices belonging strictly to the user's Organization."""
-    return get_client_invoices(db, current_user.organization_id)
+    """
+    Retrieves the Organization's invoices newest-first, one keyset page at a time.
+    The body stays a plain list; the next page's cursor and the (cached) total travel in headers.
+    """
+    filters = InvoiceListFilters(
+        organization_id=current_user.organization_id, statuses=tuple(status or ()), vendor=vendor,
+        created_from=created_from, created_to=created_to, min_amount=min_amount, max_amount=max_amount,
+    )
+    items, next_cursor = list_invoices_page(db, filters, limit, cursor)
+    total, _ = count_invoices(db, filters)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["X-Total-Count"] = str(total)
+    return items
 
 @router.get("/{invoice_id}", response_model=InvoiceResponse)
 def get_invoice_details(
     invoice_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_client)
+    current_user: Principal = Depends(require_client)
 ):
     """Retrieves a specific invoice, rigidly assuring the user belongs to its respective Organization."""
-    return get_client_invoice(db, invoice_id, current_user.organization_id)
+    return get_client_invoice(db, invoice_id, current_user.organization_id, with_events=True)
+
+
+@router.get("/{invoice_id}/events", response_model=List[InvoiceEventSchema])
+def list_invoice_events(
+    invoice_id: str,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_client),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    limit: int = Query(100, ge=1, le=settings.INVOICE_PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+):
+    """One invoice's audit trail oldest-first, optionally bounded to [since, until)."""
+    from services.event_ledger import EventQuery, list_events
+    get_client_invoice(db, invoice_id, current_user.organization_id)
+    query = EventQuery(organization_id=current_user.organization_id, invoice_id=invoice_id, since=since, until=until)
+    events, next_cursor = list_events(db, query, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return events
 
 @router.get("/{invoice_id}/status")
 def get_invoice_polling_status(
     invoice_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_client)
+    current_user: Principal = Depends(require_client)
 ):
     """
     Lightweight endpoint allowing frontend applications to poll the `PROCESSING` 
@@ -213,7 +824,7 @@ from fastapi.responses import Response
 def get_invoice_file_blob(
     invoice_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_client)
+    current_user: Principal = Depends(require_client)
 ):
     """
     Securely streams the raw physical bytes of the uploaded PDF or Image directly to the UI for Split-Screen Review.
@@ -231,7 +842,7 @@ def get_invoice_file_blob(
 def delete_invoice(
     invoice_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_client)
+    current_user: Principal = Depends(require_client)
 ):
     """
     Permanently deletes an invoice (DB record + R2 file) belonging to the user's org.
@@ -249,9 +860,13 @@ def delete_invoice(
     # Try to delete from R2/storage (best-effort, don't fail if missing)
     if invoice.file_url:
         try:
-            delete_from_storage(invoice.file_url)
+            if invoice.upload_session and not invoice.upload_session.completed_at:
+                from services.storage_service import abort_multipart_upload
+                abort_multipart_upload(invoice.file_url, invoice.upload_session.upload_id)
+            else:
+                delete_from_storage(invoice.file_url)
         except Exception as e:
-            pass  # Log but don't block
+            logger.warning(f"Could not delete stored file of invoice {invoice.id} ({invoice.file_url}): {e}")  # Don't block
 
     db.delete(invoice)
     db.commit()
@@ -261,9 +876,9 @@ def delete_invoice(
 @router.post("/{invoice_id}/reprocess", response_model=InvoiceResponse)
 async def reprocess_invoice(
     invoice_id: str,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_client)
+    slots: Reservation = Depends(get_processing_slots),
+    current_user: Principal = Depends(require_client)
 ):
     """
     Re-triggers the AI extraction pipeline on an invoice stuck in PROCESSING or UNDER_REVIEW.
@@ -280,6 +895,7 @@ async def reprocess_invoice(
     if invoice.status == InvoiceStatus.APPROVED:
         raise HTTPException(status_code=409, detail="Cannot reprocess a manually approved invoice.")
 
+    slots.reserve()
     # Fetch the original file bytes from storage
     file_bytes, _ = get_file_from_storage(invoice.file_url)
     filename = invoice.file_url.split("/")[-1]
@@ -292,11 +908,12 @@ async def reprocess_invoice(
     invoice.total_amount = None
     invoice.extracted_json = None
     invoice.duplicate_flag = False
+    invoice.duplicate_of = None
     invoice.fraud_flag = False
     db.commit()
-    db.refresh(invoice)
+    invoice = load_invoice_detail(db, invoice_id)
 
     # Re-run the background AI pipeline
-    background_tasks.add_task(_process_invoice_background, invoice.id, file_bytes, filename, current_user.id)
+    slots.submit(_process_invoice_background, invoice.id, file_bytes, filename, current_user.id)
 
     return invoice
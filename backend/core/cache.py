@@ -0,0 +1,134 @@
+"""
+In-process stale-while-revalidate cache for expensive read models (dashboard analytics).
+
+- fresh  (age < ttl):            served from memory
+- stale  (ttl <= age < max_age): served from memory while one background refresh runs
+- absent/too old:                computed inline; concurrent callers wait for a single computation
+
+invalidate() marks entries stale rather than dropping them, so a burst of invoice updates
+never turns into a burst of synchronous recomputations. The cache is per worker process;
+the TTL bounds how far workers can drift from each other.
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="swr-refresh")
+
+
+@dataclass
+class _Entry:
+    value: Any
+    computed_at: float
+    invalidated: bool = False
+
+
+class SWRCache:
+    def __init__(self, name: str, ttl: float, max_age: float, max_entries: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._entries: dict[Hashable, _Entry] = {}
+        self._key_locks: dict[Hashable, threading.Lock] = {}
+        self._refreshing: set = set()
+        self._invalidated_at: dict[Hashable, float] = {}
+        self._all_invalidated_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0, "invalidations": 0}
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _store(self, key: Hashable, value: Any, started_at: float):
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k].computed_at)
+                self._entries.pop(oldest, None)
+                self._key_locks.pop(oldest, None)
+                self._invalidated_at.pop(oldest, None)
+            # An invalidation that landed mid-computation means the value may already be outdated
+            outdated = max(self._invalidated_at.get(key, 0.0), self._all_invalidated_at) >= started_at
+            self._entries[key] = _Entry(value=value, computed_at=started_at, invalidated=outdated)
+
+    def _refresh(self, key: Hashable, compute: Callable[[], Any]):
+        started_at = time.monotonic()
+        try:
+            self._store(key, compute(), started_at)
+            self._count("refreshes")
+        except Exception as e:
+            # Keep serving the stale value; the next stale read schedules another attempt
+            self._count("refresh_errors")
+            logger.warning(f"Cache '{self.name}' background refresh failed for {key!r}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> tuple[Any, str]:
+        """Returns (value, outcome) where outcome is "hit", "stale" or "miss"."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            age = now - entry.computed_at
+            if age < self.ttl and not entry.invalidated:
+                self._count("hits")
+                return entry.value, "hit"
+            if age < self.max_age:
+                self._count("stale_hits")
+                with self._lock:
+                    schedule = key not in self._refreshing
+                    self._refreshing.add(key)
+                if schedule:
+                    _refresh_pool.submit(self._refresh, key, compute)
+                return entry.value, "stale"
+
+        # Single-flight: the first caller computes, the others wait and reuse its result
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.computed_at < self.ttl and not entry.invalidated:
+                self._count("hits")
+                return entry.value, "hit"
+            self._count("misses")
+            started_at = time.monotonic()
+            value = compute()
+            self._store(key, value, started_at)
+            return value, "miss"
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Marks one entry (or every entry) stale; the next read serves it once and refreshes."""
+        now = time.monotonic()
+        with self._lock:
+            if key is None:
+                self._all_invalidated_at = now
+                targets = list(self._entries)
+            else:
+                if key in self._entries or key in self._key_locks:
+                    self._invalidated_at[key] = now
+                targets = [key]
+            for k in targets:
+                if k in self._entries:
+                    self._entries[k].invalidated = True
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["stale_hits"] + self._stats["misses"]
+            served = self._stats["hits"] + self._stats["stale_hits"]
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                **self._stats,
+                "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+            }
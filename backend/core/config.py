@@ -11,11 +11,19 @@ class Settings(BaseSettings):
 
     # Database — defaults to SQLite locally, override via .env on Render
     DATABASE_URL: str = "sqlite:///./invoiceai_local.db"
+    RUN_MIGRATIONS_ON_STARTUP: bool = True  # Otherwise run `python -m migrations upgrade` before deploying
 
     # Security & Authentication
     SECRET_KEY: str = "SUPER_SECRET_DEVELOPMENT_KEY_PLEASE_CHANGE"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7 # 7 Days for MVP convenience
+    AUTH_PRINCIPAL_CACHE_SECONDS: int = 60  # How long a worker trusts a user's cached role/active flag (0 = always re-read)
+    STREAM_TICKET_EXPIRE_SECONDS: int = 60  # Lifetime of the stream-only token an EventSource carries in its URL
+
+    # Password hashing — bcrypt runs on its own small pool so login bursts can't starve request workers
+    BCRYPT_ROUNDS: int = 12  # Older hashes are upgraded to this cost on the user's next successful login
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 8  # Waiting hashes each hold a request thread; beyond workers + queue → 503
 
     # 3rd Party
     GROQ_API_KEY: str = ""
@@ -24,12 +32,65 @@ class Settings(BaseSettings):
     R2_ENDPOINT_URL: str = ""
     R2_BUCKET_NAME: str = "invoiceai-storage"
 
+    # Upload limits — single-shot uploads are buffered in RAM, multipart uploads are not
+    MAX_UPLOAD_SIZE_MB: int = 10
+    MAX_MULTIPART_UPLOAD_SIZE_MB: int = 100
+    MULTIPART_PART_SIZE_MB: int = 8  # S3/R2 require >= 5MB for every part except the last
+    MAX_BULK_UPLOAD_FILES: int = 100
+    SPREADSHEET_INSERT_CHUNK_ROWS: int = 5000  # Rows per COPY / executemany batch of a spreadsheet import
+
+    # Document processing pool shared by uploads and email — producers wait when the queue is full
+    PROCESSING_WORKERS: int = 2
+    PROCESSING_QUEUE_SIZE: int = 32  # Upload jobs carry their file bytes, so this bounds their memory too
+    PROCESSING_RETRY_AFTER_SECONDS: int = 10  # Retry-After on the 503 a request gets while the queue is full
+
+    # Invoice listings — totals are cached briefly; huge unfiltered tables report the planner's estimate
+    INVOICE_PAGE_SIZE_MAX: int = 500
+    INVOICE_COUNT_CACHE_SECONDS: int = 30
+    INVOICE_COUNT_ESTIMATE_THRESHOLD: int = 100_000
+
+    # Dashboard analytics cache — fresh for the TTL, then served stale while it refreshes in the background
+    ANALYTICS_CACHE_TTL_SECONDS: int = 15
+    ANALYTICS_CACHE_MAX_AGE_SECONDS: int = 300
+
+    # Real-time push — "memory" (single worker) or "postgres" (LISTEN/NOTIFY across workers)
+    EVENT_BUS_BACKEND: str = "memory"
+    EVENT_STREAM_HEARTBEAT_SECONDS: int = 15
+
+    # Event ledger — months older than the retention window are archived to storage as gzip'd
+    # JSON lines, then removed (0 keeps every event in the database forever)
+    EVENT_RETENTION_DAYS: int = 0
+    EVENT_PARTITION_MONTHS_AHEAD: int = 3  # Postgres only: monthly partitions kept pre-created
+    EVENT_EXPORT_BATCH_SIZE: int = 1000
+
+    # Near-duplicate detection — MinHash text similarity at or above this flags a re-scan
+    NEAR_DUPLICATE_THRESHOLD: float = 0.85
+
     # Email Integration
     EMAIL_ADDRESS: str = ""
     EMAIL_PASSWORD: str = ""
     EMAIL_IMAP_SERVER: str = "imap.gmail.com"
     EMAIL_IMAP_PORT: int = 993
+    EMAIL_IMAP_SSL: bool = True  # False for a plain-text local IMAP stand-in (scripts/imap_standin.py)
+    EMAIL_IMAP_IDLE: bool = True  # Keep one session open and wait in IDLE; False = reconnect and poll every EMAIL_POLL_SECONDS
+    EMAIL_POLL_SECONDS: int = 60  # Also the fallback interval on servers without IDLE
+    EMAIL_IDLE_REFRESH_SECONDS: int = 300  # Re-issue IDLE this often; servers and NATs drop idle sessions after a while
+    EMAIL_FETCH_BATCH_SIZE: int = 50  # Messages per UID FETCH
+    EMAIL_SENDER_CACHE_SECONDS: int = 300  # Sender directory snapshot lifetime; user changes in this worker evict it at once
+    EMAIL_SENDER_ALLOWLIST: dict[str, str] = {}  # {"ap@vendor.com" or "@vendor.com": "registered.user@acme.com"}
+    EMAIL_SENDER_DOMAIN_MATCHING: bool = False  # File unknown senders under the organization that owns their (non-public) domain
+
+    # Outbound notifications — status emails go through an outbox and one reused SMTP connection
+    EMAIL_SMTP_SERVER: str = "smtp.gmail.com"
+    EMAIL_SMTP_PORT: int = 465  # 465 = implicit TLS, anything else = STARTTLS
+    EMAIL_SMTP_TLS: bool = True  # False only for a plain-text local SMTP stand-in (scripts/smtp_standin.py)
+    SMTP_IDLE_SECONDS: int = 60  # Close the pooled connection after this long without a send
+    NOTIFICATION_DIGEST_SECONDS: int = 0  # Hold a recipient's notifications this long and send them as one digest (0 = no wait)
+    NOTIFICATION_MAX_ATTEMPTS: int = 5
+    NOTIFICATION_RETRY_SECONDS: int = 60  # First retry delay; doubles per attempt
+    NOTIFICATION_POLL_SECONDS: int = 30  # Safety sweep; committing a notification wakes the sender immediately
     GOOGLE_CLIENT_ID: str = ""
+    GOOGLE_JWKS_FILE: str = ""  # Pin Google's signing keys from a local JWKS file (offline tests); empty = fetch and cache
 
     # OCR / Tesseract — local paths by default, override via env var for Docker/Render
     TESSDATA_PREFIX: str = "/home/ashish/python/share/tessdata"
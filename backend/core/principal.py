@@ -0,0 +1,110 @@
+"""
+Authenticated principal and its per-worker cache.
+
+Requests authenticate from the signed JWT claims plus a short-TTL cache of each user's current
+role, organization and active flag, so the hot path (status polls, listings) never queries
+the users table just to authorize. Any committed change to a User (deactivation, role or org
+change, deletion — including via an Organization delete) evicts that user in this worker;
+other workers converge within AUTH_PRINCIPAL_CACHE_SECONDS.
+"""
+import time
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from models.all import Organization, User, UserRole
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The caller of a request — a detached snapshot, safe to share across threads and sessions."""
+    id: str
+    email: str
+    role: UserRole
+    organization_id: str
+    is_active: bool = True
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(id=user.id, email=user.email, role=user.role,
+                   organization_id=user.organization_id, is_active=bool(user.is_active))
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: dict[str, tuple[Principal, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, load: Callable[[str], Optional[Principal]]) -> Optional[Principal]:
+        """Cached principal for the user, calling `load` (a DB read) when absent or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        principal = load(user_id)
+        if principal is not None and self.ttl > 0:
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+                    if len(self._entries) >= self.max_entries:
+                        self._entries.pop(min(self._entries, key=lambda k: self._entries[k][1]))
+                self._entries[user_id] = (principal, now + self.ttl)
+        return principal
+
+    def invalidate(self, user_id: Optional[str] = None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def invalidate_organization(self, organization_id: str):
+        with self._lock:
+            for user_id in [k for k, (p, _) in self._entries.items() if p.organization_id == organization_id]:
+                del self._entries[user_id]
+
+
+principal_cache = PrincipalCache(ttl=settings.AUTH_PRINCIPAL_CACHE_SECONDS)
+
+
+# ── Invalidation ──────────────────────────────────────────────────────────────
+# Evict at flush and again after commit: a concurrent request that reloads between the two
+# would otherwise cache the pre-commit row for a full TTL.
+
+def _evict(session, users: set, organizations: set):
+    for user_id in users:
+        principal_cache.invalidate(user_id)
+    for organization_id in organizations:
+        principal_cache.invalidate_organization(organization_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_principal_changes(session, flush_context):
+    users = {obj.id for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)}
+    organizations = {obj.id for obj in session.deleted if isinstance(obj, Organization)}
+    if not users and not organizations:
+        return
+    _evict(session, users, organizations)
+    pending = session.info.setdefault("principal_evictions", (set(), set()))
+    pending[0].update(users)
+    pending[1].update(organizations)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed_principals(session):
+    pending = session.info.pop("principal_evictions", None)
+    if pending:
+        _evict(session, *pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_changes(session):
+    session.info.pop("principal_evictions", None)
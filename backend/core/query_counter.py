@@ -0,0 +1,39 @@
+"""
+SQL statement counter for catching lazy loads and N+1 regressions.
+
+    with count_queries(engine) as counter:
+        client.get("/api/v1/invoices/...")
+    counter.count, counter.statements
+
+Counts every statement the engine sends to the database from any thread while the block
+is active (TestClient runs the app on a separate thread).
+"""
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: list[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.statements.append(" ".join(statement.split()))
+
+
+@contextmanager
+def count_queries(engine: Engine):
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._record)
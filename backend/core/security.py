@@ -1,9 +1,19 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Any, Union
+from fastapi import HTTPException
 from jose import jwt
 import bcrypt
 from core.config import settings
 
+# Stored for accounts that sign in through an identity provider only: never a valid bcrypt hash,
+# so it can't match any password and costs nothing to create or check.
+UNUSABLE_PASSWORD = "!"
+
+# `scope` claim of stream tickets — accepted only by the SSE endpoint, never as a Bearer token
+STREAM_TOKEN_SCOPE = "stream"
+
 def create_access_token(subject: Union[str, Any], roles: list[str], organization_id: str, expires_delta: Optional[timedelta] = None) -> str:
     """Generates a JWT Token containing the User ID, their Roles, and their attached Organization."""
     if expires_delta:
@@ -21,11 +31,66 @@ def create_access_token(subject: Union[str, Any], roles: list[str], organization
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def create_stream_ticket(subject: Union[str, Any], organization_id: str) -> str:
+    """
+    Short-lived token that can only open event streams. EventSource can't send headers, so it
+    ends up in a URL (and in access logs); a login token must never travel that way.
+    """
+    expire = datetime.utcnow() + timedelta(seconds=settings.STREAM_TICKET_EXPIRE_SECONDS)
+    to_encode = {
+        "exp": expire,
+        "sub": str(subject),
+        "org_id": str(organization_id),
+        "scope": STREAM_TOKEN_SCOPE,
+    }
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+def has_usable_password(hashed_password: Optional[str]) -> bool:
+    return bool(hashed_password) and not hashed_password.startswith(UNUSABLE_PASSWORD)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plain password against the stored bcrypt hash."""
+    if not has_usable_password(hashed_password):
+        return False
     return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
 def get_password_hash(password: str) -> str:
-    """Hashes a password with bcrypt and returns the hash as a string."""
-    hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+    """Hashes a password with bcrypt at BCRYPT_ROUNDS and returns the hash as a string."""
+    hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS))
     return hashed.decode("utf-8")
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True when a usable hash was made at a different cost than BCRYPT_ROUNDS ($2b$<cost>$...)."""
+    if not has_usable_password(hashed_password):
+        return False
+    try:
+        return int(hashed_password.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+# ── Pooled hashing ────────────────────────────────────────────────────────────
+# bcrypt holds a CPU for ~250ms at cost 12. It runs on a dedicated pool sized to the CPU budget
+# for hashing; the (sync) route waits on the result, so a login burst can occupy at most
+# workers + queue request threads, and anything beyond that is answered with a 503 right away
+# rather than queueing logins behind each other until they time out.
+
+_hash_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE)
+
+def _run_hashing(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Too many sign-in attempts in progress, please retry",
+                            headers={"Retry-After": "1"})
+    try:
+        return _hash_pool.submit(fn, *args).result()
+    finally:
+        _hash_slots.release()
+
+def verify_password_pooled(plain_password: str, hashed_password: str) -> bool:
+    if not has_usable_password(hashed_password):
+        return False
+    return _run_hashing(verify_password, plain_password, hashed_password)
+
+def get_password_hash_pooled(password: str) -> str:
+    return _run_hashing(get_password_hash, password)
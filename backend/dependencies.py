@@ -1,5 +1,5 @@
-from typing import Generator
-from fastapi import Depends, HTTPException, status
+from typing import Generator, Optional
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
@@ -10,6 +10,8 @@ import urllib.parse
 from core.config import settings
 from schemas.user import TokenPayload
 from models.all import User, UserRole
+from core.principal import Principal, principal_cache
+from core.security import STREAM_TOKEN_SCOPE
 
 # Engine setup
 db_url = settings.DATABASE_URL
@@ -48,12 +50,36 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+def get_processing_slots() -> Generator:
+    """
+    Processing-queue slots for this request. Routes reserve what they need before storing
+    anything; slots reserved but never used are handed back once the request is done.
+    """
+    from services.processing_queue import processing_queue
+    reservation = processing_queue.reservation()
+    try:
+        yield reservation
+    finally:
+        reservation.release()
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
-    """Decodes JWT, validates existence, returns the ORM User instance."""
+def _load_principal(user_id: str) -> Optional[Principal]:
+    # A session of its own, closed right away: authorizing never pins the request's connection
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        return Principal.from_user(user) if user else None
+    finally:
+        db.close()
+
+def _authenticate_token(token: str, scope: Optional[str] = None) -> Principal:
+    """
+    Verifies the JWT signature and resolves its `sub` through the principal cache, so a DB read
+    only happens once per user per AUTH_PRINCIPAL_CACHE_SECONDS. Role and organization come
+    from the cached user row, not the token, so changes apply without re-login.
+    The token's `scope` claim must match exactly: login tokens carry none, stream tickets "stream".
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -66,15 +92,50 @@ def get_current_user(
         token_data = TokenPayload(**payload)
     except JWTError:
         raise credentials_exception
-        
-    user = db.query(User).filter(User.id == token_data.sub).first()
-    if not user:
+    if not token_data.sub or token_data.scope != scope:
+        raise credentials_exception
+
+    principal = principal_cache.get(token_data.sub, _load_principal)
+    if not principal:
         raise credentials_exception
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    return principal
+
+def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """The authenticated caller, without touching the database on a cache hit."""
+    return _authenticate_token(token)
+
+def get_current_user(
+    db: Session = Depends(get_db), principal: Principal = Depends(get_current_principal)
+) -> User:
+    """The caller's ORM User in the request session — only for endpoints that read or edit the profile."""
+    user = db.query(User).filter(User.id == principal.id).first()
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
     return user
 
-def require_admin(current_user: User = Depends(get_current_user)) -> User:
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login", auto_error=False)
+
+def get_stream_user(
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+    ticket: Optional[str] = Query(None, description="Stream ticket from POST /invoices/stream-ticket (EventSource)"),
+) -> Principal:
+    """
+    Auth for long-lived streams. Accepts the usual Bearer header or, since EventSource cannot
+    set headers, a short-lived stream ticket as `?ticket=` — never the login token itself.
+    """
+    if header_token:
+        return _authenticate_token(header_token)
+    if ticket:
+        return _authenticate_token(ticket, scope=STREAM_TOKEN_SCOPE)
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def require_admin(current_user: Principal = Depends(get_current_principal)) -> Principal:
     """Enforces Admin role."""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -82,7 +143,7 @@ def require_admin(current_user: User = Depends(get_current_user)) -> User:
         )
     return current_user
 
-def require_client(current_user: User = Depends(get_current_user)) -> User:
+def require_client(current_user: Principal = Depends(get_current_principal)) -> Principal:
     """Enforces Client (or Higher) role."""
     # Since admin is higher, we allow them. If strict routing is needed, check explicitly.
     if current_user.role not in [UserRole.CLIENT, UserRole.ADMIN]:
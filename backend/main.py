@@ -5,8 +5,7 @@ from core.config import settings
 from slowapi.errors import RateLimitExceeded
 from slowapi import _rate_limit_exceeded_handler
 
-# Import Database Base models so SQLAlchemy can create tables
-from models.base import Base
+# Import Database models so every mapper is registered before the first query
 from dependencies import engine
 from models.all import *
 
@@ -18,11 +17,10 @@ from core.logger import logger
 from core.limiter import limiter
 
 from contextlib import asynccontextmanager
+from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
-from services.email_service import fetch_and_process_emails
-
-# Tell SQLAlchemy to physically create tables if they do not exist
-Base.metadata.create_all(bind=engine)
+from services.email_service import fetch_and_process_emails, mailbox_watcher
+from services.notification_service import notification_sender
 
 def _seed_admin():
     """Auto-create a default admin account on first startup if it doesn't exist."""
@@ -63,19 +61,48 @@ async def lifespan(app: FastAPI):
     pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_CMD
     logger.info(f"Tesseract Initialized: {settings.TESSERACT_CMD} (Prefix: {settings.TESSDATA_PREFIX})")
     
+    # Apply pending schema migrations (disable on multi-instance deploys and run `python -m migrations upgrade` instead)
+    if settings.RUN_MIGRATIONS_ON_STARTUP:
+        from migrations import upgrade
+        applied = upgrade(engine)
+        if applied:
+            logger.info(f"✅ Applied {len(applied)} schema migration(s): {', '.join(applied)}")
+
     _seed_admin()
 
     # Configure R2 CORS so browsers can PUT files directly to R2 (bypassing tunnel)
     from services.storage_service import configure_r2_cors
     configure_r2_cors()
 
+    # Load Google's signing keys now rather than on the first SSO login
+    if settings.GOOGLE_CLIENT_ID:
+        from services.google_identity import google_jwks
+        google_jwks.prefetch()
+
     scheduler = BackgroundScheduler()
-    scheduler.add_job(fetch_and_process_emails, 'interval', seconds=60, id='email_poll_job')
+    # Inbox: a long-lived IDLE session picks up mail within seconds; otherwise poll on a fresh connection
+    watch_mailbox = settings.EMAIL_IMAP_IDLE and settings.EMAIL_ADDRESS and settings.EMAIL_PASSWORD
+    if watch_mailbox:
+        mailbox_watcher.start()
+    else:
+        scheduler.add_job(fetch_and_process_emails, 'interval', seconds=settings.EMAIL_POLL_SECONDS, id='email_poll_job')
+    from services.event_ledger import run_event_maintenance
+    scheduler.add_job(run_event_maintenance, 'interval', hours=24, id='event_ledger_job', next_run_time=datetime.now())
     scheduler.start()
-    logger.info("APScheduler Email Polling started... (Interval: 60s)")
+    # Outbound status emails: drained from the outbox over one reused SMTP connection
+    send_notifications = bool(settings.EMAIL_ADDRESS and settings.EMAIL_PASSWORD)
+    if send_notifications:
+        notification_sender.start()
+    logger.info("IMAP watcher started" if watch_mailbox else f"APScheduler Email Polling started... (Interval: {settings.EMAIL_POLL_SECONDS}s)")
     yield
     # Shutdown Events
     scheduler.shutdown()
+    if watch_mailbox:
+        mailbox_watcher.stop()
+    if send_notifications:
+        notification_sender.stop()
+    from services.event_bus import stop_event_bus
+    stop_event_bus()
     logger.info("APScheduler safely shut down.")
 
 app = FastAPI(
@@ -111,6 +138,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],  # Pagination metadata on list endpoints
 )
 
 # Include Authentication & App Routers
@@ -0,0 +1,15 @@
+"""
+Versioned schema migrations.
+
+Every file in migrations/versions/ named NNNN_description.py defines `upgrade(op)` and is
+applied once, in order, with its version recorded in the `schema_migrations` table.
+Startup (or `python -m migrations upgrade`) only reads that table — the schema is reflected
+just for the migrations that are actually pending.
+
+Migration steps go through `MigrationOps`, whose helpers are idempotent (they check the
+live schema first), so a migration interrupted halfway can simply be re-run. Indexes on
+Postgres are built CONCURRENTLY so large tables stay writable during a deploy.
+"""
+from migrations.runner import MigrationOps, applied_versions, pending_migrations, upgrade
+
+__all__ = ["MigrationOps", "applied_versions", "pending_migrations", "upgrade"]
@@ -0,0 +1,35 @@
+"""
+Usage (from backend/):
+    python -m migrations status
+    python -m migrations upgrade [--to 0003]
+"""
+import argparse
+import logging
+
+from migrations.runner import applied_versions, discover_migrations, upgrade
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="InvoiceAI schema migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="List migrations and whether they have been applied")
+    up = sub.add_parser("upgrade", help="Apply pending migrations")
+    up.add_argument("--to", dest="target", default=None, help="Stop after this version")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    from dependencies import engine
+
+    if args.command == "status":
+        applied = applied_versions(engine)
+        for migration in discover_migrations():
+            stamp = applied.get(migration.version)
+            state = f"applied {stamp:%Y-%m-%d %H:%M}" if stamp else "pending"
+            print(f"{migration.version}  {state:<22}  {migration.description}")
+    else:
+        versions = upgrade(engine, target=args.target)
+        print(f"Applied {len(versions)} migration(s){': ' + ', '.join(versions) if versions else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import re
+import logging
+import importlib
+import pkgutil
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import ModuleType
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+
+logger = logging.getLogger(__name__)
+
+# Kept out of Base.metadata so model-level create_all/drop_all never touch the ledger
+MIGRATIONS_TABLE = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", String(32), primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime(timezone=True)),
+)
+
+# Arbitrary constant shared by every worker — serializes concurrent `upgrade` runs on Postgres
+_ADVISORY_LOCK_KEY = 7_340_219_001
+_VERSION_MODULE_RE = re.compile(r"^(\d{4})_(\w+)$")
+
+
+@dataclass
+class Migration:
+    version: str
+    description: str
+    module: ModuleType
+
+
+class MigrationOps:
+    """Idempotent schema operations handed to each migration's `upgrade(op)`."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.is_postgres = self.dialect == "postgresql"
+
+    # ── Introspection (a fresh inspector each time — DDL invalidates its cache) ──
+    def has_table(self, table_name: str) -> bool:
+        return inspect(self.engine).has_table(table_name)
+
+    def has_column(self, table_name: str, column_name: str) -> bool:
+        return any(c["name"] == column_name for c in inspect(self.engine).get_columns(table_name))
+
+    def has_index(self, table_name: str, index_name: str) -> bool:
+        return any(ix["name"] == index_name for ix in inspect(self.engine).get_indexes(table_name))
+
+    # ── DDL ──
+    def execute(self, sql: str, autocommit: bool = False, **params):
+        """Runs raw SQL. `autocommit=True` is required for statements Postgres refuses inside a transaction."""
+        if autocommit:
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                return conn.execute(text(sql), params)
+        with self.engine.begin() as conn:
+            return conn.execute(text(sql), params)
+
+    def create_table(self, table: Table):
+        """Creates the table (with its declared indexes) if it does not exist yet."""
+        if not self.has_table(table.name):
+            logger.info(f"Creating table {table.name}...")
+            table.create(bind=self.engine, checkfirst=True)
+
+    def add_column(self, table_name: str, column_name: str, ddl: str):
+        """`ddl` is the column definition after its name, e.g. "VARCHAR(64)" or "VARCHAR REFERENCES invoices(id)"."""
+        if not self.has_column(table_name, column_name):
+            logger.info(f"Adding column {table_name}.{column_name}...")
+            self.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}")
+
+    def create_index(self, index: Index):
+        """Builds a model-declared index; CONCURRENTLY on Postgres so writes are never blocked."""
+        if self.has_index(index.table.name, index.name):
+            return
+        logger.info(f"Creating index {index.name} on {index.table.name}...")
+        if self.is_postgres:
+            ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=self.engine.dialect))
+            self.execute(re.sub(r"\bINDEX\b", "INDEX CONCURRENTLY", ddl, count=1), autocommit=True)
+        else:
+            index.create(bind=self.engine, checkfirst=True)
+
+    def add_enum_value(self, type_name: str, value: str):
+        """Native enums only exist on Postgres; elsewhere SQLAlchemy stores enum names as plain strings."""
+        if self.is_postgres:
+            # ADD VALUE cannot run inside a transaction block before Postgres 12
+            self.execute(f"ALTER TYPE {type_name} ADD VALUE IF NOT EXISTS '{value}'", autocommit=True)
+
+
+def discover_migrations() -> list[Migration]:
+    from migrations import versions
+
+    migrations = []
+    for info in pkgutil.iter_modules(versions.__path__):
+        match = _VERSION_MODULE_RE.match(info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"migrations.versions.{info.name}")
+        # The docstring's first paragraph, folded onto one line
+        summary = (module.__doc__ or match.group(2).replace("_", " ")).strip().split("\n\n")[0]
+        description = " ".join(summary.split())
+        migrations.append(Migration(version=match.group(1), description=description, module=module))
+    return sorted(migrations, key=lambda m: m.version)
+
+
+def applied_versions(engine: Engine) -> dict[str, datetime]:
+    MIGRATIONS_TABLE.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        rows = conn.execute(select(MIGRATIONS_TABLE.c.version, MIGRATIONS_TABLE.c.applied_at)).all()
+    return {row.version: row.applied_at for row in rows}
+
+
+def pending_migrations(engine: Engine) -> list[Migration]:
+    applied = applied_versions(engine)
+    return [m for m in discover_migrations() if m.version not in applied]
+
+
+@contextmanager
+def _migration_lock(engine: Engine):
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+
+
+def upgrade(engine: Engine, target: Optional[str] = None) -> list[str]:
+    """Applies every pending migration up to and including `target` (default: latest). Returns applied versions."""
+    if not pending_migrations(engine):
+        return []
+
+    applied = []
+    with _migration_lock(engine):
+        # Re-read under the lock: another worker may have finished the job while we waited
+        for migration in pending_migrations(engine):
+            if target and migration.version > target:
+                break
+            logger.info(f"Applying migration {migration.version}: {migration.description}")
+            migration.module.upgrade(MigrationOps(engine))
+            with engine.begin() as conn:
+                conn.execute(MIGRATIONS_TABLE.insert().values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=datetime.now(timezone.utc),
+                ))
+            applied.append(migration.version)
+    return applied
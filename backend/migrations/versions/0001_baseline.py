@@ -0,0 +1,79 @@
+"""Baseline schema: organizations, policies, users, invoices and the audit trail."""
+from sqlalchemy import JSON, Boolean, Column, DateTime, Enum, Float, ForeignKey, MetaData, String, Table, Text
+from sqlalchemy.sql import func
+
+# Frozen copy of the schema as it stood before versioned migrations. Later migrations build on
+# exactly this, so it must never follow models/all.py — schema changes go in a new migration.
+# Enum columns store member names, as SQLAlchemy does for Enum(<python enum>).
+metadata = MetaData()
+
+organizations = Table(
+    "organizations", metadata,
+    Column("id", String, primary_key=True),
+    Column("name", String, nullable=False, index=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+organization_policies = Table(
+    "organization_policies", metadata,
+    Column("id", String, primary_key=True),
+    Column("organization_id", String, ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False, unique=True),
+    Column("auto_approve_confidence_threshold", Float, nullable=False),
+    Column("max_auto_approve_amount", Float, nullable=False),
+    Column("high_value_escalation_threshold", Float, nullable=False),
+    Column("require_review_if_duplicate", Boolean, nullable=False),
+    Column("require_review_if_fraud_flag", Boolean, nullable=False),
+    Column("ai_auto_review_enabled", Boolean, nullable=False),
+    Column("updated_at", DateTime(timezone=True)),
+)
+
+users = Table(
+    "users", metadata,
+    Column("id", String, primary_key=True),
+    Column("email", String, unique=True, index=True, nullable=False),
+    Column("hashed_password", String, nullable=False),
+    Column("role", Enum("ADMIN", "CLIENT", name="userrole"), nullable=False),
+    Column("organization_id", String, ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("is_active", Boolean),
+    Column("full_name", String, nullable=True),
+    Column("avatar_url", String, nullable=True),
+)
+
+invoices = Table(
+    "invoices", metadata,
+    Column("id", String, primary_key=True),
+    Column("file_url", String, nullable=True),
+    Column("status", Enum("PROCESSING", "AUTO_APPROVED", "UNDER_REVIEW", "APPROVED", "REJECTED",
+                          "ADMIN_PASS_NEEDED", "PROCESSING_FAILED", name="invoicestatus"), nullable=False),
+    Column("organization_id", String, ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False),
+    Column("uploaded_by", String, ForeignKey("users.id", ondelete="SET NULL"), nullable=True),
+    Column("vendor_name", String, nullable=True),
+    Column("invoice_number", String, nullable=True),
+    Column("total_amount", Float, nullable=True),
+    Column("confidence_score", Float, nullable=True),
+    Column("extracted_json", JSON, nullable=True),
+    Column("duplicate_flag", Boolean),
+    Column("fraud_flag", Boolean),
+    Column("fraud_score", Float, nullable=True),
+    Column("text_hash", String, nullable=True),
+    Column("processing_time_seconds", Float, nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True)),
+)
+
+invoice_events = Table(
+    "invoice_events", metadata,
+    Column("id", String, primary_key=True),
+    Column("invoice_id", String, ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False),
+    Column("performed_by", String, ForeignKey("users.id", ondelete="SET NULL"), nullable=True),
+    Column("event_type", String, nullable=False),
+    Column("message", Text, nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def upgrade(op):
+    # Databases created by the old import-time create_all already have these tables and skip them
+    for table in (organizations, organization_policies, users, invoices, invoice_events):
+        op.create_table(table)
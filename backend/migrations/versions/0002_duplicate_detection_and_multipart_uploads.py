@@ -0,0 +1,48 @@
+"""Exact/near-duplicate detection columns and multipart upload sessions."""
+from sqlalchemy import JSON, BigInteger, Column, DateTime, ForeignKey, Index, MetaData, String, Table
+from sqlalchemy.sql import func
+
+# Frozen as created by this migration; later schema changes go in a new migration
+metadata = MetaData()
+
+# Created by 0001 — declared only so the foreign keys below resolve
+Table("organizations", metadata, Column("id", String, primary_key=True))
+Table("invoices", metadata, Column("id", String, primary_key=True))
+
+upload_sessions = Table(
+    "upload_sessions", metadata,
+    Column("id", String, primary_key=True),
+    Column("invoice_id", String, ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False, unique=True),
+    Column("upload_id", String, nullable=False),
+    Column("content_type", String, nullable=False),
+    Column("file_size", BigInteger, nullable=False),
+    Column("part_size", BigInteger, nullable=False),
+    Column("completed_at", DateTime(timezone=True), nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+invoice_fingerprints = Table(
+    "invoice_fingerprints", metadata,
+    Column("invoice_id", String, ForeignKey("invoices.id", ondelete="CASCADE"), primary_key=True),
+    Column("organization_id", String, ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False),
+    Column("text_minhash", JSON, nullable=True),
+    Column("image_hash", String(16), nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+invoice_fingerprint_buckets = Table(
+    "invoice_fingerprint_buckets", metadata,
+    Column("invoice_id", String, ForeignKey("invoice_fingerprints.invoice_id", ondelete="CASCADE"), primary_key=True),
+    Column("bucket_key", String(32), primary_key=True),
+    Column("organization_id", String, ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False),
+    Index("ix_fingerprint_buckets_org_key", "organization_id", "bucket_key"),
+)
+
+
+def upgrade(op):
+    op.add_enum_value("invoicestatus", "DUPLICATE")
+    op.add_column("invoices", "file_hash", "VARCHAR(64)")
+    op.add_column("invoices", "duplicate_of", "VARCHAR REFERENCES invoices(id) ON DELETE SET NULL")
+
+    for table in (upload_sessions, invoice_fingerprints, invoice_fingerprint_buckets):
+        op.create_table(table)
@@ -0,0 +1,23 @@
+"""Composite indexes for duplicate checks, tenant listings and date-bounded analytics."""
+from sqlalchemy import Column, Index, MetaData, Table
+
+# Frozen index definitions; only the indexed columns of invoices are declared
+invoices = Table(
+    "invoices", MetaData(),
+    *(Column(name) for name in ("organization_id", "file_hash", "text_hash", "vendor_name", "invoice_number",
+                                "total_amount", "status", "updated_at", "created_at")),
+)
+
+INDEXES = (
+    Index("ix_invoices_org_file_hash", invoices.c.organization_id, invoices.c.file_hash),
+    Index("ix_invoices_org_text_hash", invoices.c.organization_id, invoices.c.text_hash),
+    Index("ix_invoices_org_vendor_number_amount", invoices.c.organization_id, invoices.c.vendor_name,
+          invoices.c.invoice_number, invoices.c.total_amount),
+    Index("ix_invoices_org_status_updated", invoices.c.organization_id, invoices.c.status, invoices.c.updated_at),
+    Index("ix_invoices_created_at", invoices.c.created_at),
+)
+
+
+def upgrade(op):
+    for index in INDEXES:
+        op.create_index(index)
@@ -0,0 +1,11 @@
+"""Index backing keyset pagination of tenant invoice listings on (created_at, id)."""
+from sqlalchemy import Column, Index, MetaData, Table
+
+# Frozen index definition; only the indexed columns of invoices are declared
+invoices = Table("invoices", MetaData(), Column("organization_id"), Column("created_at"), Column("id"))
+
+INDEX = Index("ix_invoices_org_created_id", invoices.c.organization_id, invoices.c.created_at, invoices.c.id)
+
+
+def upgrade(op):
+    op.create_index(INDEX)
@@ -0,0 +1,88 @@
+"""Per-org status, daily and vendor analytics rollups, backfilled from existing invoices."""
+from sqlalchemy import Column, Date, Enum, Float, ForeignKey, Index, Integer, MetaData, String, Table, text
+
+# Frozen as created by this migration; later schema changes go in a new migration
+metadata = MetaData()
+
+# Created by 0001 — declared only so the foreign keys below resolve
+Table("organizations", metadata, Column("id", String, primary_key=True))
+
+INVOICE_STATUS = Enum("PROCESSING", "AUTO_APPROVED", "UNDER_REVIEW", "APPROVED", "REJECTED",
+                      "ADMIN_PASS_NEEDED", "PROCESSING_FAILED", "DUPLICATE", name="invoicestatus")
+
+
+def _metrics():
+    return [
+        Column("invoice_count", Integer, nullable=False),
+        Column("amount_total", Float, nullable=False),
+        Column("duplicate_count", Integer, nullable=False),
+        Column("fraud_count", Integer, nullable=False),
+        Column("confidence_sum", Float, nullable=False),
+        Column("confidence_count", Integer, nullable=False),
+        Column("processing_time_sum", Float, nullable=False),
+        Column("processing_time_count", Integer, nullable=False),
+    ]
+
+
+_METRIC_COLUMNS = (
+    "invoice_count, amount_total, duplicate_count, fraud_count, "
+    "confidence_sum, confidence_count, processing_time_sum, processing_time_count"
+)
+_METRIC_AGGREGATES = (
+    "count(id), coalesce(sum(total_amount), 0.0), "
+    "sum(CASE WHEN duplicate_flag THEN 1 ELSE 0 END), sum(CASE WHEN fraud_flag THEN 1 ELSE 0 END), "
+    "coalesce(sum(confidence_score), 0.0), count(confidence_score), "
+    "coalesce(sum(processing_time_seconds), 0.0), count(processing_time_seconds)"
+)
+
+invoice_status_rollups = Table(
+    "invoice_status_rollups", metadata,
+    Column("organization_id", String, ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True),
+    Column("status", INVOICE_STATUS, primary_key=True),
+    *_metrics(),
+)
+
+invoice_daily_rollups = Table(
+    "invoice_daily_rollups", metadata,
+    Column("organization_id", String, ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("status", INVOICE_STATUS, primary_key=True),
+    *_metrics(),
+    Index("ix_invoice_daily_rollups_day", "day"),
+)
+
+invoice_vendor_rollups = Table(
+    "invoice_vendor_rollups", metadata,
+    Column("organization_id", String, ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True),
+    Column("vendor_name", String, primary_key=True),
+    Column("invoice_count", Integer, nullable=False),
+    Column("amount_total", Float, nullable=False),
+)
+
+
+def upgrade(op):
+    for table in (invoice_status_rollups, invoice_daily_rollups, invoice_vendor_rollups):
+        op.create_table(table)
+
+    # Backfill in one transaction. Tables left behind by the old create_all may already hold rows
+    day = "CAST(timezone('UTC', created_at) AS DATE)" if op.is_postgres else "date(created_at)"
+    with op.engine.begin() as conn:
+        for table in (invoice_status_rollups, invoice_daily_rollups, invoice_vendor_rollups):
+            conn.execute(table.delete())
+        conn.execute(text(f"""
+            INSERT INTO invoice_status_rollups (organization_id, status, {_METRIC_COLUMNS})
+            SELECT organization_id, status, {_METRIC_AGGREGATES}
+            FROM invoices GROUP BY organization_id, status
+        """))
+        conn.execute(text(f"""
+            INSERT INTO invoice_daily_rollups (organization_id, day, status, {_METRIC_COLUMNS})
+            SELECT organization_id, {day}, status, {_METRIC_AGGREGATES}
+            FROM invoices GROUP BY organization_id, {day}, status
+        """))
+        conn.execute(text("""
+            INSERT INTO invoice_vendor_rollups (organization_id, vendor_name, invoice_count, amount_total)
+            SELECT organization_id, vendor_name, count(id), coalesce(sum(total_amount), 0.0)
+            FROM invoices
+            WHERE vendor_name IS NOT NULL AND status IN ('APPROVED', 'AUTO_APPROVED')
+            GROUP BY organization_id, vendor_name
+        """))
@@ -0,0 +1,80 @@
+"""
+Event ledger: organization_id on invoice_events, per-invoice/per-org/time indexes, and on
+Postgres a rebuild of the table as a monthly range-partitioned ledger.
+
+The Postgres rebuild copies every event once under an exclusive lock — run it in a quiet
+window on large installations (`python -m migrations upgrade --to 0006`).
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Index, MetaData, Table, text
+
+from core.config import settings
+
+# Frozen index definitions; only the indexed columns of invoice_events are declared
+invoice_events = Table("invoice_events", MetaData(), Column("invoice_id"), Column("organization_id"), Column("created_at"))
+
+INDEXES = (
+    Index("ix_invoice_events_invoice_created", invoice_events.c.invoice_id, invoice_events.c.created_at),
+    Index("ix_invoice_events_org_created", invoice_events.c.organization_id, invoice_events.c.created_at),
+    Index("ix_invoice_events_created_at", invoice_events.c.created_at),
+)
+
+_BACKFILL_ORGANIZATIONS = """
+    UPDATE invoice_events SET organization_id = (
+        SELECT invoices.organization_id FROM invoices WHERE invoices.id = invoice_events.invoice_id
+    ) WHERE organization_id IS NULL
+"""
+
+
+def upgrade(op):
+    if op.is_postgres:
+        _partition_postgres(op)
+        return
+    op.add_column("invoice_events", "organization_id", "VARCHAR REFERENCES organizations(id) ON DELETE CASCADE")
+    op.execute(_BACKFILL_ORGANIZATIONS)
+    for index in INDEXES:
+        op.create_index(index)
+
+
+def _partition_postgres(op):
+    from services.event_ledger import DEFAULT_PARTITION, add_months, create_month_partition, is_partitioned, month_start
+
+    with op.engine.begin() as conn:
+        if not is_partitioned(conn):
+            conn.execute(text("LOCK TABLE invoice_events IN ACCESS EXCLUSIVE MODE"))
+            conn.execute(text("ALTER TABLE invoice_events RENAME TO invoice_events_unpartitioned"))
+            conn.execute(text("ALTER TABLE invoice_events_unpartitioned RENAME CONSTRAINT invoice_events_pkey TO invoice_events_unpartitioned_pkey"))
+            # The partition key has to be part of the primary key
+            conn.execute(text("""
+                CREATE TABLE invoice_events (
+                    id VARCHAR NOT NULL,
+                    invoice_id VARCHAR NOT NULL REFERENCES invoices(id) ON DELETE CASCADE,
+                    organization_id VARCHAR REFERENCES organizations(id) ON DELETE CASCADE,
+                    performed_by VARCHAR REFERENCES users(id) ON DELETE SET NULL,
+                    event_type VARCHAR NOT NULL,
+                    message TEXT,
+                    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+                    PRIMARY KEY (id, created_at)
+                ) PARTITION BY RANGE (created_at)
+            """))
+            conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF invoice_events DEFAULT"))
+
+            now = datetime.now(timezone.utc)
+            oldest = conn.execute(text("SELECT min(created_at) FROM invoice_events_unpartitioned")).scalar()
+            month, last = month_start(oldest or now), add_months(month_start(now), settings.EVENT_PARTITION_MONTHS_AHEAD)
+            while month <= last:
+                create_month_partition(conn, month)
+                month = add_months(month, 1)
+
+            conn.execute(text("""
+                INSERT INTO invoice_events (id, invoice_id, organization_id, performed_by, event_type, message, created_at)
+                SELECT e.id, e.invoice_id, i.organization_id, e.performed_by, e.event_type, e.message, COALESCE(e.created_at, now())
+                FROM invoice_events_unpartitioned e JOIN invoices i ON i.id = e.invoice_id
+            """))
+            conn.execute(text("DROP TABLE invoice_events_unpartitioned"))
+
+        # Indexes on the partitioned parent cascade to every partition (CONCURRENTLY is not supported there)
+        for index in INDEXES:
+            columns = ", ".join(column.name for column in index.columns)
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index.name} ON invoice_events ({columns})"))
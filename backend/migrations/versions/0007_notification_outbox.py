@@ -0,0 +1,26 @@
+"""Outbox table for status emails, delivered by the background notification sender."""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, Text
+from sqlalchemy.sql import func
+
+# Frozen as created by this migration; later schema changes go in a new migration
+notification_outbox = Table(
+    "notification_outbox", MetaData(),
+    Column("id", String, primary_key=True),
+    Column("recipient", String, nullable=False),
+    Column("status", String, nullable=False),
+    Column("invoice_filename", String, nullable=False),
+    Column("vendor_name", String, nullable=True),
+    Column("reason", Text, nullable=True),
+    Column("state", String, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("last_error", Text, nullable=True),
+    Column("send_after", DateTime(timezone=True), nullable=False),
+    Column("claimed_at", DateTime(timezone=True), nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Index("ix_notification_outbox_state_send_after", "state", "send_after"),
+    Index("ix_notification_outbox_recipient_state", "recipient", "state"),
+)
+
+
+def upgrade(op):
+    op.create_table(notification_outbox)
@@ -0,0 +1,27 @@
+"""Per-organization spreadsheet column mappings, keyed by header signature."""
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table
+from sqlalchemy.sql import func
+
+# Frozen as created by this migration; later schema changes go in a new migration
+metadata = MetaData()
+
+# Created by 0001 — declared only so the foreign key below resolves
+Table("organizations", metadata, Column("id", String, primary_key=True))
+
+spreadsheet_column_mappings = Table(
+    "spreadsheet_column_mappings", metadata,
+    Column("id", String, primary_key=True),
+    Column("organization_id", String, ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False),
+    Column("header_signature", String(64), nullable=False),
+    Column("columns", JSON, nullable=False),
+    Column("mapping", JSON, nullable=False),
+    Column("source", String, nullable=False),
+    Column("use_count", Integer, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True)),
+    Index("ix_spreadsheet_column_mappings_org_signature", "organization_id", "header_signature", unique=True),
+)
+
+
+def upgrade(op):
+    op.create_table(spreadsheet_column_mappings)
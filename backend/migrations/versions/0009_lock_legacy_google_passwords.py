@@ -0,0 +1,25 @@
+"""
+Google-created accounts: replace the bcrypt hash of the old fixed placeholder password with the
+UNUSABLE_PASSWORD marker, so the placeholder can no longer be used to sign in.
+
+Only accounts with a profile name are checked (Google sign-in always sets one), but each check
+is a bcrypt verification — expect roughly a quarter second per such account.
+"""
+import bcrypt
+from sqlalchemy import text
+
+from core.security import UNUSABLE_PASSWORD
+
+# What Google sign-ups had hashed as their password before UNUSABLE_PASSWORD existed
+_LEGACY_OAUTH_PASSWORD = b"OAUTH_GOOGLE_PASSWORD_LOCKED"
+
+
+def upgrade(op):
+    with op.engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT id, hashed_password FROM users WHERE full_name IS NOT NULL AND hashed_password LIKE '$2%'"
+        )).all()
+        for row in rows:
+            if bcrypt.checkpw(_LEGACY_OAUTH_PASSWORD, row.hashed_password.encode("utf-8")):
+                conn.execute(text("UPDATE users SET hashed_password = :marker WHERE id = :id"),
+                             {"marker": UNUSABLE_PASSWORD, "id": row.id})
@@ -1,7 +1,10 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Enum, Float, JSON, Text, Boolean
+from sqlalchemy import Column, String, DateTime, Date, ForeignKey, Enum, Float, Integer, JSON, Text, Boolean, BigInteger, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from models.base import Base
+import os
+import time
+from datetime import datetime, timezone
 import uuid
 import enum
 
@@ -17,6 +20,10 @@ class InvoiceStatus(str, enum.Enum):
     REJECTED = "rejected"
     ADMIN_PASS_NEEDED = "admin_pass_needed"
     PROCESSING_FAILED = "processing_failed"
+    DUPLICATE = "duplicate"  # Byte-identical re-upload, short-circuited before OCR
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
 
 class Organization(Base):
     """Root tenant entity. All structural data stems from here."""
@@ -30,6 +37,7 @@ class Organization(Base):
     users = relationship("User", back_populates="organization", cascade="all, delete-orphan")
     invoices = relationship("Invoice", back_populates="organization", cascade="all, delete-orphan")
     policy = relationship("OrganizationPolicy", back_populates="organization", uselist=False, cascade="all, delete-orphan")
+    column_mappings = relationship("SpreadsheetColumnMapping", back_populates="organization", cascade="all, delete-orphan")
 
 
 class OrganizationPolicy(Base):
@@ -99,29 +107,204 @@ class Invoice(Base):
     fraud_flag = Column(Boolean, default=False)
     fraud_score = Column(Float, nullable=True) # 0 to 100
     text_hash = Column(String, nullable=True) # SHA256 of OCR output for matching
+    file_hash = Column(String(64), nullable=True) # SHA256 of the raw uploaded bytes, computed at ingestion
+    duplicate_of = Column(String, ForeignKey("invoices.id", ondelete="SET NULL"), nullable=True) # Original invoice for exact re-uploads
 
     # SLA Metrics
     processing_time_seconds = Column(Float, nullable=True)  # Time from upload to AI completion
 
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Stamped with microseconds on insert: SQLite's now() has one-second resolution, and the
+    # duplicate gate orders uploads by created_at (see intelligence_service.uploaded_before)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), default=_utcnow)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     organization = relationship("Organization", back_populates="invoices")
     uploaded_by_user = relationship("User", back_populates="uploaded_invoices")
-    events = relationship("InvoiceEvent", back_populates="invoice", cascade="all, delete-orphan")
+    events = relationship("InvoiceEvent", back_populates="invoice", cascade="all, delete-orphan",
+                          order_by="(InvoiceEvent.created_at, InvoiceEvent.id)")
+    upload_session = relationship("UploadSession", back_populates="invoice", uselist=False, cascade="all, delete-orphan")
+    fingerprint = relationship("InvoiceFingerprint", back_populates="invoice", uselist=False, cascade="all, delete-orphan")
+
+    # Access patterns: duplicate checks, tenant listings/notifications, and date-bounded analytics.
+    # Every tenant-scoped index leads with organization_id, so it also serves plain org filters.
+    __table_args__ = (
+        Index("ix_invoices_org_file_hash", "organization_id", "file_hash"),
+        Index("ix_invoices_org_text_hash", "organization_id", "text_hash"),
+        Index("ix_invoices_org_vendor_number_amount", "organization_id", "vendor_name", "invoice_number", "total_amount"),
+        Index("ix_invoices_org_status_updated", "organization_id", "status", "updated_at"),
+        Index("ix_invoices_created_at", "created_at"),
+        Index("ix_invoices_org_created_id", "organization_id", "created_at", "id"),  # Keyset pagination
+    )
+
+def _time_ordered_uuid() -> str:
+    """UUIDv7-style id: a millisecond timestamp prefix keeps ledger inserts at the right edge of the PK index."""
+    millis = int(time.time() * 1000) & ((1 << 48) - 1)
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (millis << 80) | (0x7 << 76) | ((rand >> 62) & 0xFFF) << 64 | (0b10 << 62) | (rand & ((1 << 62) - 1))
+    return str(uuid.UUID(int=value))
 
 class InvoiceEvent(Base):
-    """Immutable event ledger for SaaS traceablity."""
+    """
+    Append-only event ledger for SaaS traceablity. Rows are never updated; old months are
+    archived and removed as a whole by services.event_ledger. On Postgres the table is
+    range-partitioned by month on created_at (see migration 0006).
+    """
     __tablename__ = "invoice_events"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(String, primary_key=True, default=_time_ordered_uuid)
     invoice_id = Column(String, ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False)
+    organization_id = Column(String, ForeignKey("organizations.id", ondelete="CASCADE"), nullable=True) # Denormalized for per-org range reads; filled at flush
     performed_by = Column(String, ForeignKey("users.id", ondelete="SET NULL"), nullable=True) # Admin or Client that took action
     event_type = Column(String, nullable=False) # e.g 'UPLOADED', 'REJECTED', 'APPROVED'
     message = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     # Relationships
     invoice = relationship("Invoice", back_populates="events")
     performer = relationship("User")
+
+    # Timeline reads (per invoice), tenant range reads/exports (per org) and retention sweeps (by time)
+    __table_args__ = (
+        Index("ix_invoice_events_invoice_created", "invoice_id", "created_at"),
+        Index("ix_invoice_events_org_created", "organization_id", "created_at"),
+        Index("ix_invoice_events_created_at", "created_at"),
+    )
+
+class UploadSession(Base):
+    """Tracks an in-flight chunked upload so the browser can resume it after a network drop."""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    invoice_id = Column(String, ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False, unique=True)
+    upload_id = Column(String, nullable=False) # S3 multipart UploadId, or the local staging folder id
+    content_type = Column(String, nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    part_size = Column(BigInteger, nullable=False)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    invoice = relationship("Invoice", back_populates="upload_session")
+
+class InvoiceFingerprint(Base):
+    """Near-duplicate signatures for one invoice: MinHash of its OCR text and a dHash of its first page."""
+    __tablename__ = "invoice_fingerprints"
+
+    invoice_id = Column(String, ForeignKey("invoices.id", ondelete="CASCADE"), primary_key=True)
+    organization_id = Column(String, ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False)
+    text_minhash = Column(JSON, nullable=True) # list[int], one minimum per hash permutation
+    image_hash = Column(String(16), nullable=True) # 64-bit perceptual hash as hex
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    invoice = relationship("Invoice", back_populates="fingerprint")
+    buckets = relationship("InvoiceFingerprintBucket", back_populates="fingerprint", cascade="all, delete-orphan")
+
+class InvoiceFingerprintBucket(Base):
+    """LSH bucket membership. Candidate lookups probe (organization_id, bucket_key) instead of scanning the org."""
+    __tablename__ = "invoice_fingerprint_buckets"
+
+    invoice_id = Column(String, ForeignKey("invoice_fingerprints.invoice_id", ondelete="CASCADE"), primary_key=True)
+    bucket_key = Column(String(32), primary_key=True) # e.g. "t3:9f2c..." (text band) or "p1:a0f3" (image chunk)
+    organization_id = Column(String, ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        Index("ix_fingerprint_buckets_org_key", "organization_id", "bucket_key"),
+    )
+
+    # Relationships
+    fingerprint = relationship("InvoiceFingerprint", back_populates="buckets")
+
+# ── Analytics Rollups ──────────────────────────────────────────────────────────
+# Pre-aggregated invoice metrics, kept in step with the invoices table by the flush listener
+# in services/analytics_service.py and rebuildable from scratch with rebuild_rollups().
+# Averages are stored as (sum, count) pairs so they can be combined across rows.
+
+class InvoiceRollupMetrics:
+    invoice_count = Column(Integer, nullable=False, default=0)
+    amount_total = Column(Float, nullable=False, default=0.0)
+    duplicate_count = Column(Integer, nullable=False, default=0)
+    fraud_count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+    confidence_count = Column(Integer, nullable=False, default=0)
+    processing_time_sum = Column(Float, nullable=False, default=0.0)
+    processing_time_count = Column(Integer, nullable=False, default=0)
+
+class InvoiceStatusRollup(InvoiceRollupMetrics, Base):
+    """All-time invoice metrics per (organization, current status)."""
+    __tablename__ = "invoice_status_rollups"
+
+    organization_id = Column(String, ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(Enum(InvoiceStatus), primary_key=True)
+
+class InvoiceDailyRollup(InvoiceRollupMetrics, Base):
+    """Invoice metrics per (organization, UTC upload day, current status)."""
+    __tablename__ = "invoice_daily_rollups"
+
+    organization_id = Column(String, ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    status = Column(Enum(InvoiceStatus), primary_key=True)
+
+    __table_args__ = (
+        Index("ix_invoice_daily_rollups_day", "day"),  # Cross-tenant date windows on the admin dashboard
+    )
+
+class InvoiceVendorRollup(Base):
+    """Approved (manual or auto) invoice count and volume per (organization, vendor)."""
+    __tablename__ = "invoice_vendor_rollups"
+
+    organization_id = Column(String, ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True)
+    vendor_name = Column(String, primary_key=True)
+    invoice_count = Column(Integer, nullable=False, default=0)
+    amount_total = Column(Float, nullable=False, default=0.0)
+
+class NotificationOutbox(Base):
+    """
+    Pending outbound status emails. Rows are written in the same transaction as the state change
+    they announce and delivered (then deleted) by services.notification_service; rows that
+    exhaust their retries stay behind as state="failed" with the last error.
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(String, primary_key=True, default=_time_ordered_uuid)
+    recipient = Column(String, nullable=False)
+    status = Column(String, nullable=False) # Template key: RECEIVED, APPROVED, AUTO_APPROVED, REJECTED, ...
+    invoice_filename = Column(String, nullable=False)
+    vendor_name = Column(String, nullable=True)
+    reason = Column(Text, nullable=True)
+    state = Column(String, nullable=False, default="pending") # pending | sending | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    send_after = Column(DateTime(timezone=True), nullable=False) # Digest window end, or the next retry
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_notification_outbox_state_send_after", "state", "send_after"),
+        Index("ix_notification_outbox_recipient_state", "recipient", "state"),
+    )
+
+class SpreadsheetColumnMapping(Base):
+    """
+    Remembered spreadsheet column mapping per organization and header signature (a hash of the
+    export's normalized header names). Saved as "detected" after a successful import and as
+    "confirmed" when a user sets it; detection never overwrites a confirmed mapping.
+    """
+    __tablename__ = "spreadsheet_column_mappings"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    organization_id = Column(String, ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False)
+    header_signature = Column(String(64), nullable=False)
+    columns = Column(JSON, nullable=False) # Header names as they appeared, for display
+    mapping = Column(JSON, nullable=False) # {"vendor": ..., "amount": ..., "number": ..., "date": ...} -> header name or null
+    source = Column(String, nullable=False, default="detected") # detected | confirmed
+    use_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    organization = relationship("Organization", back_populates="column_mappings")
+
+    __table_args__ = (
+        Index("ix_spreadsheet_column_mappings_org_signature", "organization_id", "header_signature", unique=True),
+    )
@@ -28,6 +28,8 @@ class InvoiceListResponse(BaseModel):
     fraud_flag: bool = False
     fraud_score: Optional[float]
     text_hash: Optional[str]
+    file_hash: Optional[str] = None
+    duplicate_of: Optional[str] = None
     processing_time_seconds: Optional[float]
     
     created_at: datetime
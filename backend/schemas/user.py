@@ -11,6 +11,7 @@ class TokenPayload(BaseModel):
     sub: Optional[str] = None
     org_id: Optional[str] = None
     roles: list[str] = []
+    scope: Optional[str] = None  # Set on narrow-purpose tokens (e.g. "stream"); None for login tokens
 
 # Organizations
 class OrganizationResponse(BaseModel):
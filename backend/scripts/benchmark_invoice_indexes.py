@@ -0,0 +1,148 @@
+"""
+Invoice index benchmark — seeds a scratch database with synthetic invoices and times the
+hot tenant-scoped queries with and without the composite indexes declared on `Invoice`.
+
+Usage (from backend/):
+    python -m scripts.benchmark_invoice_indexes                       # 1M rows, scratch SQLite file
+    python -m scripts.benchmark_invoice_indexes --rows 200000
+    python -m scripts.benchmark_invoice_indexes --db-url postgresql://user:pw@localhost/bench
+
+Never point --db-url at a real database: every table is dropped and re-seeded.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, desc, func, insert, text
+from sqlalchemy.orm import Session
+
+from models.base import Base
+from models.all import Invoice, InvoiceStatus, Organization, User  # noqa: F401 — registers every table
+
+BENCHMARKED_INDEXES = [
+    "ix_invoices_org_text_hash",
+    "ix_invoices_org_vendor_number_amount",
+    "ix_invoices_org_status_updated",
+    "ix_invoices_created_at",
+]
+STATUSES = list(InvoiceStatus)
+VENDORS = [f"Vendor {i}" for i in range(500)]
+
+
+def seed(engine, rows: int, orgs: int) -> dict:
+    """Bulk-inserts `rows` invoices spread over `orgs` tenants and returns sample lookup keys."""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    org_ids = [str(uuid.uuid4()) for _ in range(orgs)]
+    with engine.begin() as conn:
+        conn.execute(insert(Organization.__table__), [{"id": o, "name": f"Bench Org {o[:8]}"} for o in org_ids])
+
+    now = datetime.now(timezone.utc)
+    rng = random.Random(42)
+    sample = None
+    chunk = 20000
+    started = time.perf_counter()
+    for offset in range(0, rows, chunk):
+        batch = []
+        for _ in range(min(chunk, rows - offset)):
+            created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            batch.append({
+                "id": str(uuid.uuid4()),
+                "organization_id": rng.choice(org_ids),
+                "status": rng.choice(STATUSES).name,
+                "vendor_name": rng.choice(VENDORS),
+                "invoice_number": f"INV-{rng.randint(1, 10_000_000)}",
+                "total_amount": round(rng.uniform(10, 50000), 2),
+                "text_hash": uuid.uuid4().hex + uuid.uuid4().hex,
+                "created_at": created,
+                "updated_at": created + timedelta(minutes=rng.randint(0, 120)),
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(Invoice.__table__), batch)
+        if sample is None:
+            sample = batch[len(batch) // 2]
+        print(f"  seeded {offset + len(batch):>9,} / {rows:,} rows", end="\r", flush=True)
+    print(f"  seeded {rows:,} rows in {time.perf_counter() - started:.1f}s{' ' * 20}")
+    return sample
+
+
+def queries(sample: dict) -> dict:
+    org = sample["organization_id"]
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        "dup check: (org, text_hash)": lambda s: s.query(Invoice.id).filter(
+            Invoice.organization_id == org, Invoice.text_hash == sample["text_hash"]).first(),
+        "dup check: (org, vendor, number, amount)": lambda s: s.query(Invoice.id).filter(
+            Invoice.organization_id == org, Invoice.vendor_name == sample["vendor_name"],
+            Invoice.invoice_number == sample["invoice_number"], Invoice.total_amount == sample["total_amount"]).first(),
+        "notifications: org + status, by updated_at": lambda s: s.query(Invoice.id).filter(
+            Invoice.organization_id == org, Invoice.status == InvoiceStatus.UNDER_REVIEW).order_by(
+            desc(Invoice.updated_at)).limit(15).all(),
+        "org invoice count": lambda s: s.query(func.count(Invoice.id)).filter(Invoice.organization_id == org).scalar(),
+        "admin listing: newest 50": lambda s: s.query(Invoice.id).order_by(Invoice.created_at.desc()).limit(50).all(),
+        "analytics: invoices created today": lambda s: s.query(func.count(Invoice.id)).filter(
+            Invoice.created_at >= today).scalar(),
+    }
+
+
+def time_queries(engine, sample: dict, repeats: int) -> dict:
+    results = {}
+    with Session(engine) as session:
+        for name, run in queries(sample).items():
+            run(session)  # warm caches
+            timings = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                run(session)
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = statistics.median(timings)
+    return results
+
+
+def set_indexes(engine, enabled: bool):
+    for index in Invoice.__table__.indexes:
+        if index.name not in BENCHMARKED_INDEXES:
+            continue
+        if enabled:
+            index.create(bind=engine, checkfirst=True)
+        else:
+            index.drop(bind=engine, checkfirst=True)
+    if engine.dialect.name in ("postgresql", "sqlite"):
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--orgs", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--db-url", default=None, help="Scratch database URL (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'invoiceai_index_bench.db')}"
+    engine = create_engine(db_url)
+    print(f"Benchmarking against {engine.url.render_as_string(hide_password=True)}")
+
+    sample = seed(engine, args.rows, args.orgs)
+
+    set_indexes(engine, enabled=False)
+    without = time_queries(engine, sample, args.repeats)
+    set_indexes(engine, enabled=True)
+    with_ix = time_queries(engine, sample, args.repeats)
+
+    width = max(len(name) for name in without)
+    print(f"\n{'query':<{width}}  {'no index (ms)':>14}  {'indexed (ms)':>13}  {'speedup':>8}")
+    for name in without:
+        speedup = without[name] / with_ix[name] if with_ix[name] else float("inf")
+        print(f"{name:<{width}}  {without[name]:>14.2f}  {with_ix[name]:>13.2f}  {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+SQL query budgets — seeds a scratch SQLite database, calls each endpoint through the ASGI app
+and counts the statements it sends. Exits 1 when any endpoint goes over its budget, printing the
+offending statements, so a new lazy load or N+1 shows up before it reaches production.
+
+Usage (from backend/):
+    python -m scripts.check_query_budgets
+    python -m scripts.check_query_budgets --verbose      # print every endpoint's statements
+
+The extraction pipeline is measured with fixed OCR/LLM output; only its database work counts.
+Lower a budget when an endpoint gets cheaper — raising one needs a reason in the commit.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+SCRATCH_DB = os.path.join(tempfile.gettempdir(), "invoiceai_query_budgets.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{SCRATCH_DB}"
+
+# Statements per call, with the caller's principal already cached (authentication is free)
+QUERY_BUDGETS = {
+    "GET /invoices/{id}": 2,
+    "GET /invoices/{id}/status": 1,
+    "GET /invoices/{id}/events": 2,
+    "GET /invoices/my": 2,
+    "GET /invoices/notifications": 1,
+    "GET /admin/invoices": 2,
+    "GET /admin/invoices/{id}": 2,
+    "POST /admin/invoices/{id}/approve": 8,  # Approval also feeds the vendor rollup
+    "POST /admin/invoices/{id}/reject": 7,
+    "GET /admin/clients": 2,
+    "pipeline: _process_invoice_background": 22,  # First invoice of an org, so it includes creating the policy
+}
+
+CLIENT = ("budget-client@example.com", "Budget123!", "Budget Org")
+ADMIN = ("admin@invoiceai.com", "Admin123!")
+
+
+def _login(client, email, password) -> dict:
+    token = client.post("/api/v1/auth/login", data={"username": email, "password": password}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/api/v1/auth/me", headers=headers)  # Warms the principal cache
+    return headers
+
+
+def seed(client):
+    """One client org with a processed invoice and a short audit trail, plus the admin account."""
+    import main
+    from dependencies import SessionLocal
+    from models.all import Invoice, InvoiceStatus, User
+    from services.invoice_service import EventRecorder
+
+    email, password, org = CLIENT
+    client.post("/api/v1/auth/register", json={"email": email, "password": password, "organization_name": org})
+    main._seed_admin()
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == email).one()
+        invoices = [
+            Invoice(organization_id=user.organization_id, uploaded_by=user.id, status=InvoiceStatus.UNDER_REVIEW,
+                    vendor_name=f"Vendor {i}", total_amount=100.0 * i, file_url=f"budget/{i}.pdf")
+            for i in range(5)
+        ]
+        db.add_all(invoices)
+        db.commit()
+        invoice_ids = [invoice.id for invoice in invoices]
+        for invoice_id in invoice_ids:
+            events = EventRecorder(db, invoice_id, user.id)
+            for event_type in ("UPLOADED", "PROCESSING_QUEUED", "PROCESSING_COMPLETED"):
+                events.record(event_type, "seeded")
+            events.flush()
+        return user.id, invoice_ids
+    finally:
+        db.close()
+
+
+def measure_pipeline(engine, user_id: str, invoice_id: str):
+    import services.invoice_service as invoice_service
+    from core.query_counter import count_queries
+
+    invoice_service.extract_text_from_file = lambda file_bytes, filename: "ACME Corp invoice 1042 total 250.00"
+    invoice_service.extract_invoice_data_with_llm = lambda raw_text: {
+        "vendor_name": "ACME Corp", "invoice_number": "1042", "grand_total": 250.0,
+    }
+    with count_queries(engine) as counter:
+        invoice_service._process_invoice_background(invoice_id, b"budget-check-document", "budget.pdf", user_id)
+    return counter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if os.path.exists(SCRATCH_DB):
+        os.remove(SCRATCH_DB)
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    from fastapi.testclient import TestClient
+    import main as app_main
+    from core.query_counter import count_queries
+    from migrations import upgrade
+
+    upgrade(app_main.engine)
+    client = TestClient(app_main.app)
+    user_id, invoice_ids = seed(client)
+    client_headers = _login(client, CLIENT[0], CLIENT[1])
+    admin_headers = _login(client, *ADMIN)
+    first, second, third = invoice_ids[:3]
+
+    calls = {
+        "GET /invoices/{id}": lambda: client.get(f"/api/v1/invoices/{first}", headers=client_headers),
+        "GET /invoices/{id}/status": lambda: client.get(f"/api/v1/invoices/{first}/status", headers=client_headers),
+        "GET /invoices/{id}/events": lambda: client.get(f"/api/v1/invoices/{first}/events", headers=client_headers),
+        "GET /invoices/my": lambda: client.get("/api/v1/invoices/my", headers=client_headers),
+        "GET /invoices/notifications": lambda: client.get("/api/v1/invoices/notifications", headers=client_headers),
+        "GET /admin/invoices": lambda: client.get("/api/v1/admin/invoices", headers=admin_headers),
+        "GET /admin/invoices/{id}": lambda: client.get(f"/api/v1/admin/invoices/{first}", headers=admin_headers),
+        "POST /admin/invoices/{id}/approve": lambda: client.post(f"/api/v1/admin/invoices/{second}/approve", headers=admin_headers),
+        "POST /admin/invoices/{id}/reject": lambda: client.post(f"/api/v1/admin/invoices/{third}/reject", headers=admin_headers, data={"reason": "budget check"}),
+        "GET /admin/clients": lambda: client.get("/api/v1/admin/clients", headers=admin_headers),
+    }
+
+    results = {}
+    for name, call in calls.items():
+        with count_queries(app_main.engine) as counter:
+            response = call()
+        if response.status_code >= 400:
+            print(f"{name}: HTTP {response.status_code} — {response.text[:200]}")
+            sys.exit(2)
+        results[name] = counter
+    results["pipeline: _process_invoice_background"] = measure_pipeline(app_main.engine, user_id, invoice_ids[3])
+
+    failures = 0
+    width = max(len(name) for name in QUERY_BUDGETS)
+    for name, budget in QUERY_BUDGETS.items():
+        counter = results[name]
+        over = counter.count > budget
+        failures += over
+        print(f"{name:<{width}}  {counter.count:>3} / {budget:<3} {'OVER BUDGET' if over else 'ok'}")
+        if over or args.verbose:
+            for statement in counter.statements:
+                print(f"    {statement[:160]}")
+
+    os.remove(SCRATCH_DB)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Local IMAP stand-in — a single in-memory INBOX speaking just enough IMAP4rev1 (LOGIN, SELECT,
+UID SEARCH/FETCH/STORE, IDLE) for the email ingestion pipeline, so it can be exercised without
+a real mailbox.
+
+Usage (from backend/):
+    python -m scripts.imap_standin --port 1143 --deliver invoice.eml --deliver other.eml
+
+then run the API with
+    EMAIL_IMAP_SERVER=127.0.0.1 EMAIL_IMAP_PORT=1143 EMAIL_IMAP_SSL=false \\
+    EMAIL_ADDRESS=inbox@example.com EMAIL_PASSWORD=anything
+
+Any credentials are accepted. In-process use: `server = ImapStandin(port=0); server.start();
+server.deliver(message_bytes)` — IDLE sessions are told about new mail immediately.
+"""
+import argparse
+import email
+import email.policy
+import email.utils
+import re
+import socketserver
+import threading
+from email.message import Message
+from typing import Optional
+
+
+def _quote(value: Optional[str]) -> str:
+    if value is None:
+        return "NIL"
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _param_list(params: list[tuple]) -> str:
+    if not params:
+        return "NIL"
+    pairs = []
+    for key, value in params:
+        if isinstance(value, tuple):  # RFC 2231 (charset, language, value) — passed through raw, as servers do
+            key, value = f"{key}*", email.utils.encode_rfc2231(email.utils.collapse_rfc2231_value(value), "utf-8")
+        pairs.append(f"{_quote(key)} {_quote(value)}")
+    return "(" + " ".join(pairs) + ")"
+
+
+def _part_body(part: Message) -> bytes:
+    """A leaf part's content exactly as transferred (still base64/QP encoded)."""
+    payload = part.get_payload()
+    return payload.encode("utf-8") if isinstance(payload, str) else bytes(payload or b"")
+
+
+def _bodystructure(part: Message) -> str:
+    content_type = part.get_content_type()
+    if content_type == "message/rfc822":
+        nested = part.get_payload(0)
+        envelope = "(" + " ".join(["NIL"] * 10) + ")"
+        size = len(nested.as_bytes())
+        return f'("MESSAGE" "RFC822" NIL NIL NIL "7BIT" {size} {envelope} {_bodystructure(nested)} 0)'
+    if part.is_multipart():
+        children = "".join(_bodystructure(child) for child in part.get_payload())
+        boundary = [("boundary", part.get_boundary())] if part.get_boundary() else []
+        return f"({children} {_quote(part.get_content_subtype().upper())} {_param_list(boundary)} NIL NIL NIL)"
+
+    maintype, subtype = part.get_content_maintype(), part.get_content_subtype()
+    params = [(k, v) for k, v in part.get_params(header="content-type")[1:]] if part.get_params() else []
+    body, newline = _part_body(part), b"\n"
+    encoding = (part.get("Content-Transfer-Encoding") or "7BIT").upper()
+    fields = f"{_quote(maintype.upper())} {_quote(subtype.upper())} {_param_list(params)} NIL NIL {_quote(encoding)} {len(body)}"
+    if maintype == "text":
+        fields += f" {body.count(newline)}"
+    disposition = "NIL"
+    if part.get("Content-Disposition"):
+        disposition_params = part.get_params(header="content-disposition") or []
+        kind, rest = disposition_params[0][0], disposition_params[1:]
+        disposition = f"({_quote(kind)} {_param_list(rest)})"
+    return f"({fields} NIL {disposition} NIL NIL)"
+
+
+def _section(message: Message, spec: str) -> bytes:
+    spec_upper = spec.upper()
+    if spec_upper.startswith("HEADER.FIELDS"):
+        names = re.findall(r"[\w-]+", spec_upper[len("HEADER.FIELDS"):])
+        lines = [f"{name}: {value}" for name, value in message.items() if name.upper() in names]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+    if spec_upper == "HEADER":
+        return message.as_bytes().split(b"\n\n", 1)[0] + b"\r\n\r\n"
+    if spec_upper in ("", "TEXT"):
+        return message.as_bytes()
+    part = message
+    for index in spec.split("."):
+        if part.get_content_type() == "message/rfc822":
+            part = part.get_payload(0)
+        if part.is_multipart():
+            part = part.get_payload(int(index) - 1)
+        elif index != "1":
+            return b""
+    return _part_body(part)
+
+
+class _Mailbox:
+    def __init__(self):
+        self.messages: dict[int, tuple[Message, set]] = {}
+        self.next_uid = 1
+        self.changed = threading.Condition()
+
+    def deliver(self, raw: bytes) -> int:
+        with self.changed:
+            uid = self.next_uid
+            self.next_uid += 1
+            self.messages[uid] = (email.message_from_bytes(raw, policy=email.policy.compat32), set())
+            self.changed.notify_all()
+            return uid
+
+    def uids(self, spec: str) -> list[int]:
+        existing = sorted(self.messages)
+        selected = []
+        for piece in spec.split(","):
+            if ":" in piece:
+                low, high = piece.split(":")
+                low = existing[-1] if low == "*" else int(low)
+                high = existing[-1] if high == "*" else int(high)
+                selected += [uid for uid in existing if min(low, high) <= uid <= max(low, high)]
+            elif piece == "*":
+                selected += existing[-1:]
+            elif int(piece) in self.messages:
+                selected.append(int(piece))
+        return selected
+
+
+def _tokens(line: str) -> list[str]:
+    # Atoms, "quoted strings" and parenthesized/bracketed groups as single arguments
+    return [m.group(1) if m.group(1) is not None else m.group(0)
+            for m in re.finditer(r'"((?:[^"\\]|\\.)*)"|\((?:[^()]|\([^()]*\))*\)|[^\s\[]+\[[^\]]*\](?:<[\d.]+>)?|\S+', line)]
+
+
+class _Session(socketserver.StreamRequestHandler):
+    mailbox: _Mailbox
+
+    def send(self, text):
+        self.wfile.write(text if isinstance(text, bytes) else text.encode("utf-8"))
+
+    def handle(self):
+        self.send("* OK IMAP4rev1 stand-in ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = _tokens(line.decode("utf-8", "replace").strip())
+            if len(parts) < 2:
+                continue
+            tag, command, args = parts[0], parts[1].upper(), parts[2:]
+            if command == "UID" and args:
+                command, args = "UID " + args[0].upper(), args[1:]
+            handler = getattr(self, "do_" + command.replace(" ", "_"), None)
+            if handler is None:
+                self.send(f"{tag} BAD unsupported command {command}\r\n")
+            elif handler(tag, args) is False:
+                return
+
+    def do_CAPABILITY(self, tag, args):
+        self.send("* CAPABILITY IMAP4rev1 IDLE\r\n")
+        self.send(f"{tag} OK CAPABILITY completed\r\n")
+
+    def do_LOGIN(self, tag, args):
+        self.send(f"{tag} OK [CAPABILITY IMAP4rev1 IDLE] LOGIN completed\r\n")
+
+    def do_NOOP(self, tag, args):
+        self.send(f"{tag} OK NOOP completed\r\n")
+
+    def do_LOGOUT(self, tag, args):
+        self.send(f"* BYE logging out\r\n{tag} OK LOGOUT completed\r\n")
+        return False
+
+    def do_SELECT(self, tag, args):
+        self.send(f"* {len(self.mailbox.messages)} EXISTS\r\n* 0 RECENT\r\n* OK [UIDVALIDITY 1] UIDs valid\r\n"
+                  f"* OK [UIDNEXT {self.mailbox.next_uid}] Predicted next UID\r\n")
+        self.send(f"{tag} OK [READ-WRITE] SELECT completed\r\n")
+
+    do_EXAMINE = do_SELECT
+
+    def do_UID_SEARCH(self, tag, args):
+        criteria = " ".join(args).upper()
+        uids = [uid for uid, (_, flags) in sorted(self.mailbox.messages.items())
+                if "UNSEEN" not in criteria or "\\Seen" not in flags]
+        self.send(f"* SEARCH {' '.join(map(str, uids))}\r\n".replace("SEARCH \r", "SEARCH\r"))
+        self.send(f"{tag} OK SEARCH completed\r\n")
+
+    def do_UID_FETCH(self, tag, args):
+        items = _tokens(args[1].strip("()")) if len(args) > 1 else []
+        sequence = sorted(self.mailbox.messages)
+        for uid in self.mailbox.uids(args[0]):
+            message, flags = self.mailbox.messages[uid]
+            out = [f"UID {uid}".encode()]
+            for item in items:
+                name = item.upper()
+                if name == "UID":
+                    continue
+                if name == "FLAGS":
+                    out.append(f"FLAGS ({' '.join(sorted(flags))})".encode())
+                elif name == "BODYSTRUCTURE":
+                    out.append(b"BODYSTRUCTURE " + _bodystructure(message).encode("utf-8"))
+                elif name == "RFC822":
+                    data = message.as_bytes()
+                    out.append(b"RFC822 {%d}\r\n" % len(data) + data)
+                    flags.add("\\Seen")
+                elif name.startswith(("BODY[", "BODY.PEEK[")):
+                    spec = item[item.index("[") + 1:item.rindex("]")]
+                    data = _section(message, spec)
+                    out.append(f"BODY[{spec}] {{{len(data)}}}\r\n".encode("utf-8") + data)
+                    if not name.startswith("BODY.PEEK"):
+                        flags.add("\\Seen")
+            self.send(b"* %d FETCH (" % (sequence.index(uid) + 1) + b" ".join(out) + b")\r\n")
+        self.send(f"{tag} OK FETCH completed\r\n")
+
+    def do_UID_STORE(self, tag, args):
+        mode, names = args[1].upper(), re.findall(r"\\?\w+", args[2] if len(args) > 2 else "")
+        for uid in self.mailbox.uids(args[0]):
+            flags = self.mailbox.messages[uid][1]
+            if mode.startswith("+"):
+                flags.update(names)
+            elif mode.startswith("-"):
+                flags.difference_update(names)
+            else:
+                flags.clear()
+                flags.update(names)
+        self.send(f"{tag} OK STORE completed\r\n")
+
+    def do_IDLE(self, tag, args):
+        self.send("+ idling\r\n")
+        done = threading.Event()
+
+        def announce():
+            with self.mailbox.changed:
+                known = self.mailbox.next_uid
+                while not done.is_set():
+                    self.mailbox.changed.wait(0.5)
+                    if self.mailbox.next_uid != known and not done.is_set():
+                        known = self.mailbox.next_uid
+                        self.send(f"* {len(self.mailbox.messages)} EXISTS\r\n")
+
+        announcer = threading.Thread(target=announce, daemon=True)
+        announcer.start()
+        line = self.rfile.readline()
+        done.set()
+        announcer.join()
+        if not line:
+            return False
+        self.send(f"{tag} OK IDLE terminated\r\n")
+
+
+class ImapStandin:
+    def __init__(self, host: str = "127.0.0.1", port: int = 1143):
+        self.mailbox = _Mailbox()
+        handler = type("Session", (_Session,), {"mailbox": self.mailbox})
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def deliver(self, raw: bytes) -> int:
+        return self.mailbox.deliver(raw)
+
+    def is_seen(self, uid: int) -> bool:
+        return "\\Seen" in self.mailbox.messages[uid][1]
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="imap-standin", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--deliver", action="append", default=[], metavar="EML", help="message file to put in the INBOX")
+    args = parser.parse_args()
+
+    standin = ImapStandin(args.host, args.port)
+    for path in args.deliver:
+        with open(path, "rb") as f:
+            standin.deliver(f.read())
+    print(f"IMAP stand-in on {args.host}:{standin.port} with {len(args.deliver)} message(s) — Ctrl+C to stop")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Local SMTP stand-in — accepts any login and records delivered messages in memory, so outbound
+notifications can be exercised without a real mail provider.
+
+Usage (from backend/):
+    python -m scripts.smtp_standin --port 1025
+
+then run the API with
+    EMAIL_SMTP_SERVER=127.0.0.1 EMAIL_SMTP_PORT=1025 EMAIL_SMTP_TLS=false \\
+    EMAIL_ADDRESS=inbox@example.com EMAIL_PASSWORD=anything
+
+In-process use: `server = SmtpStandin(port=0).start()`; `server.messages` holds the received
+email.message.Message objects and `server.connections` / `server.logins` count sessions.
+Set `server.fail_next = n` to reject the next n messages with a 451.
+"""
+import argparse
+import email
+import email.policy
+import socketserver
+import threading
+
+
+class _Session(socketserver.StreamRequestHandler):
+    standin: "SmtpStandin"
+
+    def reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode("utf-8"))
+
+    def handle(self):
+        self.standin._count("connections")
+        self.reply("220 smtp stand-in ready")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-stand-in\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+            elif verb == "AUTH":
+                self.standin._count("logins")
+                self.reply("235 authenticated")
+            elif verb == "MAIL":
+                sender, recipients = command[10:].strip("<> "), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command[8:].strip("<> "))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 end with <CRLF>.<CRLF>")
+                data = bytearray()
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    data += chunk[1:] if chunk.startswith(b"..") else chunk
+                if self.standin._should_fail():
+                    self.reply("451 temporary failure")
+                else:
+                    self.standin._store(email.message_from_bytes(bytes(data), policy=email.policy.default))
+                    self.reply("250 queued")
+            elif verb in ("NOOP", "RSET"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 command not implemented")
+
+
+class SmtpStandin:
+    def __init__(self, host: str = "127.0.0.1", port: int = 1025):
+        self.messages: list = []
+        self.connections = 0
+        self.logins = 0
+        self.fail_next = 0
+        self._lock = threading.Lock()
+        handler = type("Session", (_Session,), {"standin": self})
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return True
+            return False
+
+    def _store(self, message):
+        with self._lock:
+            self.messages.append(message)
+        print(f"[smtp stand-in] to={message['To']} subject={message['Subject']}")
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="smtp-standin", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+
+    standin = SmtpStandin(args.host, args.port)
+    print(f"SMTP stand-in on {args.host}:{standin.port} — Ctrl+C to stop")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,127 +1,466 @@
 """
-Analytics Service — All aggregations are computed server-side using SQLAlchemy
-GROUP BY queries to prevent N+1 patterns and keep dashboard loads fast.
+Analytics Service — dashboard metrics are served from pre-aggregated rollup tables
+(per org × status, per org × day × status, per org × vendor) instead of scanning invoices.
+
+The rollups are maintained incrementally: a session flush listener diffs every inserted,
+updated or deleted Invoice against its previous state and applies the +/- deltas as
+atomic upsert-increments inside the same transaction, so they commit or roll back together
+with the invoice change. rebuild_rollups() recomputes them from scratch.
 """
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import Date, case, cast, delete, event, func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case, cast, Date
-from datetime import datetime, timedelta, timezone
-from models.all import Invoice, InvoiceStatus
+from sqlalchemy.orm.attributes import instance_state
+
+from core.cache import SWRCache
+from core.config import settings
+from dependencies import SessionLocal
+from models.all import (
+    Invoice, InvoiceStatus, Organization,
+    InvoiceStatusRollup, InvoiceDailyRollup, InvoiceVendorRollup,
+)
+
+logger = logging.getLogger(__name__)
+
+APPROVED_STATUSES = (InvoiceStatus.APPROVED, InvoiceStatus.AUTO_APPROVED)
+
+# Invoice attributes the rollups are derived from — changes to anything else never touch them
+ROLLUP_FIELDS = (
+    "organization_id", "status", "created_at", "vendor_name", "total_amount",
+    "duplicate_flag", "fraud_flag", "confidence_score", "processing_time_seconds",
+)
+METRIC_COLUMNS = (
+    "invoice_count", "amount_total", "duplicate_count", "fraud_count",
+    "confidence_sum", "confidence_count", "processing_time_sum", "processing_time_count",
+)
+VENDOR_METRIC_COLUMNS = ("invoice_count", "amount_total")
+
+
+# ── Incremental maintenance ───────────────────────────────────────────────────
+
+def _utc_day(created_at: Optional[datetime]) -> date:
+    if created_at is None:
+        # created_at is a server default, so a freshly inserted row has no value in Python yet
+        return datetime.now(tz=timezone.utc).date()
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date()
+
+
+class RollupDelta:
+    """Accumulates signed invoice contributions, keyed by rollup table and primary key."""
+
+    def __init__(self):
+        self.rows = defaultdict(lambda: defaultdict(float))
+
+    def add(self, snapshot: dict, sign: int, count: int = 1):
+        """
+        Adds one invoice, or `count` invoices that share every snapshot field except the amount
+        (snapshot["total_amount"] is then their sum) — how bulk imports are counted in one step.
+        """
+        org_id = snapshot["organization_id"]
+        status = snapshot["status"] or InvoiceStatus.PROCESSING
+        amount = snapshot["total_amount"] or 0.0
+        confidence = snapshot["confidence_score"]
+        processing_time = snapshot["processing_time_seconds"]
+
+        metrics = {
+            "invoice_count": count,
+            "amount_total": amount,
+            "duplicate_count": count if snapshot["duplicate_flag"] else 0,
+            "fraud_count": count if snapshot["fraud_flag"] else 0,
+            "confidence_sum": (confidence or 0.0) * count,
+            "confidence_count": count if confidence is not None else 0,
+            "processing_time_sum": (processing_time or 0.0) * count,
+            "processing_time_count": count if processing_time is not None else 0,
+        }
+        targets = [
+            (InvoiceStatusRollup, (org_id, status)),
+            (InvoiceDailyRollup, (org_id, _utc_day(snapshot["created_at"]), status)),
+        ]
+        for model, key in targets:
+            row = self.rows[(model, key)]
+            for column, value in metrics.items():
+                row[column] += sign * value
+
+        if status in APPROVED_STATUSES and snapshot["vendor_name"]:
+            row = self.rows[(InvoiceVendorRollup, (org_id, snapshot["vendor_name"]))]
+            row["invoice_count"] += sign * count
+            row["amount_total"] += sign * amount
+
+    def apply(self, connection, skip_org_ids: frozenset = frozenset()) -> set:
+        """Writes the accumulated deltas and returns the organization ids whose rollups changed."""
+        batches = defaultdict(list)
+        touched = set()
+        for (model, key), metrics in self.rows.items():
+            if key[0] in skip_org_ids or not any(metrics.values()):
+                continue
+            touched.add(key[0])
+            key_columns = [c.name for c in model.__table__.primary_key.columns]
+            metric_columns = VENDOR_METRIC_COLUMNS if model is InvoiceVendorRollup else METRIC_COLUMNS
+            batches[model].append({
+                **dict(zip(key_columns, key)),
+                **{c: (int(metrics[c]) if c.endswith("count") else metrics[c]) for c in metric_columns},
+            })
+        for model, rows in batches.items():
+            _upsert_increments(connection, model, rows)
+        self.rows.clear()
+        return touched
+
+
+def _upsert_increments(connection, model, rows: list[dict]):
+    table = model.__table__
+    key_columns = [c.name for c in table.primary_key.columns]
+    metric_columns = [name for name in rows[0] if name not in key_columns]
+    dialect = connection.dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={c: table.c[c] + stmt.excluded[c] for c in metric_columns},
+        )
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        result = connection.execute(
+            update(table)
+            .where(*[table.c[k] == row[k] for k in key_columns])
+            .values({c: table.c[c] + row[c] for c in metric_columns})
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(row))
+
+
+def _snapshot_from_state(state) -> Optional[dict]:
+    """Pre-flush values of the rollup fields, or None if any of them isn't loaded (expired or set blind)."""
+    snapshot = {}
+    for field in ROLLUP_FIELDS:
+        history = state.attrs[field].history
+        if history.deleted:
+            snapshot[field] = history.deleted[0]
+        elif history.unchanged:
+            snapshot[field] = history.unchanged[0]
+        elif state.key is not None and field not in state.dict:
+            return None
+        else:
+            snapshot[field] = None
+    return snapshot
 
 
-def get_analytics(db: Session) -> dict:
+def _has_rollup_changes(state) -> bool:
+    return any(state.attrs[field].history.has_changes() for field in ROLLUP_FIELDS)
+
+
+@event.listens_for(Session, "before_flush")
+def _capture_rollup_baseline(session, flush_context, instances):
+    """Records what each changed or deleted invoice contributed before this flush overwrites it."""
+    previous = {}
+    unknown = []
+    candidates = [obj for obj in session.dirty if isinstance(obj, Invoice)] + \
+                 [obj for obj in session.deleted if isinstance(obj, Invoice)]
+
+    for obj in candidates:
+        state = instance_state(obj)
+        if state.key is None or (obj not in session.deleted and not _has_rollup_changes(state)):
+            continue
+        snapshot = _snapshot_from_state(state)
+        if snapshot is None:
+            unknown.append(obj.id)
+        else:
+            previous[obj.id] = snapshot
+
+    if unknown:
+        # Core select on the flush connection: an ORM query here would try to autoflush
+        columns = [Invoice.__table__.c[field] for field in ROLLUP_FIELDS]
+        rows = session.connection().execute(
+            select(Invoice.__table__.c.id, *columns).where(Invoice.__table__.c.id.in_(unknown))
+        )
+        for row in rows:
+            previous[row.id] = {field: getattr(row, field) for field in ROLLUP_FIELDS}
+
+    session.info["rollup_previous"] = previous
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_rollup_changes(session, flush_context):
+    previous = session.info.pop("rollup_previous", {})
+    new_invoices = [obj for obj in session.new if isinstance(obj, Invoice)]
+    deleted_orgs = frozenset(obj.id for obj in session.deleted if isinstance(obj, Organization))
+    if not previous and not new_invoices and not deleted_orgs:
+        return
+
+    delta = RollupDelta()
+    for obj in new_invoices:
+        delta.add({field: instance_state(obj).dict.get(field) for field in ROLLUP_FIELDS}, +1)
+
+    deleted_ids = {obj.id for obj in session.deleted if isinstance(obj, Invoice)}
+    dirty_by_id = {obj.id: obj for obj in session.dirty if isinstance(obj, Invoice)}
+    for invoice_id, before in previous.items():
+        delta.add(before, -1)
+        if invoice_id in deleted_ids or invoice_id not in dirty_by_id:
+            continue
+        current = instance_state(dirty_by_id[invoice_id]).dict
+        delta.add({field: current.get(field, before[field]) for field in ROLLUP_FIELDS}, +1)
+
+    # A deleted organization's rows go entirely (SQLite doesn't enforce ON DELETE CASCADE)
+    connection = session.connection()
+    touched = delta.apply(connection, skip_org_ids=deleted_orgs)
+    session.info.setdefault("rollup_touched_orgs", set()).update(touched | deleted_orgs)
+    if deleted_orgs:
+        for model in (InvoiceStatusRollup, InvoiceDailyRollup, InvoiceVendorRollup):
+            connection.execute(delete(model).where(model.organization_id.in_(deleted_orgs)))
+
+
+def record_grouped_rollups(db: Session, snapshot: dict, groups):
     """
-    Single-pass aggregation returning all dashboard metrics.
-    Designed to minimise DB round-trips.
+    Applies the contribution of invoices inserted through Core, which the flush listener never
+    sees (spreadsheet imports): `groups` yields (vendor_name, invoice_count, amount_total) for
+    invoices that otherwise share `snapshot`.
     """
+    delta = RollupDelta()
+    for vendor_name, count, amount in groups:
+        delta.add({**snapshot, "vendor_name": vendor_name, "total_amount": amount}, +1, count=count)
+    db.info.setdefault("rollup_touched_orgs", set()).update(delta.apply(db.connection()))
 
-    # ── 1. Core aggregate (single query) ──────────────────────────────────────
-    totals = db.query(
-        func.count(Invoice.id).label("total"),
-        func.sum(case((Invoice.status == InvoiceStatus.AUTO_APPROVED, 1), else_=0)).label("auto_approved"),
-        func.sum(case((Invoice.status == InvoiceStatus.APPROVED, 1), else_=0)).label("approved"),
-        func.sum(case((Invoice.status == InvoiceStatus.UNDER_REVIEW, 1), else_=0)).label("under_review"),
-        func.sum(case((Invoice.status == InvoiceStatus.REJECTED, 1), else_=0)).label("rejected"),
-        func.sum(case((Invoice.duplicate_flag == True, 1), else_=0)).label("duplicates"),
-        func.sum(case((Invoice.fraud_flag == True, 1), else_=0)).label("fraud_flags"),
-        func.avg(Invoice.confidence_score).label("avg_confidence"),
-        func.avg(Invoice.processing_time_seconds).label("avg_processing_time"),
-        func.sum(case((Invoice.status.in_([InvoiceStatus.APPROVED, InvoiceStatus.AUTO_APPROVED]), Invoice.total_amount), else_=0)).label("total_volume_usd")
-    ).one()
-
-    total = totals.total or 0
-    total_finalized = (totals.auto_approved or 0) + (totals.approved or 0)
-    approval_rate = round((total_finalized / total) * 100, 1) if total > 0 else 0.0
 
-    summary = {
-        "total_invoices": total,
-        "total_auto_approved": totals.auto_approved or 0,
-        "total_approved": totals.approved or 0,
-        "total_under_review": totals.under_review or 0,
-        "total_rejected": totals.rejected or 0,
-        "total_duplicates": totals.duplicates or 0,
-        "total_fraud_flags": totals.fraud_flags or 0,
-        "average_confidence_score": round(totals.avg_confidence or 0, 4) if totals.avg_confidence else 0,
-        "average_processing_time_seconds": round(totals.avg_processing_time or 0, 2) if totals.avg_processing_time else 0,
-        "auto_approval_rate_percentage": approval_rate,
-        "total_volume_usd": round(totals.total_volume_usd or 0, 2)
-    }
+@event.listens_for(Session, "after_commit")
+def _invalidate_cached_analytics(session):
+    touched = session.info.pop("rollup_touched_orgs", None)
+    if touched:
+        _invalidate_org_analytics(touched)
 
-    # ── 2. Today count ─────────────────────────────────────────────────────────
-    today_start = datetime.now(tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    summary["invoices_processed_today"] = db.query(func.count(Invoice.id)).filter(
-        Invoice.created_at >= today_start
-    ).scalar() or 0
-
-    # ── 3. Daily counts — last 7 days (GROUP BY date) ─────────────────────────
-    seven_days_ago = datetime.now(tz=timezone.utc) - timedelta(days=7)
-    daily_rows = db.query(
-        cast(Invoice.created_at, Date).label("day"),
-        func.count(Invoice.id).label("count"),
-        func.sum(case((Invoice.fraud_flag == True, 1), else_=0)).label("fraud"),
-        func.sum(Invoice.total_amount).label("daily_volume_usd"),
-        func.avg(Invoice.processing_time_seconds).label("daily_avg_processing_time")
-    ).filter(
-        Invoice.created_at >= seven_days_ago
-    ).group_by(
-        cast(Invoice.created_at, Date)
-    ).order_by(
-        cast(Invoice.created_at, Date)
-    ).all()
 
-    daily_counts = [
-        {
-            "date": str(row.day), 
-            "count": row.count, 
-            "fraud": int(row.fraud or 0),
-            "volume_usd": round(row.daily_volume_usd or 0, 2),
-            "avg_processing_time": round(row.daily_avg_processing_time or 0, 2)
-        }
-        for row in daily_rows
+@event.listens_for(Session, "after_rollback")
+def _discard_rollup_changes(session):
+    session.info.pop("rollup_touched_orgs", None)
+
+
+# ── Full rebuild ──────────────────────────────────────────────────────────────
+
+def _invoice_day_expression(dialect: str):
+    if dialect == "postgresql":
+        return cast(func.timezone("UTC", Invoice.created_at), Date)
+    if dialect == "sqlite":
+        return func.date(Invoice.created_at)
+    return cast(Invoice.created_at, Date)
+
+
+def _metric_aggregates():
+    return [
+        func.count(Invoice.id),
+        func.coalesce(func.sum(Invoice.total_amount), 0.0),
+        func.sum(case((Invoice.duplicate_flag == True, 1), else_=0)),
+        func.sum(case((Invoice.fraud_flag == True, 1), else_=0)),
+        func.coalesce(func.sum(Invoice.confidence_score), 0.0),
+        func.count(Invoice.confidence_score),
+        func.coalesce(func.sum(Invoice.processing_time_seconds), 0.0),
+        func.count(Invoice.processing_time_seconds),
     ]
 
-    # Back-fill missing days with zero so the chart always shows 7 bars
-    existing_dates = {d["date"] for d in daily_counts}
-    for i in range(7):
-        d = (datetime.now(tz=timezone.utc) - timedelta(days=6 - i)).date()
-        ds = str(d)
-        if ds not in existing_dates:
-            daily_counts.append({
-                "date": ds, 
-                "count": 0, 
-                "fraud": 0,
-                "volume_usd": 0,
-                "avg_processing_time": 0
-            })
-    daily_counts.sort(key=lambda x: x["date"])
 
+def rebuild_rollups(db: Session, org_id: Optional[str] = None) -> dict:
+    """
+    Recomputes every rollup row (or one organization's) from the invoices table in a single
+    transaction. On Postgres the rollup tables are locked against concurrent increments, so
+    writers that commit during the rebuild are counted exactly once.
+    """
+    dialect = db.bind.dialect.name
+    models = (InvoiceStatusRollup, InvoiceDailyRollup, InvoiceVendorRollup)
+    if dialect == "postgresql":
+        db.execute(text(
+            "LOCK TABLE " + ", ".join(m.__tablename__ for m in models) + " IN SHARE ROW EXCLUSIVE MODE"
+        ))
+
+    scope = [Invoice.organization_id == org_id] if org_id else []
+    for model in models:
+        db.execute(delete(model).where(model.organization_id == org_id) if org_id else delete(model))
+
+    day = _invoice_day_expression(dialect)
+    sources = [
+        (InvoiceStatusRollup, [Invoice.organization_id, Invoice.status], METRIC_COLUMNS, _metric_aggregates(), scope),
+        (InvoiceDailyRollup, [Invoice.organization_id, day, Invoice.status], METRIC_COLUMNS, _metric_aggregates(), scope),
+        (
+            InvoiceVendorRollup,
+            [Invoice.organization_id, Invoice.vendor_name],
+            VENDOR_METRIC_COLUMNS,
+            [func.count(Invoice.id), func.coalesce(func.sum(Invoice.total_amount), 0.0)],
+            scope + [Invoice.vendor_name.isnot(None), Invoice.status.in_(APPROVED_STATUSES)],
+        ),
+    ]
+    counts = {}
+    for model, group_by, metric_columns, aggregates, filters in sources:
+        key_columns = [c.name for c in model.__table__.primary_key.columns]
+        source = select(*group_by, *aggregates).where(*filters).group_by(*group_by)
+        db.execute(insert(model).from_select(key_columns + list(metric_columns), source))
+        counts[model.__tablename__] = db.query(func.count()).select_from(model).scalar()
+
+    db.commit()
+    analytics_cache.invalidate()
+    logger.info(f"Analytics rollups rebuilt{f' for org {org_id}' if org_id else ''}: {counts}")
+    return counts
+
+
+# ── Dashboard queries ─────────────────────────────────────────────────────────
+
+# Dashboards poll: serve from memory, refresh in the background, go stale whenever the org's rollups change.
+# Keys are (view, org_id); org_id None is the cross-tenant admin view.
+analytics_cache = SWRCache(
+    "analytics",
+    ttl=settings.ANALYTICS_CACHE_TTL_SECONDS,
+    max_age=settings.ANALYTICS_CACHE_MAX_AGE_SECONDS,
+)
+ANALYTICS_VIEWS = ("admin", "client")
+
+
+def _invalidate_org_analytics(org_ids):
+    analytics_cache.invalidate(("admin", None))
+    for org_id in org_ids:
+        for view in ANALYTICS_VIEWS:
+            analytics_cache.invalidate((view, org_id))
+
+
+def _cached(view: str, org_id: Optional[str], builder) -> tuple[dict, str]:
+    def compute():
+        db = SessionLocal()
+        try:
+            return builder(db, org_id)
+        finally:
+            db.close()
+
+    return analytics_cache.get((view, org_id), compute)
+
+
+def get_cached_analytics(org_id: Optional[str] = None) -> tuple[dict, str]:
+    """get_analytics behind the SWR cache. Returns (payload, "hit" | "stale" | "miss")."""
+    return _cached("admin", org_id, lambda db, org: get_analytics(db, org_id=org))
+
+
+def get_cached_org_analytics(org_id: str) -> tuple[dict, str]:
+    """get_org_analytics behind the SWR cache. Returns (payload, "hit" | "stale" | "miss")."""
+    return _cached("client", org_id, get_org_analytics)
+
+
+def _ratio(total, count, digits):
+    return round(total / count, digits) if count else 0
+
+
+def _scoped(query, model, org_id: Optional[str]):
+    # Every rollup primary key leads with organization_id, so a tenant filter is a PK range scan
+    return query.filter(model.organization_id == org_id) if org_id else query
+
+
+def _status_totals(db: Session, org_id: Optional[str]) -> list:
+    return _scoped(db.query(
+        InvoiceStatusRollup.status,
+        func.sum(InvoiceStatusRollup.invoice_count).label("invoice_count"),
+        func.sum(InvoiceStatusRollup.amount_total).label("amount_total"),
+        func.sum(InvoiceStatusRollup.duplicate_count).label("duplicate_count"),
+        func.sum(InvoiceStatusRollup.fraud_count).label("fraud_count"),
+        func.sum(InvoiceStatusRollup.confidence_sum).label("confidence_sum"),
+        func.sum(InvoiceStatusRollup.confidence_count).label("confidence_count"),
+        func.sum(InvoiceStatusRollup.processing_time_sum).label("processing_time_sum"),
+        func.sum(InvoiceStatusRollup.processing_time_count).label("processing_time_count"),
+    ), InvoiceStatusRollup, org_id).group_by(InvoiceStatusRollup.status).all()
+
+
+def _daily_series(db: Session, org_id: Optional[str], days: int = 7) -> list[dict]:
+    """One point per UTC day for the last `days` days (today included), zero-filled."""
+    today = datetime.now(tz=timezone.utc).date()
+    first_day = today - timedelta(days=days - 1)
+    daily_rows = _scoped(db.query(
+        InvoiceDailyRollup.day,
+        func.sum(InvoiceDailyRollup.invoice_count).label("count"),
+        func.sum(InvoiceDailyRollup.fraud_count).label("fraud"),
+        func.sum(InvoiceDailyRollup.amount_total).label("volume_usd"),
+        func.sum(InvoiceDailyRollup.processing_time_sum).label("processing_time_sum"),
+        func.sum(InvoiceDailyRollup.processing_time_count).label("processing_time_count"),
+    ), InvoiceDailyRollup, org_id).filter(InvoiceDailyRollup.day >= first_day).group_by(InvoiceDailyRollup.day).all()
+    by_day = {str(row.day): row for row in daily_rows}
+
+    series = []
+    for i in range(days):
+        ds = str(first_day + timedelta(days=i))
+        row = by_day.get(ds)
+        series.append({
+            "date": ds,
+            "count": int(row.count or 0) if row else 0,
+            "fraud": int(row.fraud or 0) if row else 0,
+            "volume_usd": round(row.volume_usd or 0, 2) if row else 0,
+            "avg_processing_time": _ratio(row.processing_time_sum or 0, row.processing_time_count or 0, 2) if row else 0,
+        })
+    return series
+
+
+def get_analytics(db: Session, org_id: Optional[str] = None) -> dict:
+    """
+    Dashboard metrics for every organization, or just `org_id`. Every query reads rollup
+    rows only, so the cost is independent of how many invoices exist.
+    """
+    # ── 1. Status totals ──────────────────────────────────────────────────────
+    status_rows = _status_totals(db, org_id)
+
+    by_status = {row.status: int(row.invoice_count or 0) for row in status_rows}
+    total = sum(by_status.values())
+    auto_approved = by_status.get(InvoiceStatus.AUTO_APPROVED, 0)
+    approved = by_status.get(InvoiceStatus.APPROVED, 0)
+    under_review = by_status.get(InvoiceStatus.UNDER_REVIEW, 0)
+    rejected = by_status.get(InvoiceStatus.REJECTED, 0)
+    approval_rate = round(((auto_approved + approved) / total) * 100, 1) if total > 0 else 0.0
+
+    summary = {
+        "total_invoices": total,
+        "total_auto_approved": auto_approved,
+        "total_approved": approved,
+        "total_under_review": under_review,
+        "total_rejected": rejected,
+        "total_duplicates": int(sum(row.duplicate_count or 0 for row in status_rows)),
+        "total_fraud_flags": int(sum(row.fraud_count or 0 for row in status_rows)),
+        "average_confidence_score": _ratio(
+            sum(row.confidence_sum or 0 for row in status_rows), sum(row.confidence_count or 0 for row in status_rows), 4),
+        "average_processing_time_seconds": _ratio(
+            sum(row.processing_time_sum or 0 for row in status_rows), sum(row.processing_time_count or 0 for row in status_rows), 2),
+        "auto_approval_rate_percentage": approval_rate,
+        "total_volume_usd": round(sum(row.amount_total or 0 for row in status_rows if row.status in APPROVED_STATUSES), 2),
+    }
+
+    # ── 2. Daily series — last 7 UTC days (includes today) ────────────────────
+    daily_counts = _daily_series(db, org_id)
+    summary["invoices_processed_today"] = daily_counts[-1]["count"]
     summary["invoices_last_7_days"] = sum(d["count"] for d in daily_counts)
 
-    # ── 4. Approval distribution for pie chart ─────────────────────────────────
+    # ── 3. Approval distribution for pie chart ────────────────────────────────
     approval_distribution = [
-        {"name": "Auto Approved", "value": totals.auto_approved or 0},
-        {"name": "Approved",      "value": totals.approved or 0},
-        {"name": "Under Review",  "value": totals.under_review or 0},
-        {"name": "Rejected",      "value": totals.rejected or 0},
+        {"name": "Auto Approved", "value": auto_approved},
+        {"name": "Approved",      "value": approved},
+        {"name": "Under Review",  "value": under_review},
+        {"name": "Rejected",      "value": rejected},
     ]
 
-    # ── 5. Top Vendors by Volume ───────────────────────────────────────────────
-    top_vendors_rows = db.query(
-        Invoice.vendor_name,
-        func.count(Invoice.id).label("count"),
-        func.sum(Invoice.total_amount).label("volume_usd")
-    ).filter(
-        Invoice.vendor_name.isnot(None),
-        Invoice.status.in_([InvoiceStatus.APPROVED, InvoiceStatus.AUTO_APPROVED])
+    # ── 4. Top Vendors by Volume ──────────────────────────────────────────────
+    top_vendors_rows = _scoped(db.query(
+        InvoiceVendorRollup.vendor_name,
+        func.sum(InvoiceVendorRollup.invoice_count).label("count"),
+        func.sum(InvoiceVendorRollup.amount_total).label("volume_usd"),
+    ), InvoiceVendorRollup, org_id).filter(
+        InvoiceVendorRollup.invoice_count > 0
     ).group_by(
-        Invoice.vendor_name
+        InvoiceVendorRollup.vendor_name
     ).order_by(
-        func.sum(Invoice.total_amount).desc()
+        func.sum(InvoiceVendorRollup.amount_total).desc()
     ).limit(5).all()
 
     top_vendors = [
         {
             "name": row.vendor_name,
-            "count": row.count,
+            "count": int(row.count or 0),
             "volume_usd": round(row.volume_usd or 0, 2)
         }
         for row in top_vendors_rows
@@ -136,3 +475,26 @@ def get_analytics(db: Session) -> dict:
         "approval_distribution": approval_distribution,
         "top_vendors": top_vendors
     }
+
+
+def get_org_analytics(db: Session, org_id: str, days: int = 7) -> dict:
+    """
+    Compact per-organization numbers for the client dashboard: pipeline counters, status
+    breakdown and a ready-to-chart daily series — same rollups as the admin dashboard.
+    """
+    status_rows = _status_totals(db, org_id)
+    by_status = {row.status: int(row.invoice_count or 0) for row in status_rows}
+    total = sum(by_status.values())
+    processing = by_status.get(InvoiceStatus.PROCESSING, 0)
+    series = _daily_series(db, org_id, days)
+
+    return {
+        "total_invoices": total,
+        "pipeline": {
+            "processing": processing,
+            "done": total - processing,
+        },
+        "status_counts": {status.value: by_status.get(status, 0) for status in InvoiceStatus},
+        "total_volume_usd": round(sum(row.amount_total or 0 for row in status_rows if row.status in APPROVED_STATUSES), 2),
+        "daily_counts": [{"date": d["date"], "count": d["count"], "volume_usd": d["volume_usd"]} for d in series],
+    }
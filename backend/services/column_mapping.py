@@ -0,0 +1,251 @@
+"""
+Spreadsheet column mapping: which columns of an export hold the vendor, amount, invoice number
+and date.
+
+An organization's exports are recognized by their header signature (a hash of the normalized
+header names, order-insensitive). A mapping remembered for that signature — confirmed by a user,
+or detected on an earlier successful import — is reused as-is. Otherwise every column is
+profiled from a sample of its values (numeric/date/text shares, distinctness, whole-number
+share, sequences) and each (role, column) pair is scored on header name and values together;
+the best-scoring pairs are assigned greedily, one column per role.
+"""
+import hashlib
+import logging
+import re
+from dataclasses import dataclass, field
+
+import pandas as pd
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from dependencies import SessionLocal
+from models.all import SpreadsheetColumnMapping
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("amount", "vendor", "number", "date")
+PROFILE_SAMPLE_ROWS = 500
+MIN_ASSIGNMENT_SCORE = 0.3
+
+# Header names that identify a role outright, and words that hint at it
+HEADER_NAMES = {
+    "amount": {"total", "amount", "total_amount", "price", "grand_total", "amount_due", "invoice_total",
+               "net_amount", "gross_amount", "total_due", "betrag", "montant", "importe"},
+    "vendor": {"vendor_name", "vendor", "first_name", "client_name", "company", "supplier", "supplier_name",
+               "company_name", "payee", "merchant", "seller", "creditor", "lieferant", "fournisseur", "proveedor"},
+    "number": {"invoice_number", "id", "stock_code", "ref", "invoice_id", "invoice_no", "inv_no", "reference",
+               "document_number", "doc_no", "bill_number", "bill_no", "rechnungsnummer", "numero"},
+    "date": {"date", "invoice_date", "created_at", "timestamp", "issue_date", "document_date", "posting_date",
+             "bill_date", "datum", "fecha"},
+}
+HEADER_WORDS = {
+    "amount": {"total", "amount", "amt", "price", "sum", "due", "gross", "net", "value", "cost", "paid"},
+    "vendor": {"vendor", "supplier", "company", "payee", "merchant", "seller", "creditor", "name", "client", "customer"},
+    "number": {"number", "no", "num", "nr", "ref", "reference", "id", "code", "doc"},
+    "date": {"date", "dt", "day", "issued", "created", "posted", "timestamp", "datum", "time"},
+}
+
+_CURRENCY_NOISE = re.compile(r"[\s$€£¥₹]|[A-Z]{3}$|^[A-Z]{3}")
+
+
+def _normalize(name) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(name).strip().lower()).strip("_")
+
+
+def header_signature(columns) -> str:
+    return hashlib.sha256("\x1f".join(sorted(_normalize(c) for c in columns)).encode("utf-8")).hexdigest()
+
+
+# ── Profiling ─────────────────────────────────────────────────────────────────
+
+@dataclass
+class ColumnProfile:
+    filled: float = 0.0  # Share of sampled rows with a value
+    numeric: float = 0.0  # Share of values that parse as numbers (currency symbols and separators allowed)
+    whole: float = 0.0  # Share of numeric values without a fractional part
+    sequence: bool = False  # Strictly increasing whole numbers — a row id, not an amount
+    date: float = 0.0  # Share of non-numeric values that parse as dates
+    alpha: float = 0.0  # Share of values containing letters
+    digits: float = 0.0  # Share of values containing digits
+    distinct: float = 0.0  # Distinct values / values
+    mean_length: float = 0.0
+
+
+def to_number(values: pd.Series) -> pd.Series:
+    """Numbers from amount-like values: currency symbols/codes, thousands separators, (negatives)."""
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.astype(float)
+    text = values.astype(str).str.strip().str.replace(_CURRENCY_NOISE, "", regex=True)
+    negative = text.str.startswith("(") & text.str.endswith(")")
+    text = text.str.strip("()")
+    # 1,234.56 and 1.234,56 both become 1234.56
+    european = text.str.contains(r"^-?\d{1,3}(?:\.\d{3})*,\d{1,2}$", regex=True)
+    text = text.where(~european, text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    text = text.str.replace(",", "", regex=False)
+    numbers = pd.to_numeric(text, errors="coerce")
+    return numbers.where(~negative, -numbers)
+
+
+def profile_column(series: pd.Series) -> ColumnProfile:
+    sample = series.head(PROFILE_SAMPLE_ROWS)
+    values = sample[sample.notna() & (sample.astype(str).str.strip() != "")]
+    if sample.empty or values.empty:
+        return ColumnProfile()
+
+    profile = ColumnProfile(filled=len(values) / len(sample))
+    text = values.astype(str)
+    profile.alpha = float(text.str.contains(r"[A-Za-z]", regex=True).mean())
+    profile.digits = float(text.str.contains(r"\d", regex=True).mean())
+    profile.distinct = values.astype(str).nunique() / len(values)
+    profile.mean_length = float(text.str.len().mean())
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        profile.date = 1.0
+        return profile
+    if values.map(lambda v: hasattr(v, "year") and hasattr(v, "month")).all():  # date/datetime cells from openpyxl
+        profile.date = 1.0
+        return profile
+
+    numbers = to_number(values)
+    parsed = numbers.dropna()
+    profile.numeric = len(parsed) / len(values)
+    if len(parsed):
+        whole = (parsed == parsed.round())
+        profile.whole = float(whole.mean())
+        profile.sequence = bool(len(parsed) > 2 and whole.all() and parsed.is_monotonic_increasing and parsed.is_unique)
+
+    if profile.numeric < 0.5:
+        dates = pd.to_datetime(text, errors="coerce", format="mixed")
+        profile.date = float(dates.notna().mean())
+    return profile
+
+
+# ── Scoring ───────────────────────────────────────────────────────────────────
+
+def _header_score(role: str, name: str) -> float:
+    normalized = _normalize(name)
+    if normalized in HEADER_NAMES[role]:
+        return 1.0
+    words = set(normalized.split("_"))
+    return 0.6 if words & HEADER_WORDS[role] else 0.0
+
+
+def _value_score(role: str, p: ColumnProfile) -> float:
+    if p.filled == 0:
+        return 0.0
+    if role == "amount":
+        if p.numeric < 0.6:
+            return 0.0
+        return p.numeric * (0.4 if p.sequence else 1.0) * (0.75 + 0.25 * (1 - p.whole))
+    if role == "date":
+        return p.date if p.date >= 0.6 else 0.0
+    if role == "vendor":
+        if p.date >= 0.6 or p.numeric >= 0.5:
+            return 0.0
+        repeats = 1 - 0.5 * p.distinct  # The same vendors recur across invoices
+        verbose = 0.5 if p.mean_length > 80 else 1.0  # Free-text descriptions, not names
+        return p.alpha * repeats * verbose
+    if role == "number":
+        if p.date >= 0.6 or (p.numeric >= 0.6 and p.whole < 0.9):
+            return 0.0  # Dates and decimal amounts are not identifiers
+        counter = 0.85 if p.sequence else 1.0  # A bare row counter loses to a real document reference
+        return p.distinct * (0.6 + 0.4 * p.digits) * counter * (0.8 if p.mean_length > 40 else 1.0)
+    return 0.0
+
+
+def score(role: str, name, profile: ColumnProfile) -> float:
+    value = _value_score(role, profile)
+    if value == 0.0:
+        return 0.0
+    return 0.55 * _header_score(role, name) + 0.45 * value
+
+
+@dataclass
+class MappingResult:
+    columns: list[str]
+    header_signature: str
+    mapping: dict = field(default_factory=dict)  # role -> column label (as in the DataFrame) or None
+    source: str = "detected"  # detected | remembered | confirmed
+    confidence: float = 0.0
+
+    def describe(self, imported: bool = False) -> dict:
+        """JSON-safe summary stored on the import's tracker invoice."""
+        return {
+            "header_signature": self.header_signature,
+            "columns": self.columns,
+            "mapping": {role: (str(col) if col is not None else None) for role, col in self.mapping.items()},
+            "source": self.source,
+            "confidence": round(self.confidence, 3),
+            "imported": imported,
+        }
+
+
+def detect_mapping(df: pd.DataFrame) -> MappingResult:
+    """Profiles the sample and assigns the best-scoring column to each role; roles without a plausible column stay None."""
+    profiles = {column: profile_column(df[column]) for column in df.columns}
+    candidates = sorted(
+        ((score(role, column, profiles[column]), role, column) for role in ROLES for column in df.columns),
+        key=lambda c: c[0], reverse=True,
+    )
+    mapping, scores, used = {role: None for role in ROLES}, {}, set()
+    for value, role, column in candidates:
+        if value < MIN_ASSIGNMENT_SCORE or mapping[role] is not None or column in used:
+            continue
+        mapping[role], scores[role] = column, value
+        used.add(column)
+
+    columns = [str(c) for c in df.columns]
+    confidence = sum(scores.values()) / len(ROLES)
+    logger.info(f"Detected spreadsheet columns {({r: str(c) for r, c in mapping.items() if c is not None})} (confidence {confidence:.2f})")
+    return MappingResult(columns, header_signature(columns), mapping, "detected", confidence)
+
+
+def resolve_mapping(db: Session, organization_id: str, df: pd.DataFrame) -> MappingResult:
+    """The organization's remembered mapping for these headers, or a fresh detection from the sample rows."""
+    columns = [str(c) for c in df.columns]
+    signature = header_signature(columns)
+    stored = db.query(SpreadsheetColumnMapping.mapping, SpreadsheetColumnMapping.source).filter(
+        SpreadsheetColumnMapping.organization_id == organization_id,
+        SpreadsheetColumnMapping.header_signature == signature,
+    ).first()
+    if stored:
+        labels = {str(c): c for c in df.columns}
+        mapping = {role: labels.get(stored.mapping.get(role)) for role in ROLES}
+        if mapping["amount"] is not None:
+            source = "confirmed" if stored.source == "confirmed" else "remembered"
+            return MappingResult(columns, signature, mapping, source, 1.0)
+    return detect_mapping(df)
+
+
+def remember_mapping(organization_id: str, signature: str, columns: list[str], mapping: dict,
+                     confirmed: bool = False):
+    """
+    Upserts the mapping for the signature on a session of its own. A detected mapping never
+    replaces a confirmed one; it only counts the reuse.
+    """
+    mapping = {role: (str(mapping.get(role)) if mapping.get(role) is not None else None) for role in ROLES}
+    for attempt in range(2):  # A concurrent first import of the same export may insert the row first
+        db = SessionLocal()
+        try:
+            row = db.query(SpreadsheetColumnMapping).filter(
+                SpreadsheetColumnMapping.organization_id == organization_id,
+                SpreadsheetColumnMapping.header_signature == signature,
+            ).first()
+            if row is None:
+                row = SpreadsheetColumnMapping(organization_id=organization_id, header_signature=signature,
+                                               columns=columns, mapping=mapping, use_count=0)
+                db.add(row)
+            if confirmed or row.source != "confirmed":
+                row.mapping = mapping
+                row.columns = columns
+                row.source = "confirmed" if confirmed else "detected"
+            if not confirmed:
+                row.use_count = (row.use_count or 0) + 1
+            db.commit()
+            return
+        except IntegrityError:
+            db.rollback()
+            if attempt:
+                raise
+        finally:
+            db.close()
@@ -2,19 +2,27 @@ import email
 import imaplib
 import logging
 import re
-from email.header import decode_header
+import threading
+from collections import defaultdict
 from sqlalchemy.orm import Session
-import os
 
 from core.config import settings
-from models.all import User
-from services.invoice_service import log_invoice_event, _process_invoice_background
-from models.all import Invoice, InvoiceStatus
+from services.invoice_service import create_invoice_batch, _process_stored_invoice_background
+from services.processing_queue import processing_queue
+from services.notification_service import queue_status_email
+from services.sender_directory import SenderSnapshot, sender_directory
+from services.imap_client import (
+    AttachmentPart, attachment_parts, decode_part, fetched_section, idle, parse_fetch_response, uid_set
+)
 from dependencies import SessionLocal
-from fastapi import BackgroundTasks
 
 logger = logging.getLogger(__name__)
 
+ALLOWED_ATTACHMENT_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg")
+
+# The watcher and the manual poll endpoint share the mailbox; one sweep at a time avoids double ingestion
+_ingest_lock = threading.Lock()
+
 def connect_imap() -> getattr(imaplib, 'IMAP4_SSL', None):
     """Establishes a secure IMAP connection using environment variables."""
     if not settings.EMAIL_ADDRESS or not settings.EMAIL_PASSWORD:
@@ -22,16 +30,17 @@ def connect_imap() -> getattr(imaplib, 'IMAP4_SSL', None):
         return None
 
     try:
-        mail = imaplib.IMAP4_SSL(settings.EMAIL_IMAP_SERVER, settings.EMAIL_IMAP_PORT)
+        imap_class = imaplib.IMAP4_SSL if settings.EMAIL_IMAP_SSL else imaplib.IMAP4
+        mail = imap_class(settings.EMAIL_IMAP_SERVER, settings.EMAIL_IMAP_PORT)
         mail.login(settings.EMAIL_ADDRESS, settings.EMAIL_PASSWORD)
         return mail
     except Exception as e:
         logger.error(f"IMAP Connection failed: {e}")
         return None
 
-def fetch_and_process_emails(background_tasks: BackgroundTasks = None):
+def fetch_and_process_emails():
     """
-    Connects to the IMAP server, searches for UNSEEN emails, and downloads valid attachments.
+    One-shot sweep on a fresh connection (manual poll, and the scheduler when IDLE is off).
     Matches the sender address to an enrolled Organization to securely categorize the billing.
     """
     mail = connect_imap()
@@ -39,14 +48,7 @@ def fetch_and_process_emails(background_tasks: BackgroundTasks = None):
 
     try:
         mail.select("inbox")
-        status, messages = mail.search(None, "UNSEEN")
-        
-        if status != "OK" or not messages[0]:
-            return # No new emails
-
-        for num in messages[0].split():
-            _process_single_email(mail, num, background_tasks)
-
+        ingest_unseen(mail)
     except Exception as e:
          logger.error(f"Error during IMAP fetching cycle: {e}")
     finally:
@@ -55,178 +57,181 @@ def fetch_and_process_emails(background_tasks: BackgroundTasks = None):
         except:
             pass
 
-def _process_single_email(mail, num, background_tasks: BackgroundTasks):
+class MailboxWatcher:
+    """
+    Keeps one IMAP session open on a daemon thread: sweeps UNSEEN, then waits in IDLE until the
+    server announces new mail (or EMAIL_IDLE_REFRESH_SECONDS pass) and sweeps again. Servers
+    without IDLE are swept every EMAIL_POLL_SECONDS on the same session. Dropped connections
+    are re-established with exponential backoff.
+    """
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="imap-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            mail = connect_imap()
+            if mail:
+                try:
+                    mail.select("inbox")
+                    backoff = 1
+                    self._watch(mail)
+                except Exception as e:
+                    logger.warning(f"IMAP watcher lost its session, reconnecting: {e}")
+                finally:
+                    try:
+                        mail.logout()
+                    except:
+                        pass
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, settings.EMAIL_POLL_SECONDS)
+
+    def _watch(self, mail):
+        use_idle = "IDLE" in mail.capabilities
+        logger.info(f"IMAP watcher connected ({'IDLE' if use_idle else f'polling every {settings.EMAIL_POLL_SECONDS}s'})")
+        while not self._stop.is_set():
+            try:
+                ingest_unseen(mail)
+            except (imaplib.IMAP4.abort, OSError):
+                raise
+            except Exception as e:
+                logger.error(f"Error during IMAP fetching cycle: {e}")
+            if use_idle:
+                idle(mail, settings.EMAIL_IDLE_REFRESH_SECONDS, self._stop)
+            else:
+                self._stop.wait(settings.EMAIL_POLL_SECONDS)
+
+mailbox_watcher = MailboxWatcher()
+
+def ingest_unseen(mail) -> int:
+    """
+    Ingests every UNSEEN message of the selected mailbox in batches of EMAIL_FETCH_BATCH_SIZE.
+    Only BODYSTRUCTURE and the From header are fetched up front; attachment bodies are
+    downloaded solely for registered senders and acceptable files. Returns attachments ingested.
+    """
+    with _ingest_lock:
+        status, data = mail.uid("SEARCH", None, "UNSEEN")
+        if status != "OK" or not data or not data[0]:
+            return 0 # No new emails
+
+        uids = [uid.decode() for uid in data[0].split()]
+        batch_size = max(settings.EMAIL_FETCH_BATCH_SIZE, 1)
+        senders = sender_directory.current()  # One snapshot per sweep, shared by every batch
+        return sum(_ingest_batch(mail, uids[i:i + batch_size], senders) for i in range(0, len(uids), batch_size))
+
+def _sender_address(fields: dict):
+    header = fetched_section(fields, "HEADER.FIELDS")
+    sender = email.message_from_bytes(header or b"").get("From") or ""
+    match = re.search(r'[\w\.-]+@[\w\.-]+', sender)
+    return match.group(0).lower() if match else None
+
+def _safe_attachment_name(part: AttachmentPart):
+    """Sanitized filename when the part is an invoice we accept, otherwise None."""
+    safe_filename = re.sub(r'[^a-zA-Z0-9_.-]', '', part.filename)
+    if not safe_filename: safe_filename = "email_attachment.pdf"
+
+    if not safe_filename.lower().endswith(ALLOWED_ATTACHMENT_EXTENSIONS):
+        logger.info(f"Skipping incompatible email attachment: {safe_filename}")
+        return None
+    # Attachments arrive fully buffered, so the single-shot limit applies (checked before downloading)
+    if part.estimated_bytes > settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+        logger.warning(f"Email attachment too large: ~{part.estimated_bytes} bytes.")
+        return None
+    return safe_filename
+
+def _ingest_batch(mail, uids: list[str], directory: SenderSnapshot) -> int:
+    status, data = mail.uid("FETCH", uid_set(uids), "(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS (FROM)])")
+    if status != "OK":
+        logger.error(f"IMAP FETCH of {len(uids)} message structures failed: {status}")
+        return 0
+    messages = parse_fetch_response(data)
+
     db: Session = SessionLocal()
     try:
-        res, msg_data = mail.fetch(num, "(RFC822)")
-        if res != "OK": return
-
-        for response_part in msg_data:
-            if isinstance(response_part, tuple):
-                msg = email.message_from_bytes(response_part[1])
-                
-                # Extract Sender
-                sender = msg.get("From")
-                match = re.search(r'[\w\.-]+@[\w\.-]+', sender)
-                sender_email = match.group(0).lower() if match else None
-
-                if not sender_email:
-                    logger.warning("Unparsable sender, skipping.")
-                    continue
-
-                # Authenticate Sender
-                user = db.query(User).filter(User.email == sender_email).first()
-                if not user:
-                    logger.info(f"Ignored email from unregistered sender: {sender_email}")
-                    # Mark as seen so we don't infinitely retry
-                    mail.store(num, '+FLAGS', '\\Seen')
-                    continue
-
-                _handle_attachments(msg, user, db, background_tasks)
-                
-                # Flag as Read
-                mail.store(num, '+FLAGS', '\\Seen')
-
-    except Exception as e:
-         logger.error(f"Failed processing specific email message: {e}")
+        senders = {uid: _sender_address(fields) for uid, fields in messages.items()}
+
+        seen, plans = [], {}
+        by_layout = defaultdict(list)  # Messages with the same attachment sections share one FETCH
+        for uid, fields in messages.items():
+            if not senders[uid]:
+                logger.warning("Unparsable sender, skipping.")
+                continue
+            user = directory.resolve(senders[uid])
+            if not user:
+                logger.info(f"Ignored email from unregistered sender: {senders[uid]}")
+                seen.append(uid)  # Mark as seen so we don't infinitely retry
+                continue
+            try:
+                parts = [(part, name) for part in attachment_parts(fields.get("BODYSTRUCTURE"))
+                         if (name := _safe_attachment_name(part))]
+            except Exception as e:
+                logger.error(f"Unreadable structure of email from {senders[uid]}, leaving it unseen: {e}")
+                continue
+            plans[uid] = (user, parts)
+            if parts:
+                by_layout[tuple(part.section for part, _ in parts)].append(uid)
+
+        bodies = {}
+        for sections, group in by_layout.items():
+            items = " ".join(f"BODY.PEEK[{section}]" for section in sections)
+            status, data = mail.uid("FETCH", uid_set(group), f"(UID {items})")
+            if status == "OK":
+                bodies.update(parse_fetch_response(data))
+            else:
+                logger.error(f"IMAP FETCH of attachments for {len(group)} message(s) failed: {status}")
+
+        ingested = 0
+        for uid, (user, parts) in plans.items():
+            if parts and uid not in bodies:
+                continue  # Download failed; left unseen for the next sweep
+            try:
+                for part, safe_filename in parts:
+                    payload = fetched_section(bodies[uid], part.section)
+                    file_bytes = decode_part(payload, part.encoding) if payload else None
+                    if not file_bytes: continue
+                    _ingest_attachment(safe_filename, file_bytes, user, db)
+                    ingested += 1
+                seen.append(uid)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed processing specific email message: {e}")
+
+        # Flag as Read
+        if seen:
+            mail.uid("STORE", uid_set(seen), "+FLAGS", "(\\Seen)")
+        return ingested
     finally:
         db.close()
 
-def _handle_attachments(msg, user: User, db: Session, background_tasks: BackgroundTasks):
-     for part in msg.walk():
-        if part.get_content_maintype() == "multipart" or part.get("Content-Disposition") is None:
-            continue
-
-        filename = part.get_filename()
-        if not filename: continue
-
-        # Decode weird email headers
-        decoded_header = decode_header(filename)[0]
-        if isinstance(decoded_header[0], bytes):
-            filename = decoded_header[0].decode(decoded_header[1] or "utf-8")
-
-        # 1. Sanitize Filename securely
-        safe_filename = re.sub(r'[^a-zA-Z0-9_.-]', '', filename)
-        if not safe_filename: safe_filename = "email_attachment.pdf"
-
-        # 2. Strict Extension Validation
-        if not safe_filename.lower().endswith((".pdf", ".png", ".jpg", ".jpeg")):
-             logger.info(f"Skipping incompatible email attachment: {safe_filename}")
-             continue
-
-        # 3. Read specific bytes into memory
-        file_bytes = part.get_payload(decode=True)
-        if not file_bytes: continue
-        
-        # 3. Size constraints (10 MB MVP Limit)
-        if len(file_bytes) > 10 * 1024 * 1024:
-             logger.warning(f"Email attachment too large: {len(file_bytes)} bytes.")
-             continue
-
-        logger.info(f"Processing valid email attachment: {safe_filename} from {user.email}")
-        
-        # Step A: Real Storage Integration
-        from services.storage_service import save_bytes_to_storage
-        storage_key = save_bytes_to_storage(file_bytes, safe_filename, user.organization_id)
-
-        # Step B: Instantiate new Invoice Stub
-        new_invoice = Invoice(
-            file_url=storage_key,
-            status=InvoiceStatus.PROCESSING,
-            organization_id=user.organization_id,
-            uploaded_by=user.id
-        )
-        db.add(new_invoice)
-        db.commit()
-        db.refresh(new_invoice)
-
-        log_invoice_event(db, new_invoice.id, user.id, "RECEIVED_VIA_EMAIL", f"Ingested secure email attachment: {safe_filename}.")
-
-        # Step B: Automated Receipt Confirmation
-        try:
-            send_status_email(user.email, safe_filename, "RECEIVED")
-        except Exception as e:
-            logger.error(f"Failed to send receipt confirmation to {user.email}: {e}")
-
-        # Step C: Inject into Background Execution
-        if background_tasks:
-            background_tasks.add_task(
-                _process_invoice_background, 
-                new_invoice.id, 
-                file_bytes, 
-                safe_filename, 
-                user.id
-            )
-        else:
-            # Running asynchronously detached from FastAPI Context (e.g., via Scheduler Thread)
-            import threading
-            threading.Thread(target=_process_invoice_background, args=(
-                new_invoice.id, 
-                file_bytes, 
-                safe_filename, 
-                user.id
-            )).start()
-
-def send_status_email(to_email: str, invoice_filename: str, status: str, vendor_name: str = None, reason: str = None):
-    """
-    Sends an automated outbound email notifying the client of an invoice's status change.
-    Uses SMTP_SSL for secure transmission over port 465.
-    """
-    import smtplib
-    from email.mime.text import MIMEText
-    from email.mime.multipart import MIMEMultipart
-    
-    # We fallback to standard generic email settings if dedicated SMTP missing
-    smtp_server = os.getenv("EMAIL_SMTP_SERVER", "smtp.gmail.com")
-    smtp_port = int(os.getenv("EMAIL_SMTP_PORT", 465))
-    sender_email = settings.EMAIL_ADDRESS
-    sender_password = settings.EMAIL_PASSWORD
-
-    if not sender_email or not sender_password:
-        logger.warning(f"Skipping outbound email to {to_email}. Credentials missing.")
-        return
-
-    subject_map = {
-        "RECEIVED": f"📥 Invoice Received: {invoice_filename}",
-        "APPROVED": f"✅ Invoice Approved: {vendor_name or invoice_filename}",
-        "AUTO_APPROVED": f"⚡ Invoice Auto-Approved: {vendor_name or invoice_filename}",
-        "REJECTED": f"❌ Invoice Rejected: {vendor_name or invoice_filename}",
-        "PROCESSING_FAILED": f"⚠️ Processing Failed: {invoice_filename}",
-    }
-
-    subject = subject_map.get(status, f"Update on Invoice: {invoice_filename}")
+def _ingest_attachment(safe_filename: str, file_bytes: bytes, user, db: Session):
+    logger.info(f"Processing valid email attachment: {safe_filename} from {user.email}")
     
-    body = f"Hello,\n\nYour recent invoice '{invoice_filename}' "
-    if vendor_name:
-        body += f"from vendor '{vendor_name}' "
-        
-    if status == "RECEIVED":
-        body += "has been successfully received and is currently being processed by our AI pipeline. You will be notified once a decision is reached."
-    elif status in ("APPROVED", "AUTO_APPROVED"):
-        body += "has been successfully approved and finalized."
-    elif status == "REJECTED":
-        body += f"has been rejected by an administrator.\n\nReason: {reason or 'No reason provided.'}"
-    elif status == "PROCESSING_FAILED":
-        body += "failed to process through our AI pipeline. An administrator has been notified to review the document."
-
-    body += "\n\nYou can view full details by logging into the InvoiceAI Client Dashboard.\n\nBest,\nThe InvoiceAI Team"
-
-    msg = MIMEMultipart()
-    msg['From'] = f"InvoiceAI <{sender_email}>"
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
-
-    try:
-        if smtp_port == 465:
-            with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-                server.login(sender_email, sender_password)
-                server.send_message(msg)
-        else:
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls()
-                server.login(sender_email, sender_password)
-                server.send_message(msg)
-        logger.info(f"Successfully sent {status} email notification to {to_email}")
-    except Exception as e:
-        logger.error(f"Failed to send email to {to_email}: {e}")
+    # Step A: Real Storage Integration
+    from services.storage_service import save_bytes_to_storage
+    storage_key = save_bytes_to_storage(file_bytes, safe_filename, user.organization_id)
+
+    # Step B: Automated receipt confirmation, committed to the outbox together with the invoice stub
+    queue_status_email(db, user.email, safe_filename, "RECEIVED")
+
+    # Step C: Instantiate new Invoice Stub (file hash lets the pipeline skip re-forwarded duplicates)
+    from services.intelligence_service import create_file_hash
+    new_invoice = create_invoice_batch(db, user.organization_id, user.id, [{
+        "r2_key": storage_key,
+        "file_hash": create_file_hash(file_bytes),
+        "events": [("RECEIVED_VIA_EMAIL", f"Ingested secure email attachment: {safe_filename}.")],
+    }])[0]
+
+    # Step D: Queue for processing. The file is already in storage, so the job carries only ids and
+    # a mailbox burst costs queue slots, not memory; a full queue pauses ingestion until it drains.
+    processing_queue.submit(_process_stored_invoice_background, new_invoice.id, user.id)
@@ -0,0 +1,281 @@
+"""
+Invoice Event Bus — pushes invoice status transitions and audit-trail events to
+connected browsers (see the /invoices/stream SSE endpoint) instead of having them poll.
+
+Publishing is automatic: a session listener collects status changes on Invoice rows and
+newly added InvoiceEvent rows during flush and publishes them once the transaction commits,
+so every pipeline path (uploads, email ingestion, admin actions, auto-review) is covered
+and rolled-back work is never announced.
+
+Backends (EVENT_BUS_BACKEND):
+  - "memory":   in-process fan-out; enough for a single worker
+  - "postgres": NOTIFY on publish, one LISTEN connection per worker fans out locally, so
+                events reach subscribers on every worker. Needs a direct (non-pooling) connection.
+"""
+import json
+import select
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import event as sa_event, select as sa_select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import instance_state
+
+from core.config import settings
+from models.all import Invoice, InvoiceEvent
+from services import event_ledger  # noqa: F401 — stamps organization_id on new ledger events
+
+logger = logging.getLogger(__name__)
+
+ALL_ORGANIZATIONS = "*"
+NOTIFY_CHANNEL = "invoice_events"
+_MAX_NOTIFY_MESSAGE_CHARS = 2000  # Postgres caps NOTIFY payloads at 8000 bytes
+
+
+class Subscription:
+    """A bounded per-connection queue fed from any thread; the oldest events are dropped if the client lags."""
+
+    def __init__(self, topic: str, invoice_id: Optional[str] = None, max_pending: int = 100):
+        self.topic = topic
+        self.invoice_id = invoice_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+
+    def deliver(self, payload: dict):
+        if self.invoice_id and payload.get("invoice_id") != self.invoice_id:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, payload)
+        except RuntimeError:
+            pass  # Event loop already closed — the subscriber is gone
+
+    def _put(self, payload: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(payload)
+
+    async def next(self, timeout: float) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessEventBus:
+    def __init__(self):
+        self._subscribers: dict[str, set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _dispatch(self, payload: dict):
+        with self._lock:
+            targets = list(self._subscribers.get(payload.get("organization_id"), ())) + \
+                      list(self._subscribers.get(ALL_ORGANIZATIONS, ()))
+        for subscription in targets:
+            subscription.deliver(payload)
+
+    def publish(self, payload: dict):
+        self._dispatch(payload)
+
+    def stop(self):
+        pass  # Nothing runs in the background
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    @asynccontextmanager
+    async def subscribe(self, organization_id: str, invoice_id: Optional[str] = None):
+        """Yields a Subscription for one org (or ALL_ORGANIZATIONS), optionally narrowed to one invoice."""
+        subscription = Subscription(organization_id, invoice_id)
+        with self._lock:
+            self._subscribers[organization_id].add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscribers[organization_id].discard(subscription)
+                if not self._subscribers[organization_id]:
+                    del self._subscribers[organization_id]
+
+
+class PostgresEventBus(InProcessEventBus):
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def publish(self, payload: dict):
+        if payload.get("message") and len(payload["message"]) > _MAX_NOTIFY_MESSAGE_CHARS:
+            payload = {**payload, "message": payload["message"][:_MAX_NOTIFY_MESSAGE_CHARS] + "…"}
+        # Not dispatched locally: our own LISTEN connection delivers it, exactly once, like on every other worker
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": json.dumps(payload)})
+
+    def start(self):
+        if self._listener and self._listener.is_alive():
+            return
+        self._stopping.clear()
+        self._listener = threading.Thread(target=self._listen_forever, name="event-bus-listener", daemon=True)
+        self._listener.start()
+
+    def stop(self, timeout: float = 10):
+        """Stops the LISTEN thread; it notices within one select() round and drops its connection."""
+        self._stopping.set()
+        if self._listener and self._listener.is_alive():
+            self._listener.join(timeout)
+
+    def _listen_forever(self):
+        backoff = 1
+        while not self._stopping.is_set():
+            raw = None
+            try:
+                raw = self.engine.raw_connection()
+                dbapi_conn = raw.driver_connection
+                dbapi_conn.autocommit = True
+                with dbapi_conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                logger.info(f"Event bus listening on Postgres channel '{NOTIFY_CHANNEL}'")
+                backoff = 1
+                while not self._stopping.is_set():
+                    if select.select([dbapi_conn], [], [], 5) == ([], [], []):
+                        continue
+                    dbapi_conn.poll()
+                    while dbapi_conn.notifies:
+                        notification = dbapi_conn.notifies.pop(0)
+                        try:
+                            self._dispatch(json.loads(notification.payload))
+                        except ValueError:
+                            logger.warning(f"Dropped malformed event bus payload: {notification.payload[:200]}")
+            except Exception as e:
+                logger.error(f"Event bus listener lost its connection: {e}. Reconnecting in {backoff}s")
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.invalidate()  # Never hand a LISTENing connection back to the pool
+                    except Exception:
+                        pass
+
+    @asynccontextmanager
+    async def subscribe(self, organization_id: str, invoice_id: Optional[str] = None):
+        self.start()
+        async with super().subscribe(organization_id, invoice_id) as subscription:
+            yield subscription
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_event_bus() -> InProcessEventBus:
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            if settings.EVENT_BUS_BACKEND == "postgres":
+                from dependencies import engine
+                _bus = PostgresEventBus(engine)
+            else:
+                _bus = InProcessEventBus()
+        return _bus
+
+
+def stop_event_bus():
+    """Called at shutdown; a bus that was never created has nothing to stop."""
+    with _bus_lock:
+        bus = _bus
+    if bus is not None:
+        bus.stop()
+
+
+# ── Automatic publishing from the ORM ─────────────────────────────────────────
+
+def _now_iso() -> str:
+    return datetime.now(tz=timezone.utc).isoformat()
+
+
+@sa_event.listens_for(Session, "after_flush")
+def _collect_invoice_events(session, flush_context):
+    bus = get_event_bus()
+    if not isinstance(bus, PostgresEventBus) and bus.subscriber_count() == 0:
+        return  # Nobody is listening in this process and nothing crosses process boundaries
+    pending = []
+
+    new_objects = set(session.new)
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Invoice):
+            continue
+        state = instance_state(obj)
+        added = state.attrs.status.history.added
+        # New rows usually take the column default, which only lands in the state during flush
+        status = added[0] if added else (state.dict.get("status") if obj in new_objects else None)
+        if status is None:
+            continue
+        pending.append({
+            "type": "status",
+            "invoice_id": obj.id,
+            "organization_id": state.dict.get("organization_id"),
+            "status": status.value if hasattr(status, "value") else str(status),
+            "vendor_name": state.dict.get("vendor_name"),
+            "at": _now_iso(),
+        })
+
+    for obj in session.new:
+        if not isinstance(obj, InvoiceEvent):
+            continue
+        pending.append({
+            "type": "event",
+            "invoice_id": obj.invoice_id,
+            "organization_id": obj.organization_id,  # Stamped in before_flush by services.event_ledger
+            "event_type": obj.event_type,
+            "message": obj.message,
+            "at": _now_iso(),
+        })
+
+    if not pending:
+        return
+
+    # An invoice whose organization_id was expired by an earlier commit isn't in its state dict;
+    # an event logged for it in the same flush already carries it
+    org_by_invoice = {p["invoice_id"]: p["organization_id"] for p in pending if p["type"] == "event" and p["organization_id"]}
+    for payload in pending:
+        if payload["organization_id"] is None:
+            payload["organization_id"] = org_by_invoice.get(payload["invoice_id"])
+    unknown_orgs = {payload["invoice_id"] for payload in pending if payload["organization_id"] is None}
+    if unknown_orgs:
+        # Core select on the flush connection (ORM queries here would try to autoflush)
+        table = Invoice.__table__
+        rows = session.connection().execute(
+            sa_select(table.c.id, table.c.organization_id).where(table.c.id.in_(unknown_orgs))
+        )
+        org_by_invoice = {row.id: row.organization_id for row in rows}
+        for payload in pending:
+            if payload["organization_id"] is None:
+                payload["organization_id"] = org_by_invoice.get(payload["invoice_id"])
+
+    session.info.setdefault("realtime_pending", []).extend(p for p in pending if p["organization_id"])
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_committed_events(session):
+    pending = session.info.pop("realtime_pending", None)
+    if not pending:
+        return
+    bus = get_event_bus()
+    for payload in pending:
+        try:
+            bus.publish(payload)
+        except Exception as e:
+            # Push is best-effort: clients re-sync from the REST endpoints on reconnect
+            logger.warning(f"Event bus publish failed for invoice {payload.get('invoice_id')}: {e}")
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_uncommitted_events(session):
+    session.info.pop("realtime_pending", None)
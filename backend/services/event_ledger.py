@@ -0,0 +1,319 @@
+"""
+Invoice Event Ledger — storage, range reads, retention and bulk export for the append-only
+invoice_events table.
+
+Storage
+  - Postgres: invoice_events is range-partitioned by month on created_at (migration 0006).
+    ensure_partitions() keeps the next EVENT_PARTITION_MONTHS_AHEAD months pre-created and a
+    DEFAULT partition catches anything outside them, so an insert never fails for lack of one.
+  - SQLite/other: one plain table with the same indexes.
+  Rows are only ever inserted. Ids are time-ordered and every row carries its organization_id,
+  so per-invoice timelines and per-org time ranges are both single index range scans.
+
+Retention (EVENT_RETENTION_DAYS)
+  Whole months older than the window are compacted into one gzip'd JSON-lines segment per
+  organization in storage (event-archive/<org>/<YYYY-MM>.<run>.jsonl.gz), then removed — by
+  dropping the month's partition on Postgres, by batched DELETEs elsewhere. A month is only
+  removed after all of its segments were written.
+"""
+import io
+import gzip
+import json
+import base64
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import event as sa_event, func, select, text, tuple_
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from core.config import settings
+from models.all import Invoice, InvoiceEvent
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PREFIX = "event-archive"
+DEFAULT_PARTITION = "invoice_events_default"
+_DELETE_BATCH_SIZE = 5000
+
+
+# ── Organization stamping ─────────────────────────────────────────────────────
+
+@sa_event.listens_for(Session, "before_flush")
+def _stamp_event_organizations(session, flush_context, instances):
+    """Copies organization_id onto new events from their invoice — from memory when it is loaded."""
+    missing = [obj for obj in session.new if isinstance(obj, InvoiceEvent) and obj.organization_id is None]
+    if not missing:
+        return
+
+    pending_invoices = {obj.id: obj for obj in session.new if isinstance(obj, Invoice) and obj.id}
+    unresolved = {}
+    for event in missing:
+        invoice = event.__dict__.get("invoice") or pending_invoices.get(event.invoice_id) \
+            or session.identity_map.get(identity_key(Invoice, event.invoice_id))
+        if invoice is not None and invoice.__dict__.get("organization_id"):
+            event.organization_id = invoice.organization_id
+            if event.invoice_id is None:
+                event.invoice_id = invoice.id
+        elif event.invoice_id:
+            unresolved.setdefault(event.invoice_id, []).append(event)
+
+    if unresolved:
+        # Core select on the session's connection: an ORM query here would try to autoflush
+        table = Invoice.__table__
+        rows = session.connection().execute(
+            select(table.c.id, table.c.organization_id).where(table.c.id.in_(unresolved))
+        )
+        for invoice_id, organization_id in rows:
+            for event in unresolved[invoice_id]:
+                event.organization_id = organization_id
+
+
+# ── Time-range reads ──────────────────────────────────────────────────────────
+# Oldest-first on (created_at, id), continuing after the last event seen, like the invoice listings.
+
+@dataclass(frozen=True)
+class EventQuery:
+    organization_id: Optional[str] = None
+    invoice_id: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    event_types: Tuple[str, ...] = ()
+
+
+def encode_event_cursor(event: InvoiceEvent) -> str:
+    payload = {"id": event.id, "created_at": event.created_at.isoformat() if event.created_at else None}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def _decode_event_cursor(cursor: str) -> Tuple[str, Optional[datetime]]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = datetime.fromisoformat(payload["created_at"]) if payload.get("created_at") else None
+        return str(payload["id"]), created_at
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def _apply_event_query(stmt, query: EventQuery):
+    if query.organization_id:
+        stmt = stmt.where(InvoiceEvent.organization_id == query.organization_id)
+    if query.invoice_id:
+        stmt = stmt.where(InvoiceEvent.invoice_id == query.invoice_id)
+    if query.since:
+        stmt = stmt.where(InvoiceEvent.created_at >= query.since)
+    if query.until:
+        stmt = stmt.where(InvoiceEvent.created_at < query.until)
+    if query.event_types:
+        stmt = stmt.where(InvoiceEvent.event_type.in_(query.event_types))
+    return stmt
+
+
+def list_events(db: Session, query: EventQuery, limit: int, cursor: Optional[str] = None):
+    """One page of ledger events as (events, next_cursor); next_cursor is None on the last page."""
+    stmt = _apply_event_query(select(InvoiceEvent), query)
+    if cursor:
+        cursor_id, cursor_created_at = _decode_event_cursor(cursor)
+        # Compare against the stored timestamp so the cursor survives driver round-trips exactly
+        stored = select(InvoiceEvent.created_at).where(InvoiceEvent.id == cursor_id).scalar_subquery()
+        stmt = stmt.where(tuple_(InvoiceEvent.created_at, InvoiceEvent.id) > tuple_(func.coalesce(stored, cursor_created_at), cursor_id))
+    rows = db.execute(stmt.order_by(InvoiceEvent.created_at, InvoiceEvent.id).limit(limit + 1)).scalars().all()
+    next_cursor = encode_event_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def event_record(event) -> dict:
+    """The JSON shape shared by exports and archive segments."""
+    return {
+        "id": event.id,
+        "invoice_id": event.invoice_id,
+        "organization_id": event.organization_id,
+        "performed_by": event.performed_by,
+        "event_type": event.event_type,
+        "message": event.message,
+        "created_at": event.created_at.isoformat() if event.created_at else None,
+    }
+
+
+def iter_event_export(query: EventQuery, batch_size: Optional[int] = None) -> Iterator[str]:
+    """
+    Newline-delimited JSON for every matching event, read in keyset batches on its own session
+    (a StreamingResponse outlives the request's dependency-scoped session).
+    """
+    from dependencies import SessionLocal
+
+    batch_size = batch_size or settings.EVENT_EXPORT_BATCH_SIZE
+    db = SessionLocal()
+    try:
+        cursor = None
+        while True:
+            events, cursor = list_events(db, query, batch_size, cursor)
+            if events:
+                yield "".join(json.dumps(event_record(e)) + "\n" for e in events)
+            db.expunge_all()  # Keep the identity map from growing with the export
+            if not cursor:
+                break
+    finally:
+        db.close()
+
+
+# ── Monthly partitions (Postgres) ─────────────────────────────────────────────
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"invoice_events_p{month:%Y%m}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('invoice_events'))"
+    )).scalar())
+
+
+def create_month_partition(conn: Connection, month: date):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF invoice_events "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def ensure_partitions(engine: Engine, months_ahead: Optional[int] = None) -> list[str]:
+    """Pre-creates the partitions for this month and the next few. Returns the partitions checked."""
+    if engine.dialect.name != "postgresql":
+        return []
+    months_ahead = settings.EVENT_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    current = month_start(datetime.now(timezone.utc))
+    ensured = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        try:
+            with engine.begin() as conn:
+                if not is_partitioned(conn):
+                    return ensured
+                create_month_partition(conn, month)
+            ensured.append(partition_name(month))
+        except Exception as e:
+            # Typically rows for that month already sit in the DEFAULT partition; they stay queryable there
+            logger.warning(f"Could not create event partition {partition_name(month)}: {e}")
+    return ensured
+
+
+# ── Retention & compaction ────────────────────────────────────────────────────
+
+def _month_bounds(month: date) -> Tuple[datetime, datetime]:
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    end_month = add_months(month, 1)
+    return start, datetime(end_month.year, end_month.month, 1, tzinfo=timezone.utc)
+
+
+def _archive_month(db: Session, month: date, run_stamp: str) -> Tuple[int, list[str]]:
+    """Writes one gzip'd JSON-lines segment per organization for the month. Returns (events, keys)."""
+    from services.storage_service import upload_raw_to_r2
+
+    start, end = _month_bounds(month)
+    rows = db.execute(
+        select(InvoiceEvent)
+        .where(InvoiceEvent.created_at >= start, InvoiceEvent.created_at < end)
+        .order_by(InvoiceEvent.organization_id, InvoiceEvent.created_at, InvoiceEvent.id)
+        .execution_options(yield_per=_DELETE_BATCH_SIZE)
+    ).scalars()
+
+    keys, total = [], 0
+    current_org, buffer, writer = object(), None, None
+
+    def _finish():
+        writer.close()
+        key = f"{ARCHIVE_PREFIX}/{current_org or 'unassigned'}/{month:%Y-%m}.{run_stamp}.jsonl.gz"
+        upload_raw_to_r2(buffer.getvalue(), key, "application/gzip")
+        keys.append(key)
+
+    for event in rows:
+        if event.organization_id != current_org:
+            if writer is not None:
+                _finish()
+            current_org, buffer = event.organization_id, io.BytesIO()
+            writer = gzip.GzipFile(fileobj=buffer, mode="wb")
+        writer.write((json.dumps(event_record(event)) + "\n").encode())
+        total += 1
+    if writer is not None:
+        _finish()
+    db.expunge_all()
+    return total, keys
+
+
+def _remove_month(db: Session, month: date):
+    start, end = _month_bounds(month)
+    bind = db.get_bind()
+    if bind.dialect.name == "postgresql" and is_partitioned(db.connection()):
+        db.execute(text(f"DROP TABLE IF EXISTS {partition_name(month)}"))
+        db.commit()
+    # Rows outside a dedicated partition (DEFAULT partition, or an unpartitioned table) go in batches
+    table = InvoiceEvent.__table__
+    while True:
+        batch = select(table.c.id).where(table.c.created_at >= start, table.c.created_at < end).limit(_DELETE_BATCH_SIZE)
+        deleted = db.execute(table.delete().where(table.c.id.in_(batch))).rowcount
+        db.commit()
+        if deleted < _DELETE_BATCH_SIZE:
+            break
+
+
+def compact_events(db: Session, retention_days: Optional[int] = None, now: Optional[datetime] = None) -> dict:
+    """
+    Archives and removes every whole month older than the retention window.
+    Returns {"months": [...], "events": n, "segments": [...]}; a no-op when retention is 0.
+    """
+    retention_days = settings.EVENT_RETENTION_DAYS if retention_days is None else retention_days
+    summary = {"months": [], "events": 0, "segments": []}
+    if retention_days <= 0:
+        return summary
+
+    now = now or datetime.now(timezone.utc)
+    cutoff_month = month_start(now - timedelta(days=retention_days))
+    cutoff, _ = _month_bounds(cutoff_month)
+    oldest = db.execute(select(func.min(InvoiceEvent.created_at)).where(InvoiceEvent.created_at < cutoff)).scalar()
+    if oldest is None:
+        return summary
+
+    run_stamp = now.strftime("%Y%m%dT%H%M%S")
+    month = month_start(oldest)
+    while month < cutoff_month:
+        count, keys = _archive_month(db, month, run_stamp)
+        if count:
+            _remove_month(db, month)
+            logger.info(f"Compacted {count} ledger events for {month:%Y-%m} into {len(keys)} archive segment(s).")
+            summary["months"].append(f"{month:%Y-%m}")
+            summary["events"] += count
+            summary["segments"].extend(keys)
+        month = add_months(month, 1)
+    return summary
+
+
+def run_event_maintenance():
+    """Scheduled job: keep future partitions in place and apply the retention policy."""
+    from dependencies import SessionLocal, engine
+
+    ensure_partitions(engine)
+    if settings.EVENT_RETENTION_DAYS <= 0:
+        return
+    db = SessionLocal()
+    try:
+        summary = compact_events(db)
+        if summary["events"]:
+            logger.info(f"Event retention archived {summary['events']} events from {', '.join(summary['months'])}.")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Event ledger maintenance failed: {e}")
+    finally:
+        db.close()
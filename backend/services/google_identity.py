@@ -0,0 +1,160 @@
+"""
+Google ID token verification against a cached copy of Google's signing keys (JWKS).
+
+Google rotates its keys every few days and serves them with a Cache-Control max-age of
+several hours, so the login path almost never needs the network:
+
+- keys are fetched once and kept until the max-age (less the Age header) runs out
+- within JWKS_REFRESH_MARGIN_SECONDS of expiry, one background refresh replaces them
+- if a refresh fails after expiry the old keys keep being used until one succeeds
+- a token signed with an unknown `kid` (fresh rotation) triggers an inline refetch, at
+  most once per JWKS_MIN_REFETCH_SECONDS so forged kids can't hammer Google
+
+For offline tests pin a key set with `google_jwks.use_local_keys(jwks)` or GOOGLE_JWKS_FILE;
+nothing is fetched while keys are pinned.
+"""
+import json
+import re
+import time
+import logging
+import threading
+from typing import Callable, Optional
+
+import httpx
+from jose import jwt, JWTError
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+JWKS_DEFAULT_MAX_AGE_SECONDS = 3600  # When Google omits Cache-Control
+JWKS_REFRESH_MARGIN_SECONDS = 300
+JWKS_MIN_REFETCH_SECONDS = 30
+TOKEN_CLOCK_SKEW_SECONDS = 10
+
+
+def _fetch_google_jwks(url: str) -> tuple[dict, float]:
+    """Downloads the key set and returns it with how long it may be cached, in seconds."""
+    response = httpx.get(url, timeout=5.0)
+    response.raise_for_status()
+    max_age = JWKS_DEFAULT_MAX_AGE_SECONDS
+    match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+    if match:
+        max_age = int(match.group(1)) - int(response.headers.get("age", "0") or 0)
+    return response.json(), max(max_age, 0)
+
+
+class JWKSCache:
+    def __init__(self, url: str, fetch: Callable[[str], tuple[dict, float]] = _fetch_google_jwks):
+        self.url = url
+        self._fetch = fetch
+        self._keys: dict[str, dict] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._pinned = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def use_local_keys(self, jwks: dict):
+        """Pins a key set (`{"keys": [...]}`) and stops fetching — for tests and air-gapped setups."""
+        with self._lock:
+            self._keys = {key["kid"]: key for key in jwks.get("keys", [])}
+            self._expires_at = float("inf")
+            self._pinned = True
+
+    def _refresh(self, not_fetched_since: float):
+        # Single flight: callers that queued behind a fetch reuse its result
+        with self._fetch_lock:
+            if self._fetched_at > not_fetched_since or self._pinned:
+                return
+            jwks, max_age = self._fetch(self.url)
+            now = time.monotonic()
+            with self._lock:
+                self._keys = {key["kid"]: key for key in jwks.get("keys", [])}
+                self._fetched_at = now
+                self._expires_at = now + max_age
+            logger.info(f"Fetched {len(self._keys)} Google signing key(s), cached for {int(max_age)}s")
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        started = time.monotonic()
+
+        def run():
+            try:
+                self._refresh(started)
+            except Exception as e:
+                # The current keys stay valid until they expire; the next login retries
+                logger.warning(f"Background Google JWKS refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="google-jwks-refresh", daemon=True).start()
+
+    def prefetch(self):
+        """Loads the keys off the request path (startup)."""
+        if not self._pinned:
+            self._refresh_in_background()
+
+    def get_key(self, kid: Optional[str]) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            key, expires_at, fetched_at = self._keys.get(kid), self._expires_at, self._fetched_at
+        if now >= expires_at:
+            try:
+                self._refresh(fetched_at)
+            except Exception as e:
+                if not fetched_at:
+                    raise
+                # Google keeps retired keys valid well past the max-age; don't fail logins over a blip
+                logger.warning(f"Google JWKS refresh failed, keeping the expired key set: {e}")
+            with self._lock:
+                key = self._keys.get(kid)
+        elif now >= expires_at - JWKS_REFRESH_MARGIN_SECONDS:
+            self._refresh_in_background()
+
+        if key is None and not self._pinned and now - fetched_at >= JWKS_MIN_REFETCH_SECONDS:
+            self._refresh(fetched_at)
+            with self._lock:
+                key = self._keys.get(kid)
+        return key
+
+
+google_jwks = JWKSCache(GOOGLE_JWKS_URL)
+if settings.GOOGLE_JWKS_FILE:
+    with open(settings.GOOGLE_JWKS_FILE) as f:
+        google_jwks.use_local_keys(json.load(f))
+
+
+def verify_google_id_token(token: str, audience: Optional[str] = None) -> dict:
+    """
+    Verifies signature, audience, issuer and expiry of a Google ID token and returns its claims.
+    Raises ValueError on any failure, like google.oauth2.id_token.verify_oauth2_token.
+    """
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except JWTError as e:
+        raise ValueError(f"Malformed token: {e}")
+
+    try:
+        key = google_jwks.get_key(kid)
+    except (httpx.HTTPError, ValueError) as e:
+        raise ValueError(f"Could not load Google signing keys: {e}")
+    if key is None:
+        raise ValueError(f"Token signed with unknown key {kid!r}")
+
+    try:
+        return jwt.decode(
+            token, key, algorithms=["RS256"],
+            audience=audience or settings.GOOGLE_CLIENT_ID, issuer=GOOGLE_ISSUERS,
+            options={"leeway": TOKEN_CLOCK_SKEW_SECONDS, "verify_at_hash": False},
+        )
+    except JWTError as e:
+        raise ValueError(str(e))
@@ -0,0 +1,223 @@
+"""
+IMAP protocol helpers on top of imaplib: FETCH response parsing, BODYSTRUCTURE walking (so only
+invoice attachment parts get downloaded) and IDLE, which imaplib lacks before Python 3.14.
+"""
+import base64
+import imaplib
+import quopri
+import select
+import threading
+import time
+from dataclasses import dataclass
+from email.header import decode_header, make_header
+from email.utils import collapse_rfc2231_value, decode_rfc2231
+from typing import Iterator, Optional
+
+
+class _Paren:
+    def __init__(self, char: str):
+        self.char = char
+
+
+_OPEN, _CLOSE = _Paren("("), _Paren(")")
+
+
+def _tokenize_line(line: bytes) -> Iterator:
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i:i + 1]
+        if c in (b" ", b"\r", b"\n"):
+            i += 1
+        elif c == b"(":
+            yield _OPEN
+            i += 1
+        elif c == b")":
+            yield _CLOSE
+            i += 1
+        elif c == b'"':
+            value, i = bytearray(), i + 1
+            while i < n and line[i:i + 1] != b'"':
+                if line[i:i + 1] == b"\\":
+                    i += 1
+                value += line[i:i + 1]
+                i += 1
+            yield bytes(value)
+            i += 1
+        elif c == b"{":
+            # Literal marker — imaplib hands over the literal itself as the next item
+            i = line.index(b"}", i) + 1
+        else:
+            start = i
+            while i < n and line[i:i + 1] not in (b" ", b"(", b")", b"\r", b"\n"):
+                if line[i:i + 1] == b"[":  # BODY[HEADER.FIELDS (FROM)] is one atom
+                    i = line.index(b"]", i)
+                i += 1
+            atom = line[start:i].decode("ascii", "replace")
+            yield None if atom.upper() == "NIL" else atom
+
+
+def _tokenize(data: list) -> list:
+    tokens = []
+    for item in data:
+        if isinstance(item, tuple):
+            tokens.extend(_tokenize_line(item[0]))
+            tokens.append(item[1])
+        elif isinstance(item, bytes):
+            tokens.extend(_tokenize_line(item))
+    return tokens
+
+
+def _parse(tokens: list, pos: int):
+    token = tokens[pos]
+    if token is _OPEN:
+        items, pos = [], pos + 1
+        while pos < len(tokens) and tokens[pos] is not _CLOSE:
+            value, pos = _parse(tokens, pos)
+            items.append(value)
+        return items, pos + 1
+    return token, pos + 1
+
+
+def parse_fetch_response(data: list) -> dict[str, dict]:
+    """
+    Turns the data of a `UID FETCH` into {uid: {item name: value}} — lists for parenthesized
+    values, bytes for strings and literals, str for atoms and None for NIL.
+    """
+    tokens, pos, messages = _tokenize(data), 0, {}
+    while pos < len(tokens):
+        _, pos = _parse(tokens, pos)  # Message sequence number
+        if pos >= len(tokens) or tokens[pos] is not _OPEN:
+            continue
+        items, pos = _parse(tokens, pos)
+        fields = {str(items[i]).upper(): items[i + 1] for i in range(0, len(items) - 1, 2)}
+        if "UID" in fields:  # Unsolicited FLAGS updates carry no UID
+            messages[str(fields["UID"])] = fields
+    return messages
+
+
+def fetched_section(fields: dict, section: str) -> Optional[bytes]:
+    """The body of `BODY[<section>]` in a parsed FETCH, matching the section name case-insensitively."""
+    prefix = f"BODY[{section}".upper()
+    for name, value in fields.items():
+        if name == prefix + "]" or (section.upper().startswith("HEADER") and name.startswith(prefix)):
+            return value
+    return None
+
+
+# ── BODYSTRUCTURE ─────────────────────────────────────────────────────────────
+
+def _text(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value or ""
+
+
+def _params(value) -> dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    return {_text(value[i]).lower(): _text(value[i + 1]) for i in range(0, len(value) - 1, 2)}
+
+
+@dataclass
+class AttachmentPart:
+    section: str  # IMAP part specifier, e.g. "2" or "1.3"
+    filename: str
+    encoding: str
+    size: int  # Encoded octets, as reported by the server
+
+    @property
+    def estimated_bytes(self) -> int:
+        return self.size * 3 // 4 if self.encoding == "BASE64" else self.size
+
+
+def _leaf_parts(body: list, section: str = "") -> Iterator[tuple[str, list]]:
+    if body and isinstance(body[0], list):  # multipart: children, then the subtype
+        for index, child in enumerate((c for c in body if isinstance(c, list)), start=1):
+            yield from _leaf_parts(child, f"{section}.{index}" if section else str(index))
+        return
+    section = section or "1"
+    if f"{_text(body[0])}/{_text(body[1])}".lower() == "message/rfc822" and len(body) > 8 and isinstance(body[8], list):
+        # Attachments of a forwarded message live under its part number
+        nested = body[8]
+        yield from _leaf_parts(nested, section if nested and isinstance(nested[0], list) else f"{section}.1")
+        return
+    yield section, body
+
+
+def attachment_parts(bodystructure) -> list[AttachmentPart]:
+    """Every leaf part with a Content-Disposition and a filename, like walking the parsed message."""
+    if not isinstance(bodystructure, list):
+        return []
+    parts = []
+    for section, body in _leaf_parts(bodystructure):
+        maintype = _text(body[0]).lower()
+        # Basic fields, then text/* add a line count before the extension data starts
+        extension = 8 if maintype == "text" else 7
+        disposition = body[extension + 1] if len(body) > extension + 1 else None
+        if not isinstance(disposition, list):
+            continue
+        disposition_params = _params(disposition[1] if len(disposition) > 1 else None)
+        filename = disposition_params.get("filename") or _params(body[2]).get("name")
+        if not filename and "filename*" in disposition_params:  # RFC 2231: utf-8''Rechnung%20M%C3%A4rz.pdf
+            filename = collapse_rfc2231_value(tuple(decode_rfc2231(disposition_params["filename*"])))
+        if not filename:
+            continue
+        parts.append(AttachmentPart(
+            section=section,
+            filename=str(make_header(decode_header(filename))),
+            encoding=_text(body[5]).upper(),
+            size=int(body[6] or 0),
+        ))
+    return parts
+
+
+def decode_part(payload: bytes, encoding: str) -> bytes:
+    if encoding == "BASE64":
+        return base64.b64decode(payload)
+    if encoding == "QUOTED-PRINTABLE":
+        return quopri.decodestring(payload)
+    return payload
+
+
+def uid_set(uids) -> str:
+    return ",".join(str(uid) for uid in uids)
+
+
+# ── IDLE (RFC 2177) ───────────────────────────────────────────────────────────
+
+def idle(mail: imaplib.IMAP4, timeout: float, stop: threading.Event) -> bool:
+    """
+    Waits in IDLE until the server reports new mail, `timeout` passes or `stop` is set, then
+    ends IDLE. Returns whether the mailbox changed. Servers drop IDLE after ~30 minutes, so
+    callers re-issue it with a timeout well below that.
+    """
+    tag = mail._new_tag()
+    mail.send(tag + b" IDLE\r\n")
+    line = mail.readline()
+    if not line.startswith(b"+"):
+        mail.tagged_commands.pop(tag, None)
+        raise mail.error(f"IDLE refused: {line!r}")
+
+    changed, deadline = False, time.monotonic() + timeout
+    while not changed and not stop.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        pending = getattr(mail.sock, "pending", None)  # TLS may hold decrypted bytes select() can't see
+        if (pending and pending()) or select.select([mail.sock], [], [], min(remaining, 1.0))[0]:
+            line = mail.readline()
+            if not line:
+                raise mail.abort("Connection closed during IDLE")
+            changed = line.rstrip().upper().endswith((b"EXISTS", b"RECENT"))
+
+    mail.send(b"DONE\r\n")
+    while True:
+        line = mail.readline()
+        if not line:
+            raise mail.abort("Connection closed while ending IDLE")
+        if line.startswith(tag):
+            mail.tagged_commands.pop(tag, None)
+            if not line[len(tag):].strip().upper().startswith(b"OK"):
+                raise mail.error(f"IDLE failed: {line!r}")
+            return changed
+        changed = changed or line.rstrip().upper().endswith(b"EXISTS")
@@ -1,34 +1,90 @@
 import hashlib
 import os
-from sqlalchemy.orm import Session
-from models.all import Invoice
+from typing import Optional
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session, aliased
+from models.all import Invoice, InvoiceStatus
+
+# vendor_name of a spreadsheet tracker whose import failed; it stays UNDER_REVIEW so the columns
+# can be confirmed and the file re-imported, but it never counts as an original
+FAILED_SPREADSHEET_PREFIX = "Failed Spreadsheet: "
 
 def create_text_hash(raw_text: str) -> str:
     """Consistently hashes OCR string outputs to find byte-for-byte exact duplicate documents."""
     return hashlib.sha256(raw_text.encode('utf-8')).hexdigest()
 
-def check_for_duplications(db: Session, org_id: str, text_hash: str, vendor_name: str, invoice_number: str, total_amount: float) -> bool:
+def create_file_hash(file_bytes: bytes) -> str:
+    """SHA256 of the raw uploaded bytes — identical files hash identically before any OCR runs."""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def find_exact_file_duplicate(db: Session, invoice: Invoice) -> Optional[Invoice]:
+    """
+    Returns the earliest invoice in the same organization with an identical file hash.
+    Only invoices created before this one count as originals, so two identical files
+    racing through the pipeline can never flag each other. Failed runs (including failed
+    spreadsheet imports) and other duplicates are ignored so a retry after a failure
+    processes normally.
+    Served by the (organization_id, file_hash) index.
+    """
+    if not invoice.file_hash:
+        return None
+
+    return db.query(Invoice).filter(
+        Invoice.organization_id == invoice.organization_id,
+        Invoice.file_hash == invoice.file_hash,
+        Invoice.id != invoice.id,
+        Invoice.status.notin_([InvoiceStatus.PROCESSING_FAILED, InvoiceStatus.DUPLICATE]),
+        or_(Invoice.vendor_name.is_(None), ~Invoice.vendor_name.startswith(FAILED_SPREADSHEET_PREFIX, autoescape=True)),
+        uploaded_before(db, invoice.id),
+    ).order_by(Invoice.created_at.asc()).first()
+
+def uploaded_before(db: Session, invoice_id: str):
+    """
+    Filter clause: `Invoice` rows uploaded before the given invoice. Compares against the
+    reference row's own created_at in SQL, so both sides share the database's timestamp
+    representation. On a timestamp tie (same-second uploads on SQLite) a row that already
+    left PROCESSING counts as earlier; two rows still processing are ordered by id so they
+    can never both claim to be the original.
+    """
+    reference = aliased(Invoice)
+    reference_created_at = db.query(reference.created_at).filter(reference.id == invoice_id).scalar_subquery()
+    return or_(
+        Invoice.created_at < reference_created_at,
+        and_(
+            Invoice.created_at == reference_created_at,
+            or_(Invoice.status != InvoiceStatus.PROCESSING, Invoice.id < invoice_id),
+        ),
+    )
+
+def check_for_duplications(db: Session, org_id: str, text_hash: str, vendor_name: str, invoice_number: str, total_amount: float,
+                           exclude_invoice_id: Optional[str] = None) -> bool:
     """
     Scans the specific organization for identical invoices.
     Triggers true if the exact text hash matches OR if the logical triplicate (vendor + number + amount) matches.
+    `exclude_invoice_id` keeps a reprocessed invoice from matching its own previous run.
+    Near-duplicate re-scans are handled separately by near_duplicate_service.
     """
     # 1. Check exact OCR byte matches
     if text_hash:
-        match_hash = db.query(Invoice).filter(
+        query = db.query(Invoice.id).filter(
             Invoice.organization_id == org_id,
             Invoice.text_hash == text_hash
-        ).first()
-        if match_hash: return True
+        )
+        if exclude_invoice_id:
+            query = query.filter(Invoice.id != exclude_invoice_id)
+        if query.first(): return True
 
     # 2. Check Logical triplet matches (In case OCR reads slightly different pixels but extracts same data)
     if vendor_name and invoice_number and total_amount:
-        match_logic = db.query(Invoice).filter(
+        query = db.query(Invoice.id).filter(
             Invoice.organization_id == org_id,
             Invoice.vendor_name == vendor_name,
             Invoice.invoice_number == invoice_number,
             Invoice.total_amount == total_amount
-        ).first()
-        if match_logic: return True
+        )
+        if exclude_invoice_id:
+            query = query.filter(Invoice.id != exclude_invoice_id)
+        if query.first(): return True
 
     return False
 
@@ -1,5 +1,11 @@
-from sqlalchemy.orm import Session, defer
-from fastapi import UploadFile, HTTPException, BackgroundTasks
+from sqlalchemy import func, text, tuple_
+from sqlalchemy.orm import Session, aliased, defer, joinedload, selectinload
+from fastapi import UploadFile, HTTPException
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+import base64
+import json
 import logging
 import re
 import time
@@ -9,40 +15,53 @@ import concurrent.futures
 global_processing_lock = threading.Lock()
 
 from dependencies import SessionLocal
+from core.config import settings
 from models.all import Invoice, InvoiceEvent, InvoiceStatus
-from services.storage_service import generate_r2_key, upload_raw_to_r2
+from services import event_ledger  # noqa: F401 — stamps organization_id on new ledger events
+from services.storage_service import generate_r2_key, upload_raw_to_r2, get_file_from_storage
 from services.ocr_service import extract_text_from_file
 from services.llm_service import extract_invoice_data_with_llm
 from services.validation_service import validate_and_score
+from services.processing_queue import Reservation
 
 logger = logging.getLogger(__name__)
 
+ALLOWED_UPLOAD_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg", ".csv", ".xlsx", ".xls")
+ALLOWED_UPLOAD_MIMES = [
+    "application/pdf", "image/png", "image/jpeg",
+    "text/csv", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.ms-excel"
+]
+SPREADSHEET_EXTENSIONS = (".csv", ".xlsx", ".xls")
+
+def sanitize_upload_filename(filename: str) -> str:
+    """Strips everything but [a-zA-Z0-9_.-] from a client-supplied filename."""
+    return re.sub(r'[^a-zA-Z0-9_.-]', '', filename or "") or "unnamed_invoice.pdf"
+
 async def create_invoice_with_background_processing(
     db: Session, 
     file: UploadFile, 
     org_id: str, 
     user_id: str, 
-    background_tasks: BackgroundTasks
+    slots: Reservation
 ) -> Invoice:
     # 1. Sanitize Filename securely
-    safe_filename = re.sub(r'[^a-zA-Z0-9_.-]', '', file.filename)
-    if not safe_filename:
-        safe_filename = "unnamed_invoice.pdf"
+    safe_filename = sanitize_upload_filename(file.filename)
 
     # 2. Strict Extension & MIME Validation
-    valid_extensions = (".pdf", ".png", ".jpg", ".jpeg", ".csv", ".xlsx", ".xls")
-    valid_mimes = [
-        "application/pdf", "image/png", "image/jpeg", 
-        "text/csv", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", 
-        "application/vnd.ms-excel"
-    ]
-    if not safe_filename.lower().endswith(valid_extensions) or file.content_type not in valid_mimes:
+    if not safe_filename.lower().endswith(ALLOWED_UPLOAD_EXTENSIONS) or file.content_type not in ALLOWED_UPLOAD_MIMES:
         raise HTTPException(status_code=400, detail="Invalid file format. PDFs, Images, and Spreadsheets only.")
     
-    # 3. Size constraints (10 MB MVP Limit)
-    if file.size and file.size > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large. Maximum size is 10MB.")
-        
+    # 3. Size constraints (single-shot uploads are buffered in RAM — larger files use /multipart-upload)
+    if file.size and file.size > settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE_MB}MB — use the multipart upload for larger documents."
+        )
+
+    # 4. A queue slot before anything is read or stored (503 while processing is at capacity)
+    slots.reserve()
+
     try:
         # Step 1: Read file bytes FAST (already in RAM — no network call)
         file_bytes = await file.read()
@@ -52,24 +71,21 @@ async def create_invoice_with_background_processing(
         r2_key = generate_r2_key(org_id, safe_filename)
         
         # Step 3: Initialize DB Processing Ticket immediately
-        new_invoice = Invoice(
-            file_url=r2_key,          # Key is known now; upload happens in background
-            status=InvoiceStatus.PROCESSING,
-            organization_id=org_id,
-            uploaded_by=user_id
-        )
-        db.add(new_invoice)
-        db.commit()
-        db.refresh(new_invoice)
-        
-        # Initial Logging
-        log_invoice_event(db, new_invoice.id, user_id, "UPLOADED", f"Invoice file {safe_filename} received.")
-        log_invoice_event(db, new_invoice.id, user_id, "PROCESSING_QUEUED", "R2 upload + OCR extraction queued in background.")
+        from services.intelligence_service import create_file_hash
+        # Key is known now; upload happens in background. The ticket and its initial ledger events share one commit.
+        new_invoice = create_invoice_batch(db, org_id, user_id, [{
+            "r2_key": r2_key,
+            "file_hash": create_file_hash(file_bytes),
+            "events": [
+                ("UPLOADED", f"Invoice file {safe_filename} received."),
+                ("PROCESSING_QUEUED", "R2 upload + OCR extraction queued in background."),
+            ],
+        }])[0]
         
-        # Step 4: Trigger background task (R2 upload + OCR + LLM all happen AFTER response)
+        # Step 4: Queue the job on the reserved slot (R2 upload + OCR + LLM all happen in the worker)
         if safe_filename.lower().endswith((".csv", ".xlsx", ".xls")):
             from services.spreadsheet_service import process_spreadsheet_background
-            background_tasks.add_task(
+            slots.submit(
                 process_spreadsheet_background,
                 new_invoice.id,
                 file_bytes,
@@ -79,7 +95,7 @@ async def create_invoice_with_background_processing(
                 content_type,
             )
         else:
-            background_tasks.add_task(
+            slots.submit(
                 _process_invoice_background, 
                 new_invoice.id, 
                 file_bytes, 
@@ -95,6 +111,34 @@ async def create_invoice_with_background_processing(
         logger.error(f"Upload flow failed: {fatal_e}")
         raise HTTPException(status_code=500, detail="Failed to initiate document upload.")
 
+def create_invoice_batch(db: Session, org_id: str, user_id: str, uploads: list[dict]) -> list[Invoice]:
+    """
+    Inserts one PROCESSING invoice per upload plus its initial ledger events in a single transaction.
+    Each upload dict carries `r2_key`, `events` — a list of (event_type, message) tuples — and optionally `file_hash`.
+    IDs are generated client-side so the events can reference their invoice without an intermediate flush.
+    """
+    import uuid
+    invoices = []
+    for upload in uploads:
+        invoice = Invoice(
+            id=str(uuid.uuid4()),
+            file_url=upload["r2_key"],
+            status=InvoiceStatus.PROCESSING,
+            organization_id=org_id,
+            uploaded_by=user_id,
+            file_hash=upload.get("file_hash"),
+        )
+        invoice.events = [
+            InvoiceEvent(invoice_id=invoice.id, performed_by=user_id, event_type=event_type, message=message,
+                         created_at=datetime.now(timezone.utc))
+            for event_type, message in upload["events"]
+        ]
+        invoices.append(invoice)
+
+    db.add_all(invoices)
+    db.commit()
+    return invoices
+
 def _process_invoice_background(invoice_id: str, file_bytes: bytes, filename: str, user_id: str,
                                  r2_key: str = "", content_type: str = "application/octet-stream"):
     """
@@ -102,12 +146,17 @@ def _process_invoice_background(invoice_id: str, file_bytes: bytes, filename: st
     Performs R2 upload FIRST (non-blocking, after HTTP response already sent), then OCR + LLM.
     """
     db = SessionLocal()
+    events = EventRecorder(db, invoice_id, user_id)
+    _start_time = time.monotonic()
+    invoice = None
     try:
         # Rehydrate the invoice locally
-        invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+        invoice = db.query(Invoice).options(joinedload(Invoice.uploaded_by_user)).filter(Invoice.id == invoice_id).first()
         if not invoice:
             logger.error(f"Background Process Misfire: Invoice {invoice_id} missing from DB.")
             return
+        # Read now: every commit below expires the loaded graph, and a later access would re-query it
+        uploader_email = invoice.uploaded_by_user.email if invoice.uploaded_by_user else None
 
         # Step 0: Upload to R2 NOW (HTTP response already returned — no timeout risk)
         if r2_key:
@@ -118,18 +167,27 @@ def _process_invoice_background(invoice_id: str, file_bytes: bytes, filename: st
                 logger.error(f"R2 upload failed for {invoice_id}: {r2_err}")
                 # Continue processing — OCR can still run even if R2 upload fails
 
-        log_invoice_event(db, invoice.id, user_id, "PROCESSING_STARTED", "Acquiring lock for sequential OCR extraction.")
-        
-        # Enforce sequential processing queue (1 by 1)
-        with global_processing_lock:
-            log_invoice_event(db, invoice.id, user_id, "PROCESSING_ACTIVE", "Lock acquired. Executing AI extraction pipeline.")
+        # Step 0.5: Exact re-uploads never reach OCR or the LLM
+        if _short_circuit_exact_duplicate(db, invoice, file_bytes, user_id, events):
+            return
+
+        events.record("PROCESSING_STARTED", "Acquiring lock for sequential OCR extraction.")
+
+        # Enforce sequential processing queue (1 by 1). Only a contended lock is worth an extra
+        # commit to show the invoice as waiting; otherwise STARTED lands together with ACTIVE.
+        if not global_processing_lock.acquire(blocking=False):
+            events.flush()
+            global_processing_lock.acquire()
+        try:
+            events.record("PROCESSING_ACTIVE", "Lock acquired. Executing AI extraction pipeline.")
+            events.flush()  # Visible while the (long) extraction runs
             _start_time = time.monotonic()
             
             try:
                 # 3-Minute Hard Limit for the entire AI pipeline
                 with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
                     future = executor.submit(
-                        _run_extraction_pipeline, db, invoice, file_bytes, filename, user_id, _start_time
+                        _run_extraction_pipeline, db, invoice, file_bytes, filename, user_id, _start_time, events, uploader_email
                     )
                     future.result(timeout=180) # 180 seconds = 3 minutes maximum
                     
@@ -137,36 +195,102 @@ def _process_invoice_background(invoice_id: str, file_bytes: bytes, filename: st
                 logger.error(f"FATAL: AI Extraction timed out after 3 minutes for Invoice {invoice.id}")
                 invoice.status = InvoiceStatus.PROCESSING_FAILED
                 invoice.processing_time_seconds = round(time.monotonic() - _start_time, 2)
-                db.commit()
-                log_invoice_event(db, invoice.id, user_id, "PROCESSING_FAILED", "Extraction exceeded the 3-minute max time limit. Process aborted to unblock queue.")
+                events.record("PROCESSING_FAILED", "Extraction exceeded the 3-minute max time limit. Process aborted to unblock queue.")
+                events.flush()
                 return
-
-        # Commit final state changes from the pipeline if successful
-        db.commit()
+        finally:
+            global_processing_lock.release()
 
     except Exception as proc_e:
-        logger.error(f"Background Processing failed for Invoice {invoice.id}: {proc_e}")
+        logger.error(f"Background Processing failed for Invoice {invoice_id}: {proc_e}")
+        if invoice is None:
+            return
+        # Discard the half-applied pipeline writes but keep the buffered ledger entries
+        events.rollback()
         invoice.status = InvoiceStatus.PROCESSING_FAILED
         invoice.processing_time_seconds = round(time.monotonic() - _start_time, 2)
-        db.commit()
-        log_invoice_event(db, invoice.id, user_id, "PROCESSING_FAILED", f"Critical AI Fault -> Manual check required. Error: {str(proc_e)}")
+        events.record("PROCESSING_FAILED", f"Critical AI Fault -> Manual check required. Error: {str(proc_e)}")
+        events.flush()
         
     finally:
         db.close()
 
 
-def _run_extraction_pipeline(db, invoice, file_bytes, filename, user_id, start_time):
+def _short_circuit_exact_duplicate(db: Session, invoice: Invoice, file_bytes: bytes, user_id: str,
+                                   events: Optional["EventRecorder"] = None) -> bool:
+    """
+    Byte-level duplicate gate run before any OCR. Fills in the file hash if ingestion
+    didn't, and if an earlier invoice in the org has the same bytes, parks this one in
+    DUPLICATE with a link to the original. Returns True when the pipeline should stop.
+    """
+    from services.intelligence_service import create_file_hash, find_exact_file_duplicate
+
+    if not invoice.file_hash:
+        invoice.file_hash = create_file_hash(file_bytes)  # Committed with the next pipeline write
+
+    original = find_exact_file_duplicate(db, invoice)
+    if not original:
+        return False
+
+    invoice.status = InvoiceStatus.DUPLICATE
+    invoice.duplicate_flag = True
+    invoice.duplicate_of = original.id
+    invoice.processing_time_seconds = 0.0
+    events = events or EventRecorder(db, invoice.id, user_id)
+    events.record("DUPLICATE_DETECTED", f"File is byte-identical to invoice {original.id}. OCR and LLM extraction skipped.")
+    events.flush()
+    logger.info(f"Invoice {invoice.id} short-circuited as exact duplicate of {original.id}.")
+    return True
+
+def _process_stored_invoice_background(invoice_id: str, user_id: str):
+    """
+    Background worker for documents that are already sitting in storage (multipart uploads).
+    The bytes are only fetched here, inside the worker, so the API request never buffers them.
+    """
+    db = SessionLocal()
+    try:
+        invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+        if not invoice or not invoice.file_url:
+            logger.error(f"Stored Process Misfire: Invoice {invoice_id} missing or has no file.")
+            return
+        s3_key = invoice.file_url
+        try:
+            file_bytes, _ = get_file_from_storage(s3_key)
+        except Exception as fetch_e:
+            logger.error(f"Could not fetch stored file for Invoice {invoice_id}: {fetch_e}")
+            invoice.status = InvoiceStatus.PROCESSING_FAILED
+            log_invoice_event(db, invoice.id, user_id, "PROCESSING_FAILED", "Uploaded file could not be read back from storage.")
+            return
+    finally:
+        db.close()
+
+    filename = s3_key.split("/")[-1]
+    if filename.lower().endswith((".csv", ".xlsx", ".xls")):
+        from services.spreadsheet_service import process_spreadsheet_background
+        process_spreadsheet_background(invoice_id, file_bytes, filename, user_id)
+    else:
+        _process_invoice_background(invoice_id, file_bytes, filename, user_id)
+
+
+def _run_extraction_pipeline(db, invoice, file_bytes, filename, user_id, start_time, events=None, uploader_email=None):
     """
     The actual core OCR and LLM logic. Isolated here so it can be 
     easily wrapped in a ThreadPoolExecutor for strict timeouts.
+    Ledger events are buffered and committed together with the final invoice state.
     """
+    events = events or EventRecorder(db, invoice.id, user_id)
     # Step 1: OCR Pipeline
     raw_text = extract_text_from_file(file_bytes, filename)
+
+    # Step 2: Intelligence & Hashing prep (near-duplicate signatures use the real OCR text, never the blank placeholder)
+    from services.intelligence_service import create_text_hash, check_for_duplications, calculate_fraud_signals
+    from services.near_duplicate_service import compute_text_minhash, compute_image_hash, find_near_duplicates, index_invoice_fingerprint
+    text_minhash = compute_text_minhash(raw_text)
+    image_hash = compute_image_hash(file_bytes, filename)
+
     if not raw_text or not raw_text.strip():
         raw_text = "[Blank Document Detected or OCR Failed]"
 
-    # Step 2: Intelligence & Hashing prep
-    from services.intelligence_service import create_text_hash, check_for_duplications, calculate_fraud_signals
     ocr_hash = create_text_hash(raw_text)
     invoice.text_hash = ocr_hash
 
@@ -195,8 +319,15 @@ def _run_extraction_pipeline(db, invoice, file_bytes, filename, user_id, start_t
         ocr_hash, 
         invoice.vendor_name, 
         invoice.invoice_number, 
-        invoice.total_amount
+        invoice.total_amount,
+        exclude_invoice_id=invoice.id,
     )
+    near_matches = find_near_duplicates(
+        db, invoice.organization_id, text_minhash, image_hash,
+        reference_invoice_id=invoice.id, limit=1
+    )
+    near_match = near_matches[0] if near_matches and near_matches[0].similarity >= settings.NEAR_DUPLICATE_THRESHOLD else None
+    index_invoice_fingerprint(db, invoice, text_minhash, image_hash)
     is_fraud, fraud_score, fraud_reasons = calculate_fraud_signals(
         invoice.organization_id, 
         score, 
@@ -206,14 +337,22 @@ def _run_extraction_pipeline(db, invoice, file_bytes, filename, user_id, start_t
     # Apply Flags
     if is_dupe:
         invoice.duplicate_flag = True
-        log_invoice_event(db, invoice.id, user_id, "DUPLICATE_DETECTED", "Duplicate traits found against existing organization records.")
+        events.record("DUPLICATE_DETECTED", "Duplicate traits found against existing organization records.")
         flags.append("System matched this document to an existing record.")
 
+    if near_match and not is_dupe:
+        is_dupe = True
+        invoice.duplicate_flag = True
+        invoice.duplicate_of = near_match.invoice_id
+        events.record("NEAR_DUPLICATE_DETECTED",
+            f"Re-scan suspected: {near_match.similarity * 100:.1f}% similar to invoice {near_match.invoice_id}.")
+        flags.append(f"Document is {near_match.similarity * 100:.1f}% similar to an existing record.")
+
     if is_fraud:
         invoice.fraud_flag = True
         invoice.fraud_score = fraud_score
         f_reasons_str = "; ".join(fraud_reasons)
-        log_invoice_event(db, invoice.id, user_id, "FRAUD_SIGNAL", f"Automated heuristics triggered: {f_reasons_str}")
+        events.record("FRAUD_SIGNAL", f"Automated heuristics triggered: {f_reasons_str}")
         flags.extend(fraud_reasons)
 
     # Step 7: Policy Engine — per-org configurable approval rules
@@ -233,7 +372,7 @@ def _run_extraction_pipeline(db, invoice, file_bytes, filename, user_id, start_t
     log_message = "Background processing completed successfully."
 
     if escalate:
-        log_invoice_event(db, invoice.id, user_id, "HIGH_VALUE_ESCALATION",
+        events.record("HIGH_VALUE_ESCALATION",
             f"Invoice amount ${invoice.total_amount:,.2f} exceeds escalation threshold — requires senior review.")
 
     if final_status == InvoiceStatus.UNDER_REVIEW:
@@ -243,56 +382,95 @@ def _run_extraction_pipeline(db, invoice, file_bytes, filename, user_id, start_t
         # --- AI AUTO REVIEW PIPELINE ---
         if getattr(policy, 'ai_auto_review_enabled', False):
             from services.ai_auditor_service import perform_ai_auto_review
-            log_invoice_event(db, invoice.id, user_id, "AI_AUDIT_STARTED", "Autonomous AI Auditor began secondary review.")
-            db.commit() # Flush so state is tracked before heavy LLM call
+            events.record("AI_AUDIT_STARTED", "Autonomous AI Auditor began secondary review.")
+            events.flush() # Flush so state is tracked before heavy LLM call
             
             new_status, ai_reason, needs_alert = perform_ai_auto_review(db, invoice, raw_text, user_id)
             invoice.status = new_status
             
-            # Optional: Import email service
-            from services.email_service import send_status_email
+            # Status emails go to the outbox and are committed with the events below
+            from services.notification_service import queue_status_email
             
             doc_name = invoice.file_url.split("/")[-1] if invoice.file_url else "Unknown Document"
-            client_email = invoice.uploaded_by_user.email if invoice.uploaded_by_user else None
+            client_email = uploader_email
 
             if new_status == InvoiceStatus.APPROVED:
-                log_invoice_event(db, invoice.id, user_id, "AUTO_APPROVED", f"AI Auditor Override: {ai_reason}")
+                events.record("AUTO_APPROVED", f"AI Auditor Override: {ai_reason}")
                 if client_email:
-                    send_status_email(client_email, doc_name, "AUTO_APPROVED", invoice.vendor_name)
+                    queue_status_email(db, client_email, doc_name, "AUTO_APPROVED", invoice.vendor_name)
             
             elif new_status == InvoiceStatus.REJECTED:
-                log_invoice_event(db, invoice.id, user_id, "REJECTED", f"AI Auditor Rejected: {ai_reason}")
+                events.record("REJECTED", f"AI Auditor Rejected: {ai_reason}")
                 if client_email:
-                    send_status_email(client_email, doc_name, "REJECTED", invoice.vendor_name, ai_reason)
+                    queue_status_email(db, client_email, doc_name, "REJECTED", invoice.vendor_name, ai_reason)
                     
             else:
-                log_invoice_event(db, invoice.id, user_id, "AI_AUDIT_COMPLETED", f"AI Auditor Uncertain -> Needs Human Review: {ai_reason}")
+                events.record("AI_AUDIT_COMPLETED", f"AI Auditor Uncertain -> Needs Human Review: {ai_reason}")
 
     else:
         log_message += " Policy conditions satisfied → AUTO_APPROVED."
         # Since AI wasn't needed and it auto-approved, alert client
-        if invoice.uploaded_by_user and invoice.uploaded_by_user.email:
-            from services.email_service import send_status_email
+        if uploader_email:
+            from services.notification_service import queue_status_email
             doc_name = invoice.file_url.split("/")[-1] if invoice.file_url else "Unknown Document"
-            send_status_email(invoice.uploaded_by_user.email, doc_name, "AUTO_APPROVED", invoice.vendor_name)
+            queue_status_email(db, uploader_email, doc_name, "AUTO_APPROVED", invoice.vendor_name)
 
     invoice.processing_time_seconds = round(time.monotonic() - start_time, 2)
-    db.commit()
-    log_invoice_event(db, invoice.id, user_id, "PROCESSING_COMPLETED", log_message)
+    events.record("PROCESSING_COMPLETED", log_message)
+    events.flush()
 
-def log_invoice_event(db: Session, invoice_id: str, user_id: str, event_type: str, message: str = None) -> InvoiceEvent:
+def log_invoice_event(db: Session, invoice_id: str, user_id: str, event_type: str, message: str = None,
+                      commit: bool = True) -> InvoiceEvent:
+    """
+    Appends one ledger event. With commit=True (the default) the event is committed together with
+    whatever else is pending on the session — set the invoice state first, then log, for one commit.
+    """
     event = InvoiceEvent(
         invoice_id=invoice_id,
         performed_by=user_id,
         event_type=event_type,
-        message=message
+        message=message,
+        created_at=datetime.now(timezone.utc),
     )
     db.add(event)
-    db.commit()
-    db.commit()
+    if commit:
+        db.commit()
     return event
 
 
+class EventRecorder:
+    """
+    Buffers the ledger events of one pipeline run so they are written in the same transaction
+    as the invoice state change they describe, instead of one commit per event.
+
+    record() only stages the event on the session (stamped with the time it happened, so the
+    timeline keeps its order); it is written by the next commit on that session — flush() or any
+    other. Call flush() for events the user must see immediately, e.g. before a long OCR/LLM step.
+    """
+
+    def __init__(self, db: Session, invoice_id: str, user_id: str):
+        self.db = db
+        self.invoice_id = invoice_id
+        self.user_id = user_id
+        self._pending: list[InvoiceEvent] = []
+
+    def record(self, event_type: str, message: str = None) -> InvoiceEvent:
+        event = log_invoice_event(self.db, self.invoice_id, self.user_id, event_type, message, commit=False)
+        self._pending.append(event)
+        return event
+
+    def flush(self):
+        """Commits the buffered events along with every other pending change on the session."""
+        self.db.commit()
+        self._pending.clear()
+
+    def rollback(self):
+        """Rolls the session back but re-stages the buffered events, so a failed run keeps its trail."""
+        self.db.rollback()
+        for event in self._pending:
+            self.db.add(event)
+
+
 def _process_auto_review_batch(admin_id: str):
     """
     Background worker that sweeps ALL globally `UNDER_REVIEW` invoices
@@ -300,13 +478,20 @@ def _process_auto_review_batch(admin_id: str):
     """
     db = SessionLocal()
     try:
-        invoices = db.query(Invoice).filter(Invoice.status == InvoiceStatus.UNDER_REVIEW).all()
+        invoices = (
+            db.query(Invoice)
+            .options(joinedload(Invoice.uploaded_by_user))
+            .filter(Invoice.status == InvoiceStatus.UNDER_REVIEW)
+            .all()
+        )
         if not invoices:
             return
+        # Captured before the per-invoice commits expire the loaded users (one query, not one per invoice)
+        uploader_emails = {inv.id: inv.uploaded_by_user.email for inv in invoices if inv.uploaded_by_user}
 
         from services.storage_service import get_file_from_storage
         from services.ocr_service import extract_text_from_file
-        from services.email_service import send_status_email
+        from services.notification_service import queue_status_email
         from services.ai_auditor_service import perform_ai_auto_review
         from core.config import settings
 
@@ -338,31 +523,32 @@ def _process_auto_review_batch(admin_id: str):
                     except Exception as e:
                         logger.warning(f"Skipping OCR for batch {invoice.id} due to storage/parse err: {e}")
 
-                log_invoice_event(db, invoice.id, admin_id, "AI_AUDIT_STARTED", "Admin explicitly triggered batch global Auto-Pilot review.")
-                db.commit()
+                events = EventRecorder(db, invoice.id, admin_id)
+                events.record("AI_AUDIT_STARTED", "Admin explicitly triggered batch global Auto-Pilot review.")
+                events.flush()
 
                 # 2. Trigger the Groq AI Auditor
                 new_status, ai_reason, needs_alert = perform_ai_auto_review(db, invoice, raw_text, admin_id)
                 invoice.status = new_status
 
                 # 3. Handle Emails and Logging
-                client_email = invoice.uploaded_by_user.email if invoice.uploaded_by_user else None
+                client_email = uploader_emails.get(invoice.id)
 
                 if new_status == InvoiceStatus.APPROVED:
-                    log_invoice_event(db, invoice.id, admin_id, "AUTO_APPROVED", f"Auto-Pilot Batch Sweep Override: {ai_reason}")
+                    events.record("AUTO_APPROVED", f"Auto-Pilot Batch Sweep Override: {ai_reason}")
                     if client_email:
-                        send_status_email(client_email, filename, "AUTO_APPROVED", invoice.vendor_name)
+                        queue_status_email(db, client_email, filename, "AUTO_APPROVED", invoice.vendor_name)
                         
                 elif new_status == InvoiceStatus.REJECTED:
-                    log_invoice_event(db, invoice.id, admin_id, "REJECTED", f"Auto-Pilot Batch Sweep Rejected: {ai_reason}")
+                    events.record("REJECTED", f"Auto-Pilot Batch Sweep Rejected: {ai_reason}")
                     if client_email:
-                        send_status_email(client_email, filename, "REJECTED", invoice.vendor_name, ai_reason)
+                        queue_status_email(db, client_email, filename, "REJECTED", invoice.vendor_name, ai_reason)
                         
                     # Notification sent securely only to account holder.
                 else:
-                    log_invoice_event(db, invoice.id, admin_id, "AI_AUDIT_COMPLETED", f"Auto-Pilot Batch sweep Uncertain -> Retained Human Review: {ai_reason}")
+                    events.record("AI_AUDIT_COMPLETED", f"Auto-Pilot Batch sweep Uncertain -> Retained Human Review: {ai_reason}")
 
-                db.commit()
+                events.flush()
 
             except Exception as item_e:
                 logger.error(f"Failed to auto-process invoice {invoice.id} during batch: {item_e}")
@@ -372,40 +558,160 @@ def _process_auto_review_batch(admin_id: str):
         logger.error(f"Global Batch Auto Review Sweep failed: {e}")
     finally:
         db.close()
-def get_client_invoices(db: Session, org_id: str):
-    return db.query(Invoice).options(defer(Invoice.extracted_json)).filter(Invoice.organization_id == org_id).all()
+# ── Invoice Listing (keyset pagination) ───────────────────────────────────────
+# Pages are ordered newest-first on (created_at, id) and continue from the last row seen,
+# so page N costs the same index range scan as page 1 regardless of table size.
+
+@dataclass(frozen=True)
+class InvoiceListFilters:
+    organization_id: Optional[str] = None
+    statuses: Tuple[InvoiceStatus, ...] = ()
+    vendor: Optional[str] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+
+def encode_invoice_cursor(invoice: Invoice) -> str:
+    payload = json.dumps({"id": invoice.id, "created_at": invoice.created_at.isoformat() if invoice.created_at else None})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _decode_invoice_cursor(cursor: str) -> Tuple[str, Optional[datetime]]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        created_at = datetime.fromisoformat(payload["created_at"]) if payload.get("created_at") else None
+        return str(payload["id"]), created_at
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def _apply_invoice_filters(query, filters: InvoiceListFilters):
+    if filters.organization_id:
+        query = query.filter(Invoice.organization_id == filters.organization_id)
+    if filters.statuses:
+        query = query.filter(Invoice.status.in_(filters.statuses))
+    if filters.vendor:
+        query = query.filter(Invoice.vendor_name.ilike(f"%{filters.vendor}%"))
+    if filters.created_from:
+        query = query.filter(Invoice.created_at >= filters.created_from)
+    if filters.created_to:
+        query = query.filter(Invoice.created_at < filters.created_to)
+    if filters.min_amount is not None:
+        query = query.filter(Invoice.total_amount >= filters.min_amount)
+    if filters.max_amount is not None:
+        query = query.filter(Invoice.total_amount <= filters.max_amount)
+    return query
+
+def list_invoices_page(db: Session, filters: InvoiceListFilters, limit: int, cursor: Optional[str] = None):
+    """Returns (invoices, next_cursor); next_cursor is None on the last page."""
+    query = _apply_invoice_filters(db.query(Invoice).options(defer(Invoice.extracted_json)), filters)
+
+    if cursor:
+        cursor_id, cursor_created_at = _decode_invoice_cursor(cursor)
+        # Compare against the stored value of the cursor row rather than a re-serialized timestamp
+        # (SQLite keeps server-default timestamps without microseconds); fall back if it was deleted.
+        cursor_row = aliased(Invoice)
+        stored_created_at = db.query(cursor_row.created_at).filter(cursor_row.id == cursor_id).scalar_subquery()
+        query = query.filter(
+            tuple_(Invoice.created_at, Invoice.id) < tuple_(func.coalesce(stored_created_at, cursor_created_at), cursor_id)
+        )
+
+    rows = query.order_by(Invoice.created_at.desc(), Invoice.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_invoice_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+_count_cache: dict = {}
+_count_cache_lock = threading.Lock()
+
+def count_invoices(db: Session, filters: InvoiceListFilters) -> Tuple[int, bool]:
+    """
+    Total for a listing as (count, is_estimate). Counts are cached for INVOICE_COUNT_CACHE_SECONDS
+    per filter set, and an unfiltered count on Postgres uses the planner's row estimate once the
+    table is large enough that an exact COUNT(*) would scan it.
+    """
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(filters)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    result = None
+    if filters == InvoiceListFilters() and db.bind.dialect.name == "postgresql":
+        estimate = db.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'invoices'::regclass")).scalar()
+        if estimate and estimate >= settings.INVOICE_COUNT_ESTIMATE_THRESHOLD:
+            result = (int(estimate), True)
+    if result is None:
+        result = (_apply_invoice_filters(db.query(func.count(Invoice.id)), filters).scalar() or 0, False)
+
+    with _count_cache_lock:
+        if len(_count_cache) > 1024:
+            _count_cache.clear()
+        _count_cache[filters] = (now + settings.INVOICE_COUNT_CACHE_SECONDS, result)
+    return result
+
+
+def invoice_detail_options(with_uploader: bool = False) -> list:
+    """
+    Loader options for the InvoiceResponse graph: the invoice row plus one selectin query for its
+    timeline. `with_uploader` joins the uploading user in for callers that notify them.
+    """
+    options = [selectinload(Invoice.events)]
+    if with_uploader:
+        options.append(joinedload(Invoice.uploaded_by_user))
+    return options
+
+def load_invoice_detail(db: Session, invoice_id: str, with_uploader: bool = False) -> Optional[Invoice]:
+    """(Re)loads an invoice with its response graph in two statements, replacing any expired state."""
+    return (
+        db.query(Invoice)
+        .options(*invoice_detail_options(with_uploader))
+        .filter(Invoice.id == invoice_id)
+        .populate_existing()
+        .first()
+    )
 
-def get_client_invoice(db: Session, invoice_id: str, org_id: str) -> Invoice:
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+def get_client_invoice(db: Session, invoice_id: str, org_id: str, with_events: bool = False) -> Invoice:
+    query = db.query(Invoice).filter(Invoice.id == invoice_id)
+    if with_events:
+        query = query.options(*invoice_detail_options())  # Detail views render the timeline
+    invoice = query.first()
     if not invoice or invoice.organization_id != org_id:
         raise HTTPException(status_code=404, detail="Invoice not found")
     return invoice
 
-def get_all_invoices(db: Session, limit: int = None, skip: int = 0):
-    q = db.query(Invoice).options(defer(Invoice.extracted_json)).order_by(Invoice.created_at.desc()).offset(skip)
+def get_all_invoices(db: Session, limit: int = None, skip: int = 0, filters: Optional[InvoiceListFilters] = None):
+    """Legacy OFFSET pagination, kept for clients still paging with `skip`. Prefer list_invoices_page."""
+    q = _apply_invoice_filters(db.query(Invoice).options(defer(Invoice.extracted_json)), filters or InvoiceListFilters())
+    q = q.order_by(Invoice.created_at.desc(), Invoice.id.desc()).offset(skip)
     if limit:
         q = q.limit(limit)
     return q.all()
 
+def _queue_uploader_email(db: Session, invoice: Invoice, status: str, reason: str = None):
+    """Outbox email to the invoice's uploader, committed together with the caller's status change."""
+    from services.notification_service import queue_status_email
+    if invoice.uploaded_by_user and invoice.uploaded_by_user.email:
+        doc_name = invoice.file_url.split("/")[-1] if invoice.file_url else "Unknown Document"
+        queue_status_email(db, invoice.uploaded_by_user.email, doc_name, status, invoice.vendor_name, reason)
+
 def approve_invoice(db: Session, invoice_id: str, admin_id: str) -> Invoice:
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+    invoice = db.query(Invoice).options(joinedload(Invoice.uploaded_by_user)).filter(Invoice.id == invoice_id).first()
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     invoice.status = InvoiceStatus.APPROVED
-    db.commit()
-    db.refresh(invoice)
+    _queue_uploader_email(db, invoice, "APPROVED")
     log_invoice_event(db, invoice.id, admin_id, "APPROVED", "Invoice approved by admin.")
-    return invoice
+    return load_invoice_detail(db, invoice_id, with_uploader=True)
 
-def reject_invoice(db: Session, invoice_id: str, admin_id: str, reason: str) -> Invoice:
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+def reject_invoice(db: Session, invoice_id: str, admin_id: str, reason: str, email_reason: Optional[str] = None) -> Invoice:
+    """`email_reason` is what the uploader is told, when it differs from the reason kept in the audit trail."""
+    invoice = db.query(Invoice).options(joinedload(Invoice.uploaded_by_user)).filter(Invoice.id == invoice_id).first()
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     invoice.status = InvoiceStatus.REJECTED
-    db.commit()
-    db.refresh(invoice)
+    _queue_uploader_email(db, invoice, "REJECTED", email_reason or reason)
     log_invoice_event(db, invoice.id, admin_id, "REJECTED", f"Invoice rejected: {reason}")
-    return invoice
+    return load_invoice_detail(db, invoice_id, with_uploader=True)
+
 def _run_batch_reprocess_job(admin_id: str, target_ids: list[str] = None):
     """
     Sweeps through failed or uncertain invoices and re-triggers the full processing pipeline.
@@ -441,10 +747,10 @@ def _run_batch_reprocess_job(admin_id: str, target_ids: list[str] = None):
                 invoice.total_amount = None
                 invoice.extracted_json = None
                 invoice.duplicate_flag = False
+                invoice.duplicate_of = None
                 invoice.fraud_flag = False
                 
                 log_invoice_event(db, invoice.id, admin_id, "BATCH_REPROCESS_STARTED", "Starting re-extraction sequence.")
-                db.commit()
 
                 # Fetch and Process
                 file_bytes, _ = get_file_from_storage(invoice.file_url)
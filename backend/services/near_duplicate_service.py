@@ -0,0 +1,207 @@
+"""
+Near-Duplicate Index — catches re-scans of the same paper invoice whose OCR text
+differs by a few characters, without comparing against every invoice in the org.
+
+Each processed invoice stores two signatures:
+  - MinHash (64 permutations) over character 5-gram shingles of its OCR text
+  - a 64-bit dHash of its first page image
+
+Both are split into LSH buckets (16 bands of 4 MinHash rows, 4 chunks of 16 dHash bits)
+stored in an (organization_id, bucket_key) index. A lookup probes only the buckets of the
+new document, so the candidate set is independent of how many invoices the org holds.
+"""
+import io
+import re
+import struct
+import hashlib
+import logging
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models.all import Invoice, InvoiceFingerprint, InvoiceFingerprintBucket
+from services.intelligence_service import uploaded_before
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+IMAGE_HASH_CHUNKS = 4 # Any two hashes within Hamming distance 3 share at least one chunk
+MAX_CANDIDATES = 50
+
+# Universal hashing (a*x + b) mod p with a Mersenne prime keeps every product inside uint64
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240611)
+_PERM_A = _rng.randint(1, _PRIME, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, _PRIME, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+
+@dataclass
+class NearDuplicateMatch:
+    invoice_id: str
+    similarity: float
+    text_similarity: Optional[float]
+    image_similarity: Optional[float]
+
+
+def compute_text_minhash(raw_text: str) -> Optional[list[int]]:
+    """MinHash signature of the normalized OCR text, or None if there is too little text to compare."""
+    normalized = re.sub(r"\s+", " ", re.sub(r"[^a-z0-9 ]", " ", (raw_text or "").lower())).strip()
+    if len(normalized) < SHINGLE_SIZE * 4:
+        return None
+
+    shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) & _PRIME for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    permuted = (hashes[:, None] * _PERM_A + _PERM_B) % _PRIME
+    return permuted.min(axis=0).astype(np.int64).tolist()
+
+
+def compute_image_hash(file_bytes: bytes, filename: str) -> Optional[str]:
+    """64-bit dHash of the first page (images and PDFs only), as 16 hex chars."""
+    from PIL import Image
+
+    ext = filename.lower().split(".")[-1]
+    try:
+        if ext in ("png", "jpg", "jpeg"):
+            image = Image.open(io.BytesIO(file_bytes))
+        elif ext == "pdf":
+            import pdfplumber
+            with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+                if not pdf.pages:
+                    return None
+                # A thumbnail is plenty for a 9x8 gradient hash
+                image = pdf.pages[0].to_image(resolution=36).original
+        else:
+            return None
+
+        gray = image.convert("L").resize((9, 8), Image.LANCZOS)
+        pixels = np.asarray(gray, dtype=np.int16)
+        bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+        value = 0
+        for bit in bits:
+            value = (value << 1) | int(bit)
+        return f"{value:016x}"
+    except Exception as e:
+        logger.warning(f"Perceptual hash skipped for {filename}: {e}")
+        return None
+
+
+def _bucket_keys(text_minhash: Optional[list[int]], image_hash: Optional[str]) -> list[str]:
+    keys = []
+    if text_minhash:
+        for band in range(LSH_BANDS):
+            rows = text_minhash[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+            digest = hashlib.blake2b(struct.pack(f"<{LSH_ROWS}q", *rows), digest_size=8).hexdigest()
+            keys.append(f"t{band}:{digest}")
+    if image_hash:
+        width = len(image_hash) // IMAGE_HASH_CHUNKS
+        for chunk in range(IMAGE_HASH_CHUNKS):
+            keys.append(f"p{chunk}:{image_hash[chunk * width:(chunk + 1) * width]}")
+    return keys
+
+
+def _text_similarity(a: Optional[list[int]], b: Optional[list[int]]) -> Optional[float]:
+    if not a or not b or len(a) != len(b):
+        return None
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def _image_similarity(a: Optional[str], b: Optional[str]) -> Optional[float]:
+    if not a or not b:
+        return None
+    return 1.0 - bin(int(a, 16) ^ int(b, 16)).count("1") / 64.0
+
+
+def find_near_duplicates(
+    db: Session,
+    org_id: str,
+    text_minhash: Optional[list[int]],
+    image_hash: Optional[str],
+    reference_invoice_id: Optional[str] = None,
+    limit: int = 5,
+) -> list[NearDuplicateMatch]:
+    """
+    Returns the most similar invoices in the org, best first. With `reference_invoice_id`
+    only invoices uploaded before that one are considered, so reprocessing an original
+    never flags it against its own later re-scan.
+    `similarity` is the MinHash Jaccard estimate when both documents have text — page
+    layouts are shared by every invoice from the same vendor template, so the image hash
+    only decides when OCR produced nothing usable.
+    """
+    keys = _bucket_keys(text_minhash, image_hash)
+    if not keys:
+        return []
+
+    # Rank candidates by how many buckets they share, capped so a popular template can't blow up the lookup
+    candidate_query = db.query(
+        InvoiceFingerprintBucket.invoice_id,
+        func.count(InvoiceFingerprintBucket.bucket_key).label("hits"),
+    ).filter(
+        InvoiceFingerprintBucket.organization_id == org_id,
+        InvoiceFingerprintBucket.bucket_key.in_(keys),
+    )
+    if reference_invoice_id:
+        candidate_query = candidate_query.join(
+            Invoice, Invoice.id == InvoiceFingerprintBucket.invoice_id
+        ).filter(
+            InvoiceFingerprintBucket.invoice_id != reference_invoice_id,
+            uploaded_before(db, reference_invoice_id),
+        )
+    candidate_ids = [
+        row.invoice_id for row in candidate_query
+        .group_by(InvoiceFingerprintBucket.invoice_id)
+        .order_by(func.count(InvoiceFingerprintBucket.bucket_key).desc())
+        .limit(MAX_CANDIDATES)
+        .all()
+    ]
+    if not candidate_ids:
+        return []
+
+    fingerprints = db.query(InvoiceFingerprint).filter(InvoiceFingerprint.invoice_id.in_(candidate_ids)).all()
+
+    matches = []
+    for fp in fingerprints:
+        text_sim = _text_similarity(text_minhash, fp.text_minhash)
+        image_sim = _image_similarity(image_hash, fp.image_hash)
+        similarity = text_sim if text_sim is not None else image_sim
+        if similarity is None:
+            continue
+        matches.append(NearDuplicateMatch(
+            invoice_id=fp.invoice_id,
+            similarity=round(similarity, 4),
+            text_similarity=round(text_sim, 4) if text_sim is not None else None,
+            image_similarity=round(image_sim, 4) if image_sim is not None else None,
+        ))
+
+    matches.sort(key=lambda m: m.similarity, reverse=True)
+    return matches[:limit]
+
+
+def index_invoice_fingerprint(db: Session, invoice: Invoice, text_minhash: Optional[list[int]], image_hash: Optional[str]) -> None:
+    """Stores (or replaces, on reprocess) the invoice's signatures and LSH buckets. Caller commits."""
+    keys = _bucket_keys(text_minhash, image_hash)
+    if invoice.fingerprint is not None:
+        invoice.fingerprint = None
+        db.flush()
+    if not keys:
+        return
+
+    invoice.fingerprint = InvoiceFingerprint(
+        organization_id=invoice.organization_id,
+        text_minhash=text_minhash,
+        image_hash=image_hash,
+        buckets=[
+            InvoiceFingerprintBucket(bucket_key=key, organization_id=invoice.organization_id)
+            for key in keys
+        ],
+    )
@@ -0,0 +1,330 @@
+"""
+Outbound status emails through a transactional outbox.
+
+Callers add a NotificationOutbox row in the transaction that changes the invoice
+(`queue_status_email`), so invoice processing never waits on SMTP and a rolled-back change
+sends nothing. A single NotificationSender thread per worker delivers the rows:
+
+- woken right after a commit that queued notifications, plus a NOTIFICATION_POLL_SECONDS sweep
+- one SMTP connection, logged in once and reused until SMTP_IDLE_SECONDS without a send
+- everything pending for a recipient goes out as one digest email; NOTIFICATION_DIGEST_SECONDS
+  holds new notifications back so bursts (batch approvals) collapse into fewer emails
+- failed sends retry with exponential backoff up to NOTIFICATION_MAX_ATTEMPTS, then stay in
+  the table as state="failed"
+
+Rows are claimed with FOR UPDATE SKIP LOCKED, so senders in several workers never double-send.
+"""
+import logging
+import smtplib
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from email.mime.text import MIMEText
+from typing import Optional
+
+from sqlalchemy import event, func, or_
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from dependencies import SessionLocal
+from models.all import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+STALE_CLAIM_SECONDS = 600  # A sender that died mid-delivery releases its rows after this long
+CLAIM_RECIPIENTS_PER_SWEEP = 200
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _credentials_configured() -> bool:
+    return bool(settings.EMAIL_ADDRESS and settings.EMAIL_PASSWORD)
+
+
+# ── Composition ───────────────────────────────────────────────────────────────
+
+def _subject(status: str, invoice_filename: str, vendor_name: Optional[str]) -> str:
+    subject_map = {
+        "RECEIVED": f"📥 Invoice Received: {invoice_filename}",
+        "APPROVED": f"✅ Invoice Approved: {vendor_name or invoice_filename}",
+        "AUTO_APPROVED": f"⚡ Invoice Auto-Approved: {vendor_name or invoice_filename}",
+        "REJECTED": f"❌ Invoice Rejected: {vendor_name or invoice_filename}",
+        "PROCESSING_FAILED": f"⚠️ Processing Failed: {invoice_filename}",
+    }
+    return subject_map.get(status, f"Update on Invoice: {invoice_filename}")
+
+
+def _status_sentence(status: str, invoice_filename: str, vendor_name: Optional[str], reason: Optional[str]) -> str:
+    sentence = f"Your recent invoice '{invoice_filename}' "
+    if vendor_name:
+        sentence += f"from vendor '{vendor_name}' "
+
+    if status == "RECEIVED":
+        sentence += "has been successfully received and is currently being processed by our AI pipeline. You will be notified once a decision is reached."
+    elif status in ("APPROVED", "AUTO_APPROVED"):
+        sentence += "has been successfully approved and finalized."
+    elif status == "REJECTED":
+        sentence += f"has been rejected by an administrator.\n\nReason: {reason or 'No reason provided.'}"
+    elif status == "PROCESSING_FAILED":
+        sentence += "failed to process through our AI pipeline. An administrator has been notified to review the document."
+    elif reason:
+        sentence += f"needs attention.\n\n{reason}"
+    return sentence
+
+
+def compose_email(recipient: str, notifications: list[dict]) -> MIMEText:
+    """One status email, or a digest when the recipient has several pending notifications."""
+    if len(notifications) == 1:
+        n = notifications[0]
+        subject = _subject(n["status"], n["invoice_filename"], n["vendor_name"])
+        body = "Hello,\n\n" + _status_sentence(n["status"], n["invoice_filename"], n["vendor_name"], n["reason"])
+    else:
+        subject = f"📬 {len(notifications)} invoice updates from InvoiceAI"
+        body = "Hello,\n\nHere is what happened to your invoices:\n"
+        for n in notifications:
+            body += f"\n• {_subject(n['status'], n['invoice_filename'], n['vendor_name'])}\n  "
+            body += _status_sentence(n["status"], n["invoice_filename"], n["vendor_name"], n["reason"]).replace("\n", "\n  ") + "\n"
+
+    body += "\n\nYou can view full details by logging into the InvoiceAI Client Dashboard.\n\nBest,\nThe InvoiceAI Team"
+    message = MIMEText(body, "plain", "utf-8")
+    message["From"] = f"InvoiceAI <{settings.EMAIL_ADDRESS}>"
+    message["To"] = recipient
+    message["Subject"] = subject
+    return message
+
+
+# ── Enqueueing ────────────────────────────────────────────────────────────────
+
+def queue_status_email(db: Session, to_email: str, invoice_filename: str, status: str,
+                       vendor_name: str = None, reason: str = None):
+    """Adds a status email to the caller's transaction; it is delivered once that transaction commits."""
+    if not _credentials_configured():
+        logger.warning(f"Skipping outbound email to {to_email}. Credentials missing.")
+        return
+    db.add(NotificationOutbox(
+        recipient=to_email,
+        status=status,
+        invoice_filename=invoice_filename,
+        vendor_name=vendor_name,
+        reason=reason,
+        send_after=_utcnow() + timedelta(seconds=settings.NOTIFICATION_DIGEST_SECONDS),
+    ))
+    db.info["notifications_queued"] = True
+
+
+def notify_status(to_email: str, invoice_filename: str, status: str, vendor_name: str = None, reason: str = None):
+    """queue_status_email on a session of its own, for callers with no transaction to join. Prefer queue_status_email."""
+    if not _credentials_configured():
+        logger.warning(f"Skipping outbound email to {to_email}. Credentials missing.")
+        return
+    db = SessionLocal()
+    try:
+        queue_status_email(db, to_email, invoice_filename, status, vendor_name, reason)
+        db.commit()
+    finally:
+        db.close()
+
+
+# ── Delivery ──────────────────────────────────────────────────────────────────
+
+class SmtpConnection:
+    """A logged-in SMTP session reused across sends; reconnects once when the server has dropped it."""
+
+    def __init__(self):
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.logins = 0
+
+    def _connect(self):
+        if settings.EMAIL_SMTP_TLS and settings.EMAIL_SMTP_PORT == 465:
+            smtp = smtplib.SMTP_SSL(settings.EMAIL_SMTP_SERVER, settings.EMAIL_SMTP_PORT, timeout=30)
+        else:
+            smtp = smtplib.SMTP(settings.EMAIL_SMTP_SERVER, settings.EMAIL_SMTP_PORT, timeout=30)
+            if settings.EMAIL_SMTP_TLS:
+                smtp.starttls()
+        smtp.login(settings.EMAIL_ADDRESS, settings.EMAIL_PASSWORD)
+        self.logins += 1
+        self._smtp = smtp
+
+    def send(self, message):
+        self.close_if_idle()
+        if self._smtp is None:
+            self._connect()
+        try:
+            self._smtp.send_message(message)
+        except smtplib.SMTPResponseException:
+            raise  # The server answered and refused; reconnecting would not change that
+        except OSError:  # Dropped while idle (SMTPServerDisconnected, reset sockets)
+            self.close()
+            self._connect()
+            self._smtp.send_message(message)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > settings.SMTP_IDLE_SECONDS:
+            self.close()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+
+class NotificationSender:
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.smtp = SmtpConnection()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="notification-sender", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.smtp.close()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Notification sweep failed: {e}")
+            self.smtp.close_if_idle()
+            self._wake.wait(self._next_wait())
+            self._wake.clear()
+
+    def _next_wait(self) -> float:
+        # Sleep until the earliest held-back notification or retry is due, but never past the safety sweep
+        wait = settings.NOTIFICATION_POLL_SECONDS
+        db = SessionLocal()
+        try:
+            next_due = db.query(func.min(NotificationOutbox.send_after)).filter(NotificationOutbox.state == "pending").scalar()
+        finally:
+            db.close()
+        if next_due is not None:
+            if next_due.tzinfo is None:  # SQLite drops the offset
+                next_due = next_due.replace(tzinfo=timezone.utc)
+            wait = min(wait, (next_due - _utcnow()).total_seconds())
+        return max(wait, 0.5)
+
+    def flush(self) -> int:
+        """Delivers everything that is due. Returns the number of emails sent."""
+        with self._lock:
+            db = SessionLocal()
+            try:
+                self._release_stale_claims(db)
+                batches = self._claim(db)
+            finally:
+                db.close()
+            return sum(self._deliver(recipient, notifications) for recipient, notifications in batches.items())
+
+    def _release_stale_claims(self, db: Session):
+        cutoff = _utcnow() - timedelta(seconds=STALE_CLAIM_SECONDS)
+        released = (
+            db.query(NotificationOutbox)
+            .filter(NotificationOutbox.state == "sending", NotificationOutbox.claimed_at < cutoff)
+            .update({"state": "pending"}, synchronize_session=False)
+        )
+        if released:
+            logger.warning(f"Released {released} notification(s) abandoned mid-delivery.")
+        db.commit()
+
+    def _claim(self, db: Session) -> dict[str, list[dict]]:
+        now = _utcnow()
+        due = db.query(NotificationOutbox.recipient).filter(
+            NotificationOutbox.state == "pending", NotificationOutbox.send_after <= now,
+        ).distinct().limit(CLAIM_RECIPIENTS_PER_SWEEP)
+        recipients = [recipient for (recipient,) in due]
+        if not recipients:
+            return {}
+
+        # Everything pending for a due recipient rides along, except retries still backing off
+        rows = (
+            db.query(NotificationOutbox)
+            .filter(
+                NotificationOutbox.recipient.in_(recipients),
+                NotificationOutbox.state == "pending",
+                or_(NotificationOutbox.attempts == 0, NotificationOutbox.send_after <= now),
+            )
+            .order_by(NotificationOutbox.id)  # Time-ordered ids
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        batches = defaultdict(list)
+        for row in rows:
+            row.state = "sending"
+            row.claimed_at = now
+            batches[row.recipient].append({
+                "id": row.id, "status": row.status, "invoice_filename": row.invoice_filename,
+                "vendor_name": row.vendor_name, "reason": row.reason,
+            })
+        db.commit()
+        return batches
+
+    def _deliver(self, recipient: str, notifications: list[dict]) -> int:
+        ids = [n["id"] for n in notifications]
+        error = None
+        try:
+            self.smtp.send(compose_email(recipient, notifications))
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+        db = SessionLocal()
+        try:
+            if error is None:
+                db.query(NotificationOutbox).filter(NotificationOutbox.id.in_(ids)).delete(synchronize_session=False)
+                logger.info(f"Sent {len(ids)} notification(s) to {recipient} in one email")
+            else:
+                now = _utcnow()
+                for row in db.query(NotificationOutbox).filter(NotificationOutbox.id.in_(ids)):
+                    row.attempts += 1
+                    row.last_error = error[:1000]
+                    if row.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                        row.state = "failed"
+                    else:
+                        row.state = "pending"
+                        row.send_after = now + timedelta(seconds=settings.NOTIFICATION_RETRY_SECONDS * 2 ** (row.attempts - 1))
+                logger.error(f"Failed to send email to {recipient}: {error}")
+            db.commit()
+        finally:
+            db.close()
+        return 1 if error is None else 0
+
+    def stats(self) -> dict:
+        db = SessionLocal()
+        try:
+            counts = dict(db.query(NotificationOutbox.state, func.count()).group_by(NotificationOutbox.state).all())
+        finally:
+            db.close()
+        return {"pending": counts.get("pending", 0), "sending": counts.get("sending", 0),
+                "failed": counts.get("failed", 0), "smtp_logins": self.smtp.logins}
+
+
+notification_sender = NotificationSender()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_sender(session):
+    if session.info.pop("notifications_queued", False):
+        notification_sender.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_queued_flag(session):
+    session.info.pop("notifications_queued", None)
@@ -105,17 +105,21 @@ def _extract_from_excel(file_bytes: bytes) -> str:
     """
     try:
         import openpyxl
-        wb = openpyxl.load_workbook(io.BytesIO(file_bytes), data_only=True)
-        parts = []
-        for sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            parts.append(f"[Sheet: {sheet_name}]")
-            for row in ws.iter_rows(values_only=True):
-                # Skip completely empty rows
-                if any(cell is not None for cell in row):
-                    parts.append("\t".join(str(c) if c is not None else "" for c in row))
+        # read_only streams rows from the sheet XML instead of materializing every cell object
+        wb = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+        try:
+            parts = []
+            for ws in wb.worksheets:
+                parts.append(f"[Sheet: {ws.title}]")
+                for row in ws.iter_rows(values_only=True):
+                    # Skip completely empty rows
+                    if any(cell is not None for cell in row):
+                        parts.append("\t".join(str(c) if c is not None else "" for c in row))
+            sheet_count = len(wb.worksheets)
+        finally:
+            wb.close()
         text = "\n".join(parts)
-        logger.info(f"Excel extraction done — {len(text)} chars from {len(wb.sheetnames)} sheet(s).")
+        logger.info(f"Excel extraction done — {len(text)} chars from {sheet_count} sheet(s).")
         return text
     except Exception as e:
         logger.error(f"Excel extraction failed: {e}")
@@ -0,0 +1,94 @@
+from typing import Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from models.all import Organization, User, UserRole, InvoiceStatus, InvoiceStatusRollup
+
+APPROVED_STATUSES = (InvoiceStatus.APPROVED, InvoiceStatus.AUTO_APPROVED)
+PENDING_STATUSES = (InvoiceStatus.PROCESSING, InvoiceStatus.UNDER_REVIEW)
+
+
+def _invoice_status_counts():
+    """Per-org invoice totals from the (organization, status) analytics rollup — no invoice rows are read."""
+    return (
+        select(
+            InvoiceStatusRollup.organization_id,
+            func.sum(InvoiceStatusRollup.invoice_count).label("total_invoices"),
+            func.sum(case((InvoiceStatusRollup.status.in_(APPROVED_STATUSES), InvoiceStatusRollup.invoice_count), else_=0)).label("approved"),
+            func.sum(case((InvoiceStatusRollup.status == InvoiceStatus.REJECTED, InvoiceStatusRollup.invoice_count), else_=0)).label("rejected"),
+            func.sum(case((InvoiceStatusRollup.status.in_(PENDING_STATUSES), InvoiceStatusRollup.invoice_count), else_=0)).label("pending"),
+        )
+        .group_by(InvoiceStatusRollup.organization_id)
+        .subquery()
+    )
+
+
+def _primary_client_users():
+    """The earliest-registered client user of every organization that has one."""
+    ranked = (
+        select(
+            User.organization_id,
+            User.email,
+            User.full_name,
+            User.avatar_url,
+            func.row_number().over(
+                partition_by=User.organization_id,
+                order_by=(User.created_at, User.id),
+            ).label("rank"),
+        )
+        .where(User.role == UserRole.CLIENT)
+        .subquery()
+    )
+    return select(ranked).where(ranked.c.rank == 1).subquery()
+
+
+CLIENT_SORT_KEYS = ("org_name", "created_at", "total_invoices", "approved", "rejected", "pending")
+
+
+def list_client_organizations(db: Session, limit: Optional[int] = None, skip: int = 0, sort: str = "created_at", descending: bool = False):
+    """
+    Client organizations with their invoice stats, as (rows, total) — one aggregate statement
+    per page plus a count, independent of how many invoices exist. No limit returns them all.
+    Organizations without a client user (e.g. the admin org) are excluded.
+    """
+    primary = _primary_client_users()
+    stats = _invoice_status_counts()
+
+    columns = {
+        "org_name": Organization.name,
+        "created_at": Organization.created_at,
+        "total_invoices": func.coalesce(stats.c.total_invoices, 0),
+        "approved": func.coalesce(stats.c.approved, 0),
+        "rejected": func.coalesce(stats.c.rejected, 0),
+        "pending": func.coalesce(stats.c.pending, 0),
+    }
+    sort_column = columns[sort]
+
+    rows = db.execute(
+        select(
+            Organization.id,
+            Organization.name.label("org_name"),
+            primary.c.email,
+            primary.c.full_name,
+            primary.c.avatar_url,
+            columns["total_invoices"].label("total_invoices"),
+            columns["approved"].label("approved"),
+            columns["rejected"].label("rejected"),
+            columns["pending"].label("pending"),
+        )
+        .join(primary, primary.c.organization_id == Organization.id)
+        .outerjoin(stats, stats.c.organization_id == Organization.id)
+        .order_by(sort_column.desc() if descending else sort_column.asc(), Organization.id)
+        .offset(skip)
+        .limit(limit)
+    ).mappings().all()
+
+    total = db.execute(
+        select(func.count(func.distinct(User.organization_id))).where(User.role == UserRole.CLIENT)
+    ).scalar() or 0
+
+    return [
+        {**row, **{k: int(row[k]) for k in ("total_invoices", "approved", "rejected", "pending")}}
+        for row in rows
+    ], total
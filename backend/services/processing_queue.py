@@ -0,0 +1,146 @@
+"""
+Bounded worker pool for document processing (OCR/LLM extraction and spreadsheet imports).
+
+Every ingestion path — uploads, bulk uploads, direct-to-R2 triggers, multipart completions and
+email attachments — hands its job to one shared queue of PROCESSING_QUEUE_SIZE slots drained by
+PROCESSING_WORKERS threads. Thread count is fixed, and memory is bounded by the slots.
+
+Requests never wait for a slot: a route reserves the slots it needs up front (see
+`get_processing_slots` in dependencies.py), before it stores bytes or commits rows, and a full
+queue answers 503 with Retry-After. Only the IMAP watcher uses the blocking `submit`, which
+makes it stop pulling mail until a slot frees up.
+
+Extraction itself is still serialized by `global_processing_lock`; extra workers overlap the
+storage upload and duplicate check of the next job with the current extraction.
+"""
+import logging
+import queue
+import threading
+from typing import Callable
+
+from fastapi import HTTPException
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessingQueue:
+    def __init__(self, workers: int, capacity: int):
+        self.workers = max(workers, 1)
+        self.capacity = max(capacity, 1)
+        self._queue: queue.Queue = queue.Queue()  # Bounded by _slots, which reservations also draw from
+        self._slots = threading.Semaphore(self.capacity)
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "waited_for_slot": 0, "rejected": 0, "active": 0}
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"processing-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _count(self, stat: str, delta: int = 1):
+        with self._lock:
+            self._stats[stat] += delta
+
+    def _enqueue(self, fn: Callable, args: tuple):
+        """Queues a job whose slot is already held."""
+        self._ensure_workers()
+        self._queue.put_nowait((fn, args))
+        self._count("submitted")
+
+    def try_acquire(self, count: int) -> bool:
+        """Takes `count` slots at once, or none of them."""
+        taken = 0
+        while taken < count and self._slots.acquire(blocking=False):
+            taken += 1
+        if taken < count:
+            self.release(taken)
+            self._count("rejected")
+            return False
+        return True
+
+    def release(self, count: int):
+        for _ in range(count):
+            self._slots.release()
+
+    def reservation(self) -> "Reservation":
+        return Reservation(self)
+
+    def submit(self, fn: Callable, *args, timeout: float = None):
+        """Queues `fn(*args)`, blocking while the queue is full. Raises queue.Full after `timeout` seconds."""
+        if not self._slots.acquire(blocking=False):
+            self._count("waited_for_slot")
+            logger.warning(f"Processing queue full ({self.capacity} jobs); waiting for a free slot.")
+            if not self._slots.acquire(timeout=timeout):
+                raise queue.Full
+        self._enqueue(fn, args)
+
+    def _work(self):
+        while True:
+            fn, args = self._queue.get()
+            self._slots.release()  # The slot frees up as soon as a worker takes the job
+            self._count("active")
+            try:
+                fn(*args)
+                self._count("completed")
+            except Exception as e:
+                # The job functions record their own failures on the invoice; this only keeps the worker alive
+                self._count("failed")
+                logger.error(f"Processing job {getattr(fn, '__name__', fn)} crashed: {e}")
+            finally:
+                self._count("active", -1)
+                self._queue.task_done()
+
+    def join(self):
+        """Waits until every queued job has finished (scripts and smoke checks)."""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "queued": self._queue.qsize(),
+                **self._stats,
+            }
+
+
+class Reservation:
+    """Queue slots held by one request: reserved before any work is stored, so `submit` never waits."""
+
+    def __init__(self, pool: ProcessingQueue):
+        self._pool = pool
+        self._held = 0
+
+    def reserve(self, count: int = 1):
+        """Holds `count` more slots, or answers 503 when the queue can't take that many jobs right now."""
+        if count <= 0:
+            return
+        if not self._pool.try_acquire(count):
+            logger.warning(f"Processing queue full; refusing a request for {count} job(s).")
+            raise HTTPException(
+                status_code=503,
+                detail="Document processing is at capacity, please retry shortly.",
+                headers={"Retry-After": str(settings.PROCESSING_RETRY_AFTER_SECONDS)},
+            )
+        self._held += count
+
+    def submit(self, fn: Callable, *args):
+        if self._held <= 0:
+            raise RuntimeError("No reserved processing slot left for this job.")
+        self._held -= 1
+        self._pool._enqueue(fn, args)
+
+    def release(self):
+        """Returns the slots that were reserved but never used."""
+        self._pool.release(self._held)
+        self._held = 0
+
+
+processing_queue = ProcessingQueue(workers=settings.PROCESSING_WORKERS, capacity=settings.PROCESSING_QUEUE_SIZE)
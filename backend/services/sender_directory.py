@@ -0,0 +1,160 @@
+"""
+Sender directory for email ingestion: which registered user an inbound email is filed under.
+
+The active users are loaded in one query into an in-memory snapshot, refreshed at most once per
+mailbox sweep when older than EMAIL_SENDER_CACHE_SECONDS, and dropped as soon as a committed
+change adds, removes or re-addresses a User or deletes an Organization in this worker. A burst
+of mail from the same vendors then resolves without touching the database.
+
+A sender resolves, in order, to:
+1. the registered user with that address
+2. an EMAIL_SENDER_ALLOWLIST entry for the address ("ap@vendor.com") or its domain ("@vendor.com"),
+   mapped to the registered user who owns that vendor's mail
+3. with EMAIL_SENDER_DOMAIN_MATCHING on, the earliest registered user at the sender's domain,
+   when every user at that domain belongs to one organization and it is not a public mail domain
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from dependencies import SessionLocal
+from models.all import Organization, User
+
+logger = logging.getLogger(__name__)
+
+# Domains shared by unrelated people: never evidence that a sender belongs to an organization
+PUBLIC_MAIL_DOMAINS = frozenset({
+    "gmail.com", "googlemail.com", "outlook.com", "hotmail.com", "live.com", "msn.com", "yahoo.com",
+    "icloud.com", "me.com", "aol.com", "proton.me", "protonmail.com", "gmx.com", "gmx.de", "web.de",
+    "mail.com", "yandex.com", "zoho.com",
+})
+
+
+@dataclass(frozen=True)
+class Sender:
+    """The registered user an email is filed under — detached, safe to share across threads."""
+    id: str
+    email: str
+    organization_id: str
+
+
+def _domain(address: str) -> str:
+    return address.rsplit("@", 1)[-1]
+
+
+class SenderSnapshot:
+    def __init__(self, users: list[Sender]):
+        self.by_email = {user.email.lower(): user for user in users}
+        self.by_domain: dict[str, Optional[Sender]] = {}
+        for user in users:  # Ordered by registration, so the first user of a domain is its owner
+            domain = _domain(user.email.lower())
+            owner = self.by_domain.setdefault(domain, user)
+            if owner is not None and owner.organization_id != user.organization_id:
+                self.by_domain[domain] = None  # Spans organizations — ambiguous
+        self.allowlist = {key.strip().lower(): value.strip().lower()
+                          for key, value in settings.EMAIL_SENDER_ALLOWLIST.items()}
+
+    def resolve(self, address: str) -> Optional[Sender]:
+        address = address.lower()
+        user = self.by_email.get(address)
+        if user:
+            return user
+
+        domain = _domain(address)
+        mapped = self.allowlist.get(address) or self.allowlist.get("@" + domain)
+        if mapped:
+            user = self.by_email.get(mapped)
+            if not user:
+                logger.warning(f"Allow-listed sender {address} maps to unknown or inactive user {mapped}.")
+            return user
+
+        if settings.EMAIL_SENDER_DOMAIN_MATCHING and domain not in PUBLIC_MAIL_DOMAINS:
+            return self.by_domain.get(domain)
+        return None
+
+
+class SenderDirectory:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._snapshot: Optional[SenderSnapshot] = None
+        self._expires = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def current(self) -> SenderSnapshot:
+        """The cached snapshot, reloaded with one query when expired or invalidated."""
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() < self._expires:
+                return self._snapshot
+            generation = self._generation
+
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(User.id, User.email, User.organization_id)
+                .filter(User.is_active.isnot(False))
+                .order_by(User.created_at, User.id)
+                .all()
+            )
+        finally:
+            db.close()
+        snapshot = SenderSnapshot([Sender(row.id, row.email, row.organization_id) for row in rows])
+
+        with self._lock:
+            self.loads += 1
+            # An invalidation during the load means the rows may predate it; use them once, don't keep them
+            if generation == self._generation:
+                self._snapshot, self._expires = snapshot, time.monotonic() + self.ttl
+        return snapshot
+
+    def resolve(self, address: str) -> Optional[Sender]:
+        return self.current().resolve(address)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._generation += 1
+
+
+sender_directory = SenderDirectory(ttl=settings.EMAIL_SENDER_CACHE_SECONDS)
+
+
+# ── Invalidation ──────────────────────────────────────────────────────────────
+# Same flush-then-commit eviction as the principal cache (core/principal.py).
+
+# The User columns a snapshot is built from (created_at never changes after insert). Profile
+# refreshes on every Google sign-in, password rehashes etc. leave the directory as it is.
+SENDER_FIELDS = ("email", "organization_id", "is_active")
+
+
+def _sender_fields_changed(user: User) -> bool:
+    state = inspect(user)
+    return any(state.attrs[field].history.has_changes() for field in SENDER_FIELDS)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_sender_changes(session, flush_context):
+    changed = any(isinstance(obj, User) for obj in list(session.new) + list(session.deleted))
+    changed = changed or any(isinstance(obj, User) and _sender_fields_changed(obj) for obj in session.dirty)
+    changed = changed or any(isinstance(obj, Organization) for obj in session.deleted)
+    if changed:
+        sender_directory.invalidate()
+        session.info["sender_directory_stale"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_senders(session):
+    if session.info.pop("sender_directory_stale", False):
+        sender_directory.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_sender_changes(session):
+    session.info.pop("sender_directory_stale", None)
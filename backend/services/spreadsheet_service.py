@@ -1,15 +1,227 @@
 import io
+import json
+import math
 import time
+import uuid
 import pandas as pd
 import logging
+from itertools import islice
+from typing import BinaryIO, Iterator
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from core.config import settings
 from models.all import Invoice, InvoiceStatus
 from dependencies import SessionLocal
-from services.invoice_service import log_invoice_event
-import uuid
+from services.invoice_service import EventRecorder
+from services.analytics_service import record_grouped_rollups
+from services.column_mapping import remember_mapping, resolve_mapping, to_number
+from services.intelligence_service import FAILED_SPREADSHEET_PREFIX
 
 logger = logging.getLogger(__name__)
 
+# Columns written per imported row; everything else is left to its server default (created_at)
+IMPORT_COLUMNS = (
+    "id", "file_url", "status", "organization_id", "uploaded_by", "vendor_name", "invoice_number",
+    "total_amount", "confidence_score", "extracted_json", "duplicate_flag", "fraud_flag",
+)
+
+
+def _as_text(series: pd.Series, default=None) -> pd.Series:
+    """Column values as str (same rendering as str(value)), with `default` where missing."""
+    return series.astype(str).where(series.notna(), default)
+
+
+def _json_value(value):
+    """A raw cell as a JSON scalar: str, bool, int and finite floats as-is, anything else (time, Decimal, inf...) as str."""
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        value = value.item()  # numpy scalar
+    if isinstance(value, (str, bool, int)) or (isinstance(value, float) and math.isfinite(value)):
+        return value
+    return str(value)
+
+
+def coerce_chunk(df: pd.DataFrame, mapping: dict) -> pd.DataFrame:
+    """
+    Column-wise type coercion of a block of rows into the invoice fields: vendor_name,
+    invoice_number, total_amount and extracted_json. No per-row Python beyond building the JSON.
+    """
+    out = pd.DataFrame(index=df.index)
+    out["total_amount"] = to_number(df[mapping["amount"]]).fillna(0.0).astype(float)
+    if mapping["vendor"] is not None:
+        out["vendor_name"] = _as_text(df[mapping["vendor"]], "Batch Import")
+    else:
+        out["vendor_name"] = "Batch Import"
+
+    if mapping["number"] is not None:
+        numbers = _as_text(df[mapping["number"]])
+    else:
+        numbers = pd.Series(None, index=df.index, dtype=object)
+    missing = numbers.isna()
+    if missing.any():
+        numbers[missing] = [str(uuid.uuid4())[:8] for _ in range(int(missing.sum()))]
+    out["invoice_number"] = numbers
+
+    dates = _as_text(df[mapping["date"]]) if mapping["date"] is not None else pd.Series(None, index=df.index, dtype=object)
+
+    # raw_row_data keeps the source row as JSON scalars, so both writers store the same payload.
+    # Datetime columns are rendered as text; mixed/float columns (a date column with an "N/A",
+    # time cells, inf) go through _json_value. Int and bool columns are already plain Python values.
+    raw = df.copy()
+    for column in raw.select_dtypes(include=["datetime", "datetimetz"]).columns:
+        raw[column] = _as_text(raw[column], "")
+    mixed = raw.select_dtypes(include=["object", "float"]).columns
+    raw = raw.astype(object).where(raw.notna(), "")
+    for column in mixed:
+        raw[column] = raw[column].map(_json_value)
+    out["extracted_json"] = [
+        {"invoice_date": date, "raw_row_data": row}
+        for date, row in zip(dates.tolist(), raw.to_dict(orient="records"))
+    ]
+    return out
+
+
+class ChunkWriter:
+    """
+    Appends coerced chunks to the invoices table inside the caller's transaction, one statement per
+    chunk: COPY on Postgres, a batched executemany insert elsewhere. Rows bypass the ORM, so no
+    identity map grows with the file.
+    """
+
+    def __init__(self, db: Session, organization_id: str, user_id: str, file_url: str):
+        self.db = db
+        self.constants = {
+            "file_url": file_url,
+            "status": InvoiceStatus.AUTO_APPROVED,
+            "organization_id": organization_id,
+            "uploaded_by": user_id,
+            "confidence_score": 1.0,
+            "duplicate_flag": False,
+            "fraud_flag": False,
+        }
+        self.use_copy = db.get_bind().dialect.name == "postgresql"
+        self.rows = 0
+        self.amount = 0.0
+        self.vendor_totals = pd.DataFrame(columns=["count", "amount"], dtype=float)
+
+    def write(self, chunk: pd.DataFrame):
+        if chunk.empty:
+            return
+        chunk = chunk.assign(id=[str(uuid.uuid4()) for _ in range(len(chunk))])
+        if self.use_copy:
+            self._copy(chunk)
+        else:
+            self._insert(chunk)
+
+        self.rows += len(chunk)
+        self.amount += float(chunk["total_amount"].sum())
+        totals = chunk.groupby("vendor_name")["total_amount"].agg(count="size", amount="sum")
+        self.vendor_totals = self.vendor_totals.add(totals, fill_value=0)
+
+    def _insert(self, block: pd.DataFrame):
+        columns = ["id", "vendor_name", "invoice_number", "total_amount", "extracted_json"]
+        records = [dict(zip(columns, values), **self.constants)
+                   for values in zip(*(block[c].tolist() for c in columns))]
+        self.db.execute(insert(Invoice.__table__), records)
+
+    def _copy(self, block: pd.DataFrame):
+        def text(value) -> str:
+            if value is None:
+                return "\\N"
+            return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+        constants = {**self.constants, "status": InvoiceStatus.AUTO_APPROVED.name}
+        columns = {
+            **{name: [constants[name]] * len(block) for name in constants},
+            "id": block["id"].tolist(),
+            "vendor_name": block["vendor_name"].tolist(),
+            "invoice_number": block["invoice_number"].tolist(),
+            "total_amount": [repr(v) for v in block["total_amount"].tolist()],
+            "extracted_json": [json.dumps(v) for v in block["extracted_json"].tolist()],
+        }
+        buffer = io.StringIO()
+        for values in zip(*(columns[name] for name in IMPORT_COLUMNS)):
+            buffer.write("\t".join(text(v) for v in values))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        # The session's own DBAPI connection, so the COPY commits or rolls back with the import
+        dbapi_connection = self.db.connection().connection.driver_connection
+        with dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY invoices ({', '.join(IMPORT_COLUMNS)}) FROM STDIN", buffer)
+
+    def record_rollups(self):
+        snapshot = {
+            "organization_id": self.constants["organization_id"], "status": InvoiceStatus.AUTO_APPROVED,
+            "created_at": None, "duplicate_flag": False, "fraud_flag": False,
+            "confidence_score": 1.0, "processing_time_seconds": None,
+        }
+        groups = ((vendor, int(row["count"]), float(row["amount"])) for vendor, row in self.vendor_totals.iterrows())
+        record_grouped_rollups(self.db, snapshot, groups)
+
+
+# ── Streaming readers ─────────────────────────────────────────────────────────
+# Files are parsed SPREADSHEET_INSERT_CHUNK_ROWS rows at a time, so the parsed form of an import
+# never holds more than one chunk however long the export is.
+
+def _column_names(header: tuple) -> list[str]:
+    """Header cells named the way pandas does: blanks become "Unnamed: i", repeats get ".1", ".2"..."""
+    names, seen = [], {}
+    for index, cell in enumerate(header):
+        name = str(cell) if cell is not None and str(cell).strip() else f"Unnamed: {index}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _iter_xlsx_chunks(source: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    import openpyxl
+
+    # read_only streams the sheet XML row by row instead of building every cell object up front
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("Spreadsheet is empty.")
+        columns = _column_names(header)
+        rows = (row for row in rows if any(cell is not None for cell in row))  # Formatted-but-empty rows would import as empty invoices
+        yielded = False
+        while chunk := list(islice(rows, chunk_rows)):
+            yielded = True
+            yield pd.DataFrame([row[:len(columns)] + (None,) * (len(columns) - len(row)) for row in chunk], columns=columns)
+        if not yielded:
+            yield pd.DataFrame(columns=columns)
+    finally:
+        workbook.close()
+
+
+def iter_spreadsheet_chunks(source: BinaryIO, filename: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """DataFrames of at most `chunk_rows` rows; a header-only file yields one empty frame with its columns."""
+    name = filename.lower()
+    if name.endswith(".csv"):
+        with pd.read_csv(source, chunksize=chunk_rows) as reader:
+            yielded = False
+            for chunk in reader:
+                yielded = True
+                yield chunk
+        if not yielded:
+            source.seek(0)
+            yield pd.read_csv(source, nrows=0)
+    elif name.endswith(".xlsx"):
+        yield from _iter_xlsx_chunks(source, chunk_rows)
+    else:
+        # Legacy .xls has no streaming reader; it is small by nature (65,536 rows at most)
+        df = pd.read_excel(source)
+        if df.empty:
+            yield df
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+
 def process_spreadsheet_background(invoice_id: str, file_bytes: bytes, filename: str, user_id: str,
                                     r2_key: str = "", content_type: str = "application/octet-stream"):
     db = SessionLocal()
@@ -29,83 +241,61 @@ def process_spreadsheet_background(invoice_id: str, file_bytes: bytes, filename:
             except Exception as r2_err:
                 logger.error(f"R2 upload failed for spreadsheet {invoice_id}: {r2_err}")
 
-        log_invoice_event(db, tracker_invoice.id, user_id, "PROCESSING_STARTED", f"Importing structured rows from {filename}.")
+        # A re-sent export must not import every row a second time
+        from services.invoice_service import _short_circuit_exact_duplicate
+        events = EventRecorder(db, tracker_invoice.id, user_id)
+        if _short_circuit_exact_duplicate(db, tracker_invoice, file_bytes, user_id, events):
+            return
+
+        # Imports finish in seconds, so STARTED is committed together with the outcome
+        events.record("PROCESSING_STARTED", f"Importing structured rows from {filename}.")
+        organization_id, file_url = tracker_invoice.organization_id, tracker_invoice.file_url
+        mapping = None
 
         try:
-            if filename.lower().endswith('.csv'):
-                df = pd.read_csv(io.BytesIO(file_bytes))
-            else:
-                df = pd.read_excel(io.BytesIO(file_bytes))
-                
-            # Basic mapping heuristic for headers
-            cols = [str(c).lower().strip() for c in df.columns]
-            
-            potential_vendor = ["vendor_name", "vendor", "first_name", "client_name", "company", "supplier"]
-            potential_amount = ["total", "amount", "total_amount", "price", "grand_total"]
-            potential_number = ["invoice_number", "id", "stock_code", "ref", "invoice_id"]
-            potential_date = ["date", "invoice_date", "created_at", "timestamp"]
-            
-            vendor_col = next((df.columns[cols.index(c)] for c in potential_vendor if c in cols), df.columns[0])
-            amount_col = next((df.columns[cols.index(c)] for c in potential_amount if c in cols), None)
-            num_col = next((df.columns[cols.index(c)] for c in potential_number if c in cols), None)
-            date_col = next((df.columns[cols.index(c)] for c in potential_date if c in cols), None)
-            
-            if not amount_col:
-                headers = ", ".join(df.columns)
-                raise Exception(f"Could not find a valid 'amount' column in spreadsheet. Headers found: {headers}")
-                
-            # Limit the spreadsheet parse in MVP to avoid overwhelming the db during dev
-            MAX_ROWS = 500
-            if len(df) > MAX_ROWS:
-                logger.warning(f"Spreadsheet has {len(df)} rows. Truncating to {MAX_ROWS} for MVP.")
-                df = df.head(MAX_ROWS)
-
-            invoices_to_create = []
-            total_batch_amount = 0.0
-            
-            for _, row in df.iterrows():
-                try:
-                    row_amount = float(row[amount_col]) if pd.notna(row[amount_col]) else 0.0
-                except (ValueError, TypeError):
-                    row_amount = 0.0
-                    
-                total_batch_amount += row_amount
-                
-                new_inv = Invoice(
-                    organization_id=tracker_invoice.organization_id,
-                    uploaded_by=user_id,
-                    status=InvoiceStatus.AUTO_APPROVED,
-                    file_url=tracker_invoice.file_url,
-                    vendor_name=str(row[vendor_col]) if vendor_col and pd.notna(row[vendor_col]) else "Batch Import",
-                    invoice_number=str(row[num_col]) if num_col and pd.notna(row[num_col]) else str(uuid.uuid4())[:8],
-                    total_amount=row_amount,
-                    confidence_score=1.0, 
-                    extracted_json={
-                        "invoice_date": str(row[date_col]) if date_col and pd.notna(row[date_col]) else None,
-                        "raw_row_data": row.fillna("").to_dict()
-                    }
-                )
-                invoices_to_create.append(new_inv)
-                
-            # Bulk insert (very fast)
-            db.bulk_save_objects(invoices_to_create)
-            
+            # rows → column mapping (resolved on the first chunk) → coercion → batched insert, one chunk at a time
+            chunk_rows = max(settings.SPREADSHEET_INSERT_CHUNK_ROWS, 1)
+            writer = ChunkWriter(db, organization_id, user_id, file_url)
+            for chunk in iter_spreadsheet_chunks(io.BytesIO(file_bytes), filename, chunk_rows):
+                if mapping is None:
+                    mapping = resolve_mapping(db, organization_id, chunk)
+                    if mapping.mapping["amount"] is None:
+                        headers = ", ".join(mapping.columns)
+                        raise ValueError(f"Could not find a valid 'amount' column in spreadsheet. Headers found: {headers}")
+                if not chunk.empty:
+                    writer.write(coerce_chunk(chunk, mapping.mapping))
+            # Core inserts bypass flush events, so count them into the analytics rollups explicitly
+            writer.record_rollups()
+
+            elapsed = time.monotonic() - _start_time
+            rate = writer.rows / elapsed if elapsed > 0 else float(writer.rows)
+
             # Update the original tracker invoice to act as the "Batch Summary"
             tracker_invoice.status = InvoiceStatus.AUTO_APPROVED
-            tracker_invoice.processing_time_seconds = round(time.monotonic() - _start_time, 2)
-            tracker_invoice.vendor_name = f"Spreadsheet Dataset ({len(df)} rows)"
-            tracker_invoice.total_amount = total_batch_amount
-            
-            db.commit()
-            log_invoice_event(db, tracker_invoice.id, user_id, "PROCESSING_COMPLETED", f"Successfully imported {len(df)} invoices instantly from spreadsheet structure.")
-            
+            tracker_invoice.processing_time_seconds = round(elapsed, 2)
+            tracker_invoice.vendor_name = f"Spreadsheet Dataset ({writer.rows} rows)"
+            tracker_invoice.total_amount = writer.amount
+            tracker_invoice.extracted_json = {"column_mapping": mapping.describe(imported=True)}
+
+            logger.info(f"Imported {writer.rows} rows from {filename} in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+            events.record("PROCESSING_COMPLETED", f"Successfully imported {writer.rows} invoices from spreadsheet structure in {elapsed:.1f}s ({rate:,.0f} rows/s).")
+            events.flush()
+            # Same export next time maps without profiling; confirmed mappings are left as they are
+            try:
+                remember_mapping(organization_id, mapping.header_signature, mapping.columns, mapping.mapping)
+            except Exception as e:
+                logger.warning(f"Could not remember the column mapping of {filename}: {e}")
+
         except Exception as proc_e:
-            logger.error(f"Spreadsheet Processing failed for Invoice {tracker_invoice.id}: {proc_e}")
+            logger.error(f"Spreadsheet Processing failed for Invoice {invoice_id}: {proc_e}")
+            events.rollback()  # Drops any partially inserted rows
             tracker_invoice.status = InvoiceStatus.UNDER_REVIEW
             tracker_invoice.processing_time_seconds = round(time.monotonic() - _start_time, 2)
-            tracker_invoice.vendor_name = f"Failed Spreadsheet: {filename}"
-            db.commit()
-            log_invoice_event(db, tracker_invoice.id, user_id, "PROCESSING_FAILED", f"Spreadsheet schema parsing failed -> {str(proc_e)}")
-            
+            tracker_invoice.vendor_name = f"{FAILED_SPREADSHEET_PREFIX}{filename}"
+            if mapping is not None:  # Lets the user confirm the right columns and re-import
+                tracker_invoice.extracted_json = {"column_mapping": mapping.describe(imported=False)}
+            events.record("PROCESSING_FAILED", f"Spreadsheet schema parsing failed -> {str(proc_e)}")
+            events.flush()
+
     finally:
         db.close()
@@ -1,25 +1,43 @@
 import boto3
 import uuid
 import os
+import re
+import json
+import shutil
+import hashlib
 import pathlib
+import functools
+import anyio
 from fastapi import UploadFile, HTTPException
 from core.config import settings
 
 # Local storage fallback path (used when R2 is not configured)
 LOCAL_STORAGE_DIR = pathlib.Path("./local_uploads")
 
+# Staging area for chunked uploads when R2 is not configured (one folder per upload session)
+LOCAL_MULTIPART_DIR = LOCAL_STORAGE_DIR / ".multipart"
+_LOCAL_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
 def _is_r2_configured() -> bool:
     return bool(settings.R2_ACCESS_KEY and settings.R2_SECRET_KEY and settings.R2_ENDPOINT_URL)
 
 def get_s3_client():
-    """Initializes the boto3 client connecting to Cloudflare R2"""
+    """Returns the boto3 client connecting to Cloudflare R2 (built once, then reused — clients are thread-safe)"""
     if not _is_r2_configured():
         raise HTTPException(status_code=500, detail="Storage credentials not configured.")
+    return _build_s3_client(
+        settings.R2_ENDPOINT_URL.strip(),
+        settings.R2_ACCESS_KEY.strip(),
+        settings.R2_SECRET_KEY.strip(),
+    )
+
+@functools.lru_cache(maxsize=4)
+def _build_s3_client(endpoint_url: str, access_key: str, secret_key: str):
     return boto3.client(
         "s3",
-        endpoint_url=settings.R2_ENDPOINT_URL.strip(),
-        aws_access_key_id=settings.R2_ACCESS_KEY.strip(),
-        aws_secret_access_key=settings.R2_SECRET_KEY.strip(),
+        endpoint_url=endpoint_url,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
         region_name="auto"
     )
 
@@ -65,6 +83,153 @@ def generate_presigned_put_url(r2_key: str, content_type: str, expires_in: int =
     )
 
 
+# ── Chunked / resumable uploads ───────────────────────────────────────────────
+# R2 path: native S3 multipart — the browser PUTs each part to a presigned URL and
+# R2 stitches the object together server-side, so the bytes never touch the API.
+# Local path: parts are streamed to disk one chunk at a time and concatenated with
+# shutil.copyfileobj, which keeps memory flat regardless of file size.
+
+def create_multipart_upload(s3_key: str, content_type: str) -> str:
+    """Opens a multipart upload session and returns its upload id."""
+    if _is_r2_configured():
+        s3 = get_s3_client()
+        response = s3.create_multipart_upload(
+            Bucket=settings.R2_BUCKET_NAME,
+            Key=s3_key,
+            ContentType=content_type,
+        )
+        return response["UploadId"]
+
+    upload_id = uuid.uuid4().hex
+    (LOCAL_MULTIPART_DIR / upload_id).mkdir(parents=True, exist_ok=True)
+    return upload_id
+
+def generate_presigned_part_url(s3_key: str, upload_id: str, part_number: int, expires_in: int = 3600) -> str:
+    """Returns a presigned PUT URL for a single part. Valid for 1 hour so slow links can finish."""
+    s3 = get_s3_client()
+    return s3.generate_presigned_url(
+        "upload_part",
+        Params={
+            "Bucket": settings.R2_BUCKET_NAME,
+            "Key": s3_key,
+            "UploadId": upload_id,
+            "PartNumber": part_number,
+        },
+        ExpiresIn=expires_in,
+    )
+
+def _local_multipart_dir(upload_id: str) -> pathlib.Path:
+    if not _LOCAL_UPLOAD_ID_RE.match(upload_id or ""):
+        raise HTTPException(status_code=400, detail="Invalid upload session.")
+    session_dir = LOCAL_MULTIPART_DIR / upload_id
+    if not session_dir.exists():
+        raise HTTPException(status_code=404, detail="Upload session not found or already completed.")
+    return session_dir
+
+def _store_local_part(session_dir: pathlib.Path, tmp_path: pathlib.Path, part: dict) -> None:
+    """
+    Moves a finished part into place and records its ETag and size beside it, so resume and
+    complete never have to re-read the bytes. A part without its record is treated as missing.
+    """
+    part_path = session_dir / f"{part['part_number']:05d}.part"
+    meta_path = part_path.with_suffix(".json")
+    meta_path.unlink(missing_ok=True)  # A re-sent part must not keep the previous attempt's record
+    os.replace(tmp_path, part_path)
+    meta_tmp = meta_path.with_suffix(".json.tmp")
+    meta_tmp.write_text(json.dumps(part))
+    os.replace(meta_tmp, meta_path)
+
+async def write_local_part(upload_id: str, part_number: int, stream, expected_bytes: int) -> dict:
+    """
+    Streams one part of a local-disk multipart upload to its own file.
+    Written to a temp file first and renamed, so a dropped connection never leaves a torn part behind.
+    File I/O runs on worker threads so the event loop keeps serving other requests meanwhile.
+    Returns {"part_number", "etag", "size"} mirroring what S3 reports.
+    """
+    session_dir = await anyio.to_thread.run_sync(_local_multipart_dir, upload_id)
+    tmp_path = anyio.Path(session_dir / f"{part_number:05d}.part.tmp")
+
+    md5 = hashlib.md5()
+    size = 0
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as fh:
+            async for chunk in stream:
+                size += len(chunk)
+                if size > expected_bytes:
+                    raise HTTPException(status_code=413, detail=f"Part {part_number} must be exactly {expected_bytes} bytes.")
+                md5.update(chunk)
+                await fh.write(chunk)
+        if size != expected_bytes:
+            raise HTTPException(status_code=400, detail=f"Part {part_number} must be exactly {expected_bytes} bytes, received {size}.")
+        part = {"part_number": part_number, "etag": md5.hexdigest(), "size": size}
+        await anyio.to_thread.run_sync(_store_local_part, session_dir, pathlib.Path(tmp_path), part)
+    finally:
+        if await tmp_path.exists():
+            await tmp_path.unlink()
+
+    return part
+
+def list_uploaded_parts(s3_key: str, upload_id: str) -> list[dict]:
+    """Lists the parts already received for an upload session, used by clients to resume."""
+    if _is_r2_configured():
+        s3 = get_s3_client()
+        parts = []
+        paginator = s3.get_paginator("list_parts")
+        for page in paginator.paginate(Bucket=settings.R2_BUCKET_NAME, Key=s3_key, UploadId=upload_id):
+            for part in page.get("Parts", []):
+                parts.append({
+                    "part_number": part["PartNumber"],
+                    "etag": part["ETag"],
+                    "size": part["Size"],
+                })
+        return parts
+
+    session_dir = _local_multipart_dir(upload_id)
+    parts = []
+    for meta_path in sorted(session_dir.glob("*.json")):
+        if meta_path.with_suffix(".part").exists():
+            parts.append(json.loads(meta_path.read_text()))
+    return parts
+
+def complete_multipart_upload(s3_key: str, upload_id: str, parts: list[dict]) -> None:
+    """
+    Assembles the final object from its parts (sorted by part number).
+    On R2 this is a single API call; locally parts are concatenated chunk by chunk.
+    """
+    ordered = sorted(parts, key=lambda p: p["part_number"])
+
+    if _is_r2_configured():
+        s3 = get_s3_client()
+        s3.complete_multipart_upload(
+            Bucket=settings.R2_BUCKET_NAME,
+            Key=s3_key,
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [{"PartNumber": p["part_number"], "ETag": p["etag"]} for p in ordered]
+            },
+        )
+        return
+
+    session_dir = _local_multipart_dir(upload_id)
+    local_path = LOCAL_STORAGE_DIR / s3_key
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(local_path, "wb") as out:
+        for p in ordered:
+            with open(session_dir / f"{p['part_number']:05d}.part", "rb") as part_fh:
+                shutil.copyfileobj(part_fh, out, length=1024 * 1024)
+    shutil.rmtree(session_dir, ignore_errors=True)
+
+def abort_multipart_upload(s3_key: str, upload_id: str) -> None:
+    """Discards every uploaded part of an unfinished session."""
+    if _is_r2_configured():
+        s3 = get_s3_client()
+        s3.abort_multipart_upload(Bucket=settings.R2_BUCKET_NAME, Key=s3_key, UploadId=upload_id)
+    elif _LOCAL_UPLOAD_ID_RE.match(upload_id or ""):
+        staging = LOCAL_MULTIPART_DIR / upload_id
+        if staging.exists():  # Already gone is fine; failing to delete it is reported to the caller
+            shutil.rmtree(staging)
+
+
 async def upload_invoice_to_r2(file: UploadFile, org_id: str) -> str:
     """
     Uploads invoice to R2 if configured, otherwise saves to local filesystem.
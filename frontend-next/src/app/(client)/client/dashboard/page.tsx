@@ -14,50 +14,35 @@ import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContaine
 const ClientDashboard = () => {
   const navigate = useRouter();
   const [invoices, setInvoices] = useState<any[]>([]);
+  const [analytics, setAnalytics] = useState<any>(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    const fetchInvoices = async () => {
+    const fetchDashboard = async () => {
       try {
-        const data = await apiClient.listInvoices("client");
-        data.sort((a: any, b: any) => new Date(b.created_at || 0).getTime() - new Date(a.created_at || 0).getTime());
-        setInvoices(data);
+        // Counters and the chart come pre-aggregated; only the 5 most recent invoices are listed
+        const [stats, recentInvoices] = await Promise.all([
+          apiClient.getMyAnalytics(),
+          apiClient.listInvoices("client", 5),
+        ]);
+        setAnalytics(stats);
+        setInvoices(recentInvoices);
       } catch (err) {
-        console.error("Failed to fetch invoices", err);
+        console.error("Failed to fetch dashboard", err);
       } finally {
         setLoading(false);
       }
     };
-    fetchInvoices();
+    fetchDashboard();
   }, []);
 
-  const processingCount = invoices.filter((i) => i.status === "processing" || i.status === "PROCESSING").length;
-  const doneCount = invoices.filter((i) => i.status !== "processing" && i.status !== "PROCESSING").length;
-  // Assume newly added (less than 1 minute old and processing) implies queued. Simplest mock for the UI:
-  const queuedCount = 0; // Handled instantly by Python/Postgres backend
+  const processingCount = analytics?.pipeline.processing ?? 0;
+  const doneCount = analytics?.pipeline.done ?? 0;
 
   const recent = invoices.slice(0, 5);
 
-  // 7-Day Chart aggregation
-  const last7Days = Array.from({ length: 7 }, (_, i) => {
-    const d = new Date();
-    d.setDate(d.getDate() - (6 - i));
-    // Use local date string (YYYY-MM-DD) to avoid UTC timezone mismatch
-    const y = d.getFullYear();
-    const m = String(d.getMonth() + 1).padStart(2, "0");
-    const day = String(d.getDate()).padStart(2, "0");
-    return `${y}-${m}-${day}`;
-  });
-
-  const volumeData = last7Days.map(date => {
-    const count = invoices.filter(inv => {
-      if (!inv.created_at) return false;
-      const invLocal = new Date(inv.created_at);
-      const y = invLocal.getFullYear();
-      const m = String(invLocal.getMonth() + 1).padStart(2, "0");
-      const d = String(invLocal.getDate()).padStart(2, "0");
-      return `${y}-${m}-${d}` === date;
-    }).length;
+  // 7-Day Chart — daily counts per UTC day from the server
+  const volumeData = (analytics?.daily_counts ?? []).map(({ date, count }: { date: string; count: number }) => {
     const dObj = new Date(date + "T12:00:00"); // noon to avoid DST issues
     const dayLabel = dObj.toLocaleDateString("en-US", { weekday: "short" })[0];
     const fullLabel = dObj.toLocaleDateString("en-US", { weekday: "short", month: "short", day: "numeric" });
@@ -95,13 +80,7 @@ const ClientDashboard = () => {
       <div className="p-6 space-y-6 max-w-7xl mx-auto">
 
         {/* Live Pipeline Status mimicking the slide deck */}
-        <div className="grid gap-4 md:grid-cols-3">
-          <Card className="glass-card bg-primary/10 border-primary/20">
-            <CardContent className="p-4 flex flex-col items-center justify-center text-center space-y-2">
-              <span className="text-sm font-medium text-primary">Queued</span>
-              <span className="text-3xl font-bold">{queuedCount}</span>
-            </CardContent>
-          </Card>
+        <div className="grid gap-4 md:grid-cols-2">
           <Card className="glass-card bg-amber-500/10 border-amber-500/20">
             <CardContent className="p-4 flex flex-col items-center justify-center text-center space-y-2">
               <span className="text-sm font-medium text-amber-500">Processing</span>
@@ -23,6 +23,7 @@ const STATUS_ICON: Record<string, React.ReactNode> = {
   processing_failed: <AlertTriangle className="h-4 w-4 text-destructive" />,
   processing: <Clock className="h-4 w-4 text-status-processing" />,
   under_review: <Clock className="h-4 w-4 text-status-review" />,
+  duplicate: <AlertTriangle className="h-4 w-4 text-muted-foreground" />,
 };
 
 const STATUS_MSG: Record<string, string> = {
@@ -32,6 +33,7 @@ const STATUS_MSG: Record<string, string> = {
   processing_failed: "failed — retry recommended",
   processing: "is being processed…",
   under_review: "is under review",
+  duplicate: "is a duplicate of an earlier upload",
 };
 
 export const Navbar = ({ title }: { title: string }) => {
@@ -63,9 +65,24 @@ export const Navbar = ({ title }: { title: string }) => {
 
   useEffect(() => {
     fetchNotifs();
-    // Poll every 60s — distant users through Cloudflare Tunnel need breathing room
-    const interval = setInterval(fetchNotifs, 60000);
-    return () => { clearInterval(interval); abortRef.current?.abort(); };
+    // Refresh as soon as an invoice settles; the slow poll only backs up a dropped stream
+    let stream: EventSource | null = null;
+    let cancelled = false;
+    let reconnectId: ReturnType<typeof setTimeout>;
+    const connect = async () => {
+      const opened = await apiClient.openInvoiceStream().catch(() => null);
+      if (cancelled) { opened?.close(); return; }
+      stream = opened;
+      opened?.addEventListener("status", (e) => {
+        if (JSON.parse((e as MessageEvent).data).status !== "processing") fetchNotifs();
+      });
+      // A dropped stream can't reuse its expired ticket — reconnect with a fresh one
+      if (opened) opened.onerror = () => { opened.close(); reconnectId = setTimeout(connect, 5000); };
+    };
+    connect();
+    // Poll every 5 min — distant users through Cloudflare Tunnel need breathing room
+    const interval = setInterval(fetchNotifs, 300000);
+    return () => { cancelled = true; clearInterval(interval); clearTimeout(reconnectId); stream?.close(); abortRef.current?.abort(); };
   }, [fetchNotifs]);
 
   // Close dropdowns on outside click
@@ -11,6 +11,7 @@ const config: Record<string, { label: string; className: string }> = {
   processing: { label: "Processing", className: "bg-status-processing/15 text-status-processing border-status-processing/30" },
   processing_failed: { label: "AI Failed — Retry", className: "bg-destructive/15 text-destructive border-destructive/30" },
   admin_pass_needed: { label: "Admin Pass Needed", className: "bg-amber-500/15 text-amber-500 border-amber-500/30" },
+  duplicate: { label: "Duplicate", className: "bg-muted text-muted-foreground border-border" },
 };
 
 export const StatusBadge = ({ status }: { status: string }) => {
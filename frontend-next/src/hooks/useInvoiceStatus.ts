@@ -15,21 +15,23 @@ export function useInvoiceStatus(invoiceId: string, initialStatus: ProcessingSta
     const [error, setError] = useState<string | null>(null);
 
     useEffect(() => {
-        // Stop polling if we reached a terminal state
+        // Stop listening if we reached a terminal state
         if (status !== "processing") return;
 
         let timeoutId: NodeJS.Timeout;
+        let cancelled = false;
 
-        const pollStatus = async () => {
+        const fetchStatus = async (keepPolling: boolean) => {
             try {
-                const data = await apiClient.getInvoiceStatus(invoiceId);
+                const data: InvoiceStatusData = await apiClient.getInvoiceStatus(invoiceId);
+                if (cancelled) return;
                 setStatus(data.status);
                 if (data.confidence_score !== undefined) {
                     setConfidenceScore(data.confidence_score);
                 }
 
-                if (data.status === "processing") {
-                    timeoutId = setTimeout(pollStatus, 3000); // poll every 3 seconds
+                if (keepPolling && data.status === "processing") {
+                    timeoutId = setTimeout(() => fetchStatus(true), 3000); // poll every 3 seconds
                 }
             } catch (err: any) {
                 console.error("Polling error:", err);
@@ -38,9 +40,26 @@ export function useInvoiceStatus(invoiceId: string, initialStatus: ProcessingSta
             }
         };
 
-        pollStatus();
+        // Prefer the push stream; fall back to polling if it can't be opened or drops
+        let stream: EventSource | null = null;
+        apiClient.openInvoiceStream(invoiceId).catch(() => null).then((opened) => {
+            if (cancelled) { opened?.close(); return; }
+            if (!opened) { fetchStatus(true); return; }
+            stream = opened;
 
-        return () => clearTimeout(timeoutId);
+            // One fetch covers anything that settled before the stream connected (and the confidence score)
+            opened.addEventListener("open", () => fetchStatus(false));
+            opened.addEventListener("status", (e) => {
+                const payload = JSON.parse((e as MessageEvent).data);
+                if (payload.status !== "processing") fetchStatus(false);
+            });
+            opened.onerror = () => {
+                opened.close();
+                if (!cancelled) fetchStatus(true);
+            };
+        });
+
+        return () => { cancelled = true; stream?.close(); clearTimeout(timeoutId); };
     }, [invoiceId, status]);
 
     return { status, confidenceScore, error };
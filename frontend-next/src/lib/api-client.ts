@@ -64,13 +64,29 @@ export const apiClient = {
     },
 
     listInvoices: async (role: "admin" | "client", limit?: number) => {
+        if (role === "client" && !limit) return apiClient.listAllClientInvoices();
         let endpoint = role === "admin" ? `${API_URL}/admin/invoices` : `${API_URL}/invoices/my`;
-        if (limit && role === "admin") endpoint += `?limit=${limit}`;
+        if (limit) endpoint += `?limit=${limit}`;
         const res = await fetch(endpoint, { headers: getHeaders() });
         if (!res.ok) throw new Error("Failed to fetch invoices");
         return res.json();
     },
 
+    // /invoices/my is keyset-paginated: follow X-Next-Cursor until the last page
+    listAllClientInvoices: async () => {
+        const invoices: any[] = [];
+        let cursor: string | null = null;
+        do {
+            let endpoint = `${API_URL}/invoices/my?limit=500`;
+            if (cursor) endpoint += `&cursor=${encodeURIComponent(cursor)}`;
+            const res = await fetch(endpoint, { headers: getHeaders() });
+            if (!res.ok) throw new Error("Failed to fetch invoices");
+            invoices.push(...(await res.json()));
+            cursor = res.headers.get("X-Next-Cursor");
+        } while (cursor);
+        return invoices;
+    },
+
     getInvoiceDetails: async (id: string, role: "admin" | "client" = "client") => {
         const endpoint = role === "admin" ? `${API_URL}/admin/invoices` : `${API_URL}/invoices/${id}`;
         // If admin, we fetch all and find it since admin GET single wasn't rigidly built yet, 
@@ -122,6 +138,14 @@ export const apiClient = {
         return res.json();
     },
 
+    getMyAnalytics: async () => {
+        const res = await fetch(`${API_URL}/invoices/analytics`, {
+            headers: getHeaders()
+        });
+        if (!res.ok) throw new Error("Failed to fetch analytics");
+        return res.json();
+    },
+
     getPolicy: async (orgId: string) => {
         const res = await fetch(`${API_URL}/admin/policies/${orgId}`, {
             headers: getHeaders()
@@ -168,6 +192,19 @@ export const apiClient = {
         return window.URL.createObjectURL(blob);
     },
 
+    /** Server-Sent Events stream of invoice status changes; null when there is no session or no EventSource */
+    openInvoiceStream: async (invoiceId?: string): Promise<EventSource | null> => {
+        if (typeof window === 'undefined' || typeof EventSource === 'undefined') return null;
+        // EventSource cannot send an Authorization header, so it carries a short-lived stream-only
+        // ticket in the URL instead of the login token. Tickets expire quickly: reconnect with a new one.
+        const res = await fetch(`${API_URL}/invoices/stream-ticket`, { method: "POST", headers: getHeaders() });
+        if (!res.ok) return null;
+        const { ticket } = await res.json();
+        const params = new URLSearchParams({ ticket });
+        if (invoiceId) params.set("invoice_id", invoiceId);
+        return new EventSource(`${API_URL}/invoices/stream?${params.toString()}`);
+    },
+
     /** Generic authenticated GET — use for admin endpoints */
     get: async (path: string) => {
         const res = await fetch(`${API_URL}${path}`, {